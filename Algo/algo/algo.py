@@ -1,38 +1,36 @@
 import heapq
+import itertools
+import logging
 import math
-from typing import List
+import time
+from array import array
+from typing import List, Tuple
 import numpy as np
 from entities.Robot import Robot
-from entities.Entity import Obstacle, CellState, Grid
-from consts import Direction, MOVE_DIRECTION, TURN_FACTOR, ITERATIONS, TURN_RADIUS, SAFE_COST
-from python_tsp.exact import solve_tsp_dynamic_programming
-
-TURN_OFFSET_TABLES = {
-
-    # Change offset values accordingly (rounded to nearest 10)
-    "forward_right": [
-        # (1 * TURN_RADIUS, 1 * TURN_RADIUS),
-        (4 * TURN_RADIUS, 2 * TURN_RADIUS),
-    ],
-    "forward_left": [
-        # (1 * TURN_RADIUS, 0 * TURN_RADIUS),
-        (-3 * TURN_RADIUS, 1 * TURN_RADIUS),
-    ],
-}
-
-FORWARD_VECTORS = {
-    Direction.NORTH: (1, 0),   # +x
-    Direction.EAST: (0, -1),   # -y
-    Direction.SOUTH: (-1, 0),  # -x
-    Direction.WEST: (0, 1),    # +y
-}
-
-RIGHT_VECTORS = {
-    Direction.NORTH: (0, 1),   # +y
-    Direction.EAST: (1, 0),    # +x
-    Direction.SOUTH: (0, -1),  # -y
-    Direction.WEST: (-1, 0),   # -x
-}
+from entities.Entity import Obstacle, CellState, Grid, TourPath
+from consts import Direction, TURN_FACTOR, ITERATIONS, COMBINATION_BATCH, \
+    PATH_CACHE_MAX_DELTA, MAX_EXACT_OBSTACLES, LARGE_INSTANCE_TIME_BUDGET_MS, COARSE_FACTOR, CORRIDOR_RADIUS, \
+    HIERARCHICAL_ROUNDS, SAFE_COST
+from helper import in_start_zone_bypass
+from algo.path_cache import PATH_CACHE, MISSING
+from algo.tour import solve_anytime, is_better
+from algo.frontier import FRONTIERS
+from algo.heuristic import get_table, UNREACHABLE
+from algo.parallel import search_parallel, MIN_PARALLEL_PAIRS
+from algo.held_karp import solve_open_tsp_batch
+from algo.hierarchical import coarsen, coarse_search, coarse_path, corridor_states, UNREACHED
+from algo.plan_cache import PLAN_CACHE, PLAN_VERSION
+from algo.arena import DIRECTIONS, get_arena_model
+from algo.primitives import get_primitives
+from algo.symmetry import SYMMETRIES, IDENTITY, canonicalize, find_symmetries, invert, transform_size, transform_state
+
+logger = logging.getLogger(__name__)
+
+# Cost of rotating between two packed direction indices
+ROTATION_COSTS = [[Direction.rotation_cost(d1, d2) * TURN_FACTOR for d2 in DIRECTIONS] for d1 in DIRECTIONS]
+ROTATION_COST_TABLE = np.array(ROTATION_COSTS)
+# Order solvers of MazeSolver, see solve_optimal_order
+ORDER_SOLVERS = ("gtsp", "combination", "hierarchical")
 
 class MazeSolver:
     def __init__(
@@ -42,7 +40,16 @@ class MazeSolver:
             robot_x: int,
             robot_y: int,
             robot_direction: Direction,
-            big_turn=0 # the big_turn here is to allow 3-1 turn(0 - by default) | 4-2 turn(1)
+            big_turn=0, # the big_turn here is to allow 3-1 turn(0 - by default) | 4-2 turn(1), None for the default
+            primitives=None, # turn primitive set, a name in algo.primitives.PRIMITIVE_SETS or the primitives, overrides big_turn
+            search_mode="astar", # "astar" runs one search per state pair | "dijkstra" runs one search per source state
+            order_solver="gtsp", # "gtsp" solves view positions and order exactly in one DP | "combination" runs a TSP per view combination
+                                 # | "hierarchical" orders on a coarse grid and refines the legs in corridors around it
+            frontier="heap", # "heap" uses a binary heap | "bucket" uses a bucket queue for the integer search costs
+            macro_edges=False, # jump along straight runs to the next state where a turn or a view state is possible
+            heuristic="manhattan", # A* heuristic, "manhattan" | "table" for the exact obstacle-free cost, see algo.heuristic
+            workers=1, # processes searching the missed pairs, more than 1 uses the shared pool in algo.parallel
+            max_exact_obstacles=MAX_EXACT_OBSTACLES # above this many obstacles the tour is found by the anytime solver
     ):
         # Initialize a Grid object for the arena representation
         self.grid = Grid(size_x, size_y)
@@ -51,10 +58,90 @@ class MazeSolver:
         # Create tables for paths and costs
         self.path_table = dict()
         self.cost_table = dict()
-        self.big_turn = 0
-        self.turn_offsets = {
-            key: TURN_OFFSET_TABLES[key][self.big_turn] for key in TURN_OFFSET_TABLES
-        }
+        self.search_mode = search_mode
+        self.order_solver = order_solver
+        self.frontier = frontier
+        self.macro_edges = macro_edges
+        self.heuristic = heuristic
+        self.workers = workers
+        self.max_exact_obstacles = max_exact_obstacles
+        # Lower bound and relative optimality gap of the last solved tour
+        self.lower_bound = None
+        self.optimality_gap = None
+        # Search bookkeeping indexed by packed state, an entry is only valid for the search with the same stamp,
+        # so the buffers are reset by incrementing the stamp instead of clearing them
+        n_states = size_x * size_y * 4
+        self.search_stamp = 0
+        self.g_cost = array('q', bytes(8 * n_states))
+        self.parent_state = array('q', bytes(8 * n_states))
+        self.open_stamp = array('q', bytes(8 * n_states))
+        self.closed_stamp = array('q', bytes(8 * n_states))
+        # Packed successors of every state, filled on first expansion and cleared when the obstacles change
+        self.transitions = [None] * n_states
+        # Whether fill_transitions computed the successors of every state for the current obstacles
+        self.transitions_filled = False
+        # Whether a turn is possible from every state, used to stop the straight macro edges
+        self.turn_possible = [None] * n_states
+        # Packed states the searches start or end at, straight macro edges always stop there
+        self.stop_states = set()
+        # Number of states expanded by the searches
+        self.expanded_states = 0
+        # Goal-rooted searches of the first run, used to plan a retry request, see algo.retry
+        self.retry_session = None
+        # Ids of the obstacles left out of the last tour as none of their view positions can be reached
+        self.unreachable_obstacles = []
+        # Number of view position combinations solved and pruned by get_optimal_order_combination
+        self.combinations_solved = 0
+        self.combinations_pruned = 0
+        # Number of legs of the last hierarchical tour without any path inside their corridor
+        self.refinement_fallbacks = 0
+        # Ids of the obstacles with reachable view positions that the last hierarchical tour could not connect
+        self.skipped_obstacles = []
+        # Whether the last plan was restored from PLAN_CACHE or the plan store instead of solved
+        self.plan_restored = False
+        self.big_turn = big_turn
+        self.primitives = get_primitives(primitives, big_turn)
+
+    @property
+    def primitives(self) -> tuple:
+        """
+        Returns the turn primitives of the solver, see algo.primitives
+        """
+        return self.arena.primitives
+
+    @primitives.setter
+    def primitives(self, primitives: tuple):
+        # The candidate moves come from the arena model of the turn primitives, see algo.arena
+        self.arena = get_arena_model(self.grid.size_x, self.grid.size_y, get_primitives(primitives))
+        self.clear_transitions()
+
+    def pack_state(self, x: int, y: int, direction: Direction) -> int:
+        """Pack an (x, y, direction) state into a single index over the size_x * size_y * 4 lattice
+
+        The index preserves the lexicographic order of (x, y, direction).
+
+        Args:
+            x (int): x coordinate
+            y (int): y coordinate
+            direction (Direction): direction of the state
+
+        Returns:
+            int: packed state index
+        """
+        return (x * self.grid.size_y + y) * 4 + (direction >> 1)
+
+    def unpack_state(self, index: int):
+        """Unpack a state index created by pack_state
+
+        Args:
+            index (int): packed state index
+
+        Returns:
+            tuple: (x, y, direction)
+        """
+        rest, d = divmod(index, 4)
+        x, y = divmod(rest, self.grid.size_y)
+        return x, y, DIRECTIONS[d]
 
     def add_obstacle(self, x: int, y: int, direction: Direction, obstacle_id: int):
         """Add obstacle to MazeSolver object
@@ -69,9 +156,19 @@ class MazeSolver:
         obstacle = Obstacle(x, y, direction, obstacle_id)
         # Add created obstacle to grid object
         self.grid.add_obstacle(obstacle)
+        self.clear_transitions()
 
     def reset_obstacles(self):
         self.grid.reset_obstacles()
+        self.clear_transitions()
+
+    def clear_transitions(self):
+        """
+        Clears the memoised successors, needed whenever the obstacles or the stop states of the macro edges change
+        """
+        self.transitions = [None] * len(self.transitions)
+        self.turn_possible = [None] * len(self.turn_possible)
+        self.transitions_filled = False
 
     @staticmethod
     def compute_coord_distance(x1: int, y1: int, x2: int, y2: int, level=1):
@@ -112,32 +209,723 @@ class MazeSolver:
 
     @staticmethod
     def get_visit_options(n):
-        """Generate all possible n-digit binary strings
+        """Generate all possible n-digit binary strings lazily, the ones with the most '1' digits first
+
+        The strings with the same number of '1' digits come in increasing order. The callers stop at the first
+        obstacle subset that can be visited, so the 2 ** n strings are never built at once.
 
         Args:
             n (int): number of digits in binary string to generate
 
         Returns:
-            List: list of all possible n-digit binary strings
+            Iterator[str]: n-digit binary strings
+        """
+        for ones in range(n, -1, -1):
+            # Placing the '0' digits in lexicographic order gives the strings in increasing order
+            for zeros in itertools.combinations(range(n), n - ones):
+                digits = ['1'] * n
+                for idx in zeros:
+                    digits[idx] = '0'
+                yield ''.join(digits)
+
+    def get_tour_path(self, tour: List[CellState]) -> TourPath:
+        """Expand a tour of cell states into the full list of cell states travelled by the robot
+
+        Args:
+            tour (List[CellState]): start state followed by the view states in visiting order
+
+        Returns:
+            TourPath: cell states along the path, view states tagged with their screenshot id
+        """
+        optimal_path = TourPath(tour[:1])
+        for i in range(len(tour) - 1):
+            from_item = tour[i]
+            to_item = tour[i + 1]
+
+            cur_path = self.get_path(from_item, to_item)
+            for j in range(1, len(cur_path)):
+                optimal_path.append(cur_path[j][0], cur_path[j][1], cur_path[j][2])
+
+            optimal_path.set_screenshot(to_item.screenshot_id)
+
+        return optimal_path
+
+    def get_reachable_states(self) -> bytearray:
+        """Find the states the robot can drive to from its start state and return from
+
+        Every path is also driven backwards (see helper.command_generator, a forward turn reversed is a backward
+        turn), which is why the tables store every path in both directions. A state can thus be reached and left
+        exactly when it is connected to the start state by moves taken in either direction, so the forward
+        search from the start state also follows every move backwards.
+
+        Returns:
+            bytearray: 1 for every reachable packed state, 0 otherwise
+        """
+        start = self.robot.get_start_state()
+        start_index = self.pack_state(start.x, start.y, start.direction)
+
+        # A retry request has the connected states of the whole lattice from its session
+        if self.retry_session is not None and self.retry_session.components is not None \
+                and 0 <= start.x < self.grid.size_x and 0 <= start.y < self.grid.size_y:
+            return self.retry_session.get_reachable_states(start_index)
+
+        def successors(index):
+            if self.macro_edges:
+                # Straight macro edges skip the states in between, which could be view states
+                x, y, direction = self.unpack_state(index)
+                return [self.pack_state(next_x, next_y, new_direction)
+                        for next_x, next_y, new_direction, _ in self.get_neighbors(x, y, direction)]
+            return [nxt for nxt, _, _, _ in self.transitions[index] or self.get_transitions(index)]
+
+        if not self.macro_edges:
+            self.fill_transitions()
+
+        # Moves of the whole lattice in both directions. The searches leave a state on a blocked cell by the same
+        # moves as any other, the robot can start on one, so its moves are followed too
+        moves = [[] for _ in range(len(self.transitions))]
+        for index in range(len(self.transitions)):
+            for nxt in successors(index):
+                moves[index].append(nxt)
+                moves[nxt].append(index)
+
+        reachable = bytearray(len(self.transitions))
+        reachable[start_index] = 1
+        stack = [start_index]
+        while stack:
+            cur = stack.pop()
+            for nxt in moves[cur]:
+                if not reachable[nxt]:
+                    reachable[nxt] = 1
+                    stack.append(nxt)
+        return reachable
+
+    def get_unit_transitions(self):
+        """Get the single moves of the whole lattice in both directions, without straight macro edges
+
+        Returns:
+            Tuple[List[List[tuple]], List[List[tuple]]]: (packed successor, move cost) and (packed predecessor,
+            move cost) of every packed state
+        """
+        forward = [[] for _ in range(len(self.transitions))]
+        backward = [[] for _ in range(len(self.transitions))]
+        # Without macro edges, the memoised successors are the single moves
+        unit_transitions = self.fill_transitions() if not self.macro_edges else self.get_unit_moves()
+        # The moves from a blocked cell are kept as in the searches, the retry can start on one
+        for index, transitions in enumerate(unit_transitions):
+            for nxt, _, _, move_cost in transitions:
+                forward[index].append((nxt, move_cost))
+                backward[nxt].append((index, move_cost))
+        return forward, backward
+
+    def get_unit_moves(self) -> List[List[tuple]]:
+        """Compute the single moves of every packed state from the candidate moves of the arena model
+
+        The candidate moves are checked against the clearance masks of the obstacles in a few array operations,
+        with the same result as get_neighbors state by state. A turn is checked against the sweep fields of its
+        swept cells, see Grid.get_sweep_field.
+
+        Returns:
+            List[List[tuple]]: (packed successor, x, y, move cost) of every packed state
+        """
+        arena = self.arena
+        reachable_mask, safe_cost_field = self.grid.get_clearance_masks()
+        possible = reachable_mask[arena.move_x, arena.move_y]
+        safe_cost = safe_cost_field[arena.move_x, arena.move_y]
+        # The states of a packed direction are every fourth one, in the order of the raveled fields
+        for (d, _), (column, body_cells, margin_cells) in arena.sweeps.items():
+            possible[d::4, column] = ~self.grid.get_sweep_field(body_cells, walls=True).ravel()
+            safe_cost[d::4, column] = SAFE_COST * self.grid.get_sweep_field(margin_cells, walls=False).ravel()
+        possible &= arena.move_next >= 0
+        move_cost = ROTATION_COST_TABLE[arena.state_direction[:, None], arena.move_direction] + 1 + \
+            arena.move_cost + safe_cost
+        return [[(nxt, x, y, cost) for is_possible, nxt, x, y, cost in zip(*row) if is_possible]
+                for row in zip(possible.tolist(), arena.move_next.tolist(), arena.move_x.tolist(),
+                               arena.move_y.tolist(), move_cost.tolist())]
+
+    def fill_transitions(self) -> List[List[tuple]]:
+        """Memoise the successors of every packed state at once, see get_unit_moves, instead of state by state
+        in get_transitions. Straight macro edges depend on the stop states, so they are left to get_transitions.
+
+        Returns:
+            List[List[tuple]]: (packed successor, x, y, move cost) of every packed state
+        """
+        if not self.transitions_filled and not self.macro_edges:
+            # In place, the searches hold on to the list
+            self.transitions[:] = self.get_unit_moves()
+            self.transitions_filled = True
+        return self.transitions
+
+    def get_retry_layout_key(self):
+        """
+        Returns the key of what the retry cost-to-go fields depend on: the obstacle positions and the turn primitives
+        """
+        return self.grid.get_layout_key(), self.primitives
+
+    def get_view_obstacle_positions(self, retrying) -> List[List[CellState]]:
+        """Get the view positions of every obstacle where the robot can be placed, see
+        Grid.get_view_obstacle_positions, from the view state offsets of the arena model
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+
+        Returns:
+            List[List[CellState]]: view positions of every obstacle but the skipped ones
+        """
+        return [[view_state for view_state in self.arena.get_view_states(obstacle, retrying)
+                 if self.grid.reachable(view_state.x, view_state.y)]
+                for obstacle in self.grid.obstacles if obstacle.direction != Direction.SKIP]
+
+    def get_reachable_view_positions(self, retrying) -> List[List[CellState]]:
+        """Get the view positions of every obstacle that the robot can reach from its start state and leave again
+
+        Obstacles without any such view position are left out and their ids kept in self.unreachable_obstacles.
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+
+        Returns:
+            List[List[CellState]]: view positions of every obstacle that can be visited
+        """
+        all_view_positions = self.get_view_obstacle_positions(retrying)
+        obstacles = [obstacle for obstacle in self.grid.obstacles if obstacle.direction != Direction.SKIP]
+
+        start = self.robot.get_start_state()
+        if 0 <= start.x < self.grid.size_x and 0 <= start.y < self.grid.size_y:
+            reachable = self.get_reachable_states()
+            all_view_positions = [[view_state for view_state in view_positions
+                                   if 0 <= view_state.x < self.grid.size_x and 0 <= view_state.y < self.grid.size_y
+                                   and reachable[self.pack_state(view_state.x, view_state.y, view_state.direction)]]
+                                  for view_positions in all_view_positions]
+
+        self.unreachable_obstacles = [obstacle.obstacle_id for obstacle, view_positions
+                                      in zip(obstacles, all_view_positions) if not view_positions]
+        if self.unreachable_obstacles:
+            logger.warning("Obstacles without any reachable view position: %s", self.unreachable_obstacles)
+        return [view_positions for view_positions in all_view_positions if view_positions]
+
+    def get_gtsp_instance(self, retrying):
+        """Build the generalized TSP instance over the robot start state and the view states of every obstacle
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+
+        Returns:
+            Tuple: (items, cluster, cost, penalty, members) where items[0] is the robot start state, cluster[i] the
+            obstacle index of items[i] (-1 for the start), cost the pairwise cost matrix (inf if unreachable),
+            penalty the view state penalties and members[c] the item indices that can view obstacle c
+        """
+        # Get all reachable positions that can view the obstacles
+        all_view_positions = self.get_reachable_view_positions(retrying)
+
+        # items[0] is the robot's start state, followed by the view states of every obstacle
+        items = [self.robot.get_start_state()]
+        cluster = [-1]
+        for idx, view_positions in enumerate(all_view_positions):
+            items = items + view_positions
+            cluster += [idx] * len(view_positions)
+
+        # Generate the path cost for the items
+        self.path_cost_generator(items)
+
+        n_items = len(items)
+        cost = np.full((n_items, n_items), np.inf)
+        for s, u in enumerate(items):
+            for e, v in enumerate(items):
+                if (u, v) in self.cost_table:
+                    cost[s][e] = self.cost_table[(u, v)]
+        penalty = np.array([item.penalty for item in items], dtype=float)
+        members = [np.array([i for i in range(n_items) if cluster[i] == idx], dtype=int)
+                   for idx in range(len(all_view_positions))]
+
+        return items, cluster, cost, penalty, members
+
+    def get_symmetries(self) -> List[tuple]:
+        """Find the arena transforms that map the motion model onto itself, see algo.symmetry
+
+        The candidate moves from every direction and the view state offsets of an obstacle facing every direction,
+        see algo.arena, are compared with their images, the result is kept in SYMMETRIES per turn primitive set.
+        The turns are compared by their cost, clearance and driving direction. The default turns are not mirror
+        images of each other, so with the default primitives only the rotations are left.
+
+        Returns:
+            List[tuple]: the transforms preserving the moves and the view states, the identity first
+        """
+        key = self.primitives
+        if key not in SYMMETRIES:
+            patterns = dict()
+            for direction in DIRECTIONS:
+                patterns[(int(direction), "move")] = {
+                    (dx, dy, int(move_direction), turn and (turn.reverse, turn.cost, turn.clearance))
+                    for dx, dy, move_direction, turn in self.arena.moves[direction >> 1]}
+                for retrying in (False, True):
+                    patterns[(int(direction), retrying)] = {
+                        (dx, dy, int(view_direction), penalty)
+                        for dx, dy, view_direction, penalty in self.arena.view_offsets[(int(direction), retrying)]}
+            SYMMETRIES[key] = find_symmetries(patterns)
+        return SYMMETRIES[key]
+
+    def get_plan_key(self, retrying, time_budget_ms=None):
+        """Get the key of the plan in PLAN_CACHE: the canonical layout and start state with PLAN_VERSION and the solver
+        options
+
+        The layout and the start state are canonicalized together under get_symmetries. Obstacles at x == 4 do
+        not block the start zone, see helper.in_start_zone_bypass, so a layout with one in any of its images is
+        only canonicalized under the identity, the same way for every image.
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+            time_budget_ms (float, optional): time budget of the anytime solver. Defaults to None.
+
+        Returns:
+            Tuple[tuple, tuple, List[int]]: the key, the transform to the canonical arena and the id of the
+            obstacle at every position of the sorted canonical layout
+        """
+        size_x, size_y = self.grid.size_x, self.grid.size_y
+        obstacles = [(obstacle.x, obstacle.y, int(obstacle.direction)) for obstacle in self.grid.obstacles]
+        start = self.robot.get_start_state()
+        start = (start.x, start.y, int(start.direction))
+
+        transforms = self.get_symmetries()
+        if any(in_start_zone_bypass(*transform_state(transform, *ob, size_x, size_y)[:2])
+               for transform in transforms for ob in obstacles):
+            transforms = [IDENTITY]
+        canonical, transform = canonicalize(size_x, size_y, obstacles, start, transforms)
+
+        ids = {transform_state(transform, *ob, size_x, size_y): obstacle.obstacle_id
+               for ob, obstacle in zip(obstacles, self.grid.obstacles)}
+        obstacle_ids = [ids[ob] for ob in canonical[2]]
+        options = (PLAN_VERSION, retrying, time_budget_ms, self.order_solver, self.max_exact_obstacles,
+                   tuple(sorted(self.get_search_options().items())))
+        return canonical + options, transform, obstacle_ids
+
+    def get_canonical_plan(self, optimal_path: List[CellState], distance, transform: tuple, obstacle_ids: List[int]):
+        """Map a solved plan to the canonical arena of get_plan_key, as stored in PLAN_CACHE
+
+        Args:
+            optimal_path (List[CellState]): cell states along the path
+            distance (float): distance of the path
+            transform (tuple): transform to the canonical arena
+            obstacle_ids (List[int]): id of the obstacle at every position of the canonical layout
+
+        Returns:
+            tuple: ((x, y, direction, obstacle index) along the path, distance, indices of the unreachable
+            obstacles, lower bound, optimality gap), where the indices refer to the canonical layout, -1 for none
+        """
+        size_x, size_y = self.grid.size_x, self.grid.size_y
+        index = {obstacle_id: i for i, obstacle_id in enumerate(obstacle_ids)}
+        path = tuple(transform_state(transform, state.x, state.y, int(state.direction), size_x, size_y)
+                     + (index.get(state.screenshot_id, -1),) for state in optimal_path)
+        unreachable = tuple(index[obstacle_id] for obstacle_id in self.unreachable_obstacles)
+        return path, distance, unreachable, self.lower_bound, self.optimality_gap
+
+    def restore_plan(self, plan: tuple, transform: tuple, obstacle_ids: List[int]):
+        """Map a plan of PLAN_CACHE back from the canonical arena, see get_canonical_plan
+
+        The commands are relative to the robot, so they are generated from the restored path as usual. Rotations
+        leave them unchanged but for the obstacle ids of the screenshots.
+
+        Args:
+            plan (tuple): the canonical plan
+            transform (tuple): transform from this arena to the canonical one
+            obstacle_ids (List[int]): id of the obstacle at every position of the canonical layout
+
+        Returns:
+            Tuple[TourPath, float]: cell states along the path and its distance
+        """
+        path, distance, unreachable, self.lower_bound, self.optimality_gap = plan
+        self.plan_restored = True
+        size_x, size_y = transform_size(transform, self.grid.size_x, self.grid.size_y)
+        inverse = invert(transform)
+        optimal_path = TourPath()
+        for x, y, direction, obstacle in path:
+            x, y, direction = transform_state(inverse, x, y, direction, size_x, size_y)
+            optimal_path.append(x, y, direction, obstacle_ids[obstacle] if obstacle >= 0 else -1)
+        self.unreachable_obstacles = [obstacle_ids[i] for i in unreachable]
+        return optimal_path, distance
+
+    def get_optimal_order_dp(self, retrying, time_budget_ms=None) -> Tuple[TourPath, float]:
+        """Find the cheapest tour from the robot start that takes a picture of as many obstacles as possible
+
+        Solves the generalized TSP exactly with a bitmask DP over (visited obstacle set, current view state),
+        choosing the view state of every obstacle and the visiting order together. The view state penalty is
+        part of the objective. Among the obstacle sets that can be fully visited, the largest one is chosen,
+        then the cheapest tour for it.
+
+        The DP is exponential in the number of obstacles, for a large instance (see is_large_instance) the anytime
+        solver is used instead, within LARGE_INSTANCE_TIME_BUDGET_MS.
+
+        Plans are cached in PLAN_CACHE up to the symmetries of the arena, so a repeated layout, or a rotated copy
+        of one with the start rotated alike, is a lookup, see get_plan_key.
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+            time_budget_ms (float, optional): if given, return the best tour found by the anytime solver within
+                this budget instead. Defaults to None.
+
+        Returns:
+            Tuple[TourPath, float]: cell states along the optimal path and its distance
+        """
+        plan_key, transform, obstacle_ids = self.get_plan_key(retrying, time_budget_ms)
+        plan = PLAN_CACHE.get(plan_key)
+        if plan is not None:
+            return self.restore_plan(plan, transform, obstacle_ids)
+
+        optimal_path, distance = self.solve_optimal_order(retrying, time_budget_ms)
+        PLAN_CACHE.put(plan_key, self.get_canonical_plan(optimal_path, distance, transform, obstacle_ids))
+        return optimal_path, distance
+
+    def is_large_instance(self) -> bool:
+        """
+        Returns whether there are more than max_exact_obstacles obstacles to photograph, too many for the exact DP
+        """
+        return sum(obstacle.direction != Direction.SKIP for obstacle in self.grid.obstacles) > self.max_exact_obstacles
+
+    def solve_optimal_order(self, retrying, time_budget_ms=None) -> Tuple[TourPath, float]:
+        """Solve the tour with the order solver of the solver, see get_optimal_order_dp
+
+        The hierarchical tour is a fast one, for the arenas too large to search every pair of view states in time.
+        If it leaves out an obstacle that has reachable view positions, the tour is solved again over every pair as
+        for the "gtsp" solver: photographing as many obstacles as possible comes before the latency.
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+            time_budget_ms (float, optional): time budget of the anytime solver. Defaults to None.
+
+        Returns:
+            Tuple[TourPath, float]: cell states along the optimal path and its distance
+        """
+        if self.order_solver == "hierarchical":
+            optimal_path, distance = self.get_optimal_order_hierarchical(retrying, time_budget_ms)
+            if not self.skipped_obstacles:
+                return optimal_path, distance
+            logger.warning("Hierarchical tour without obstacles %s, searching every pair of view states instead",
+                           self.skipped_obstacles)
+            # The legs refined inside corridors are not the shortest paths between their states
+            self.path_table.clear()
+            self.cost_table.clear()
+
+        if time_budget_ms is None and self.is_large_instance():
+            time_budget_ms = LARGE_INSTANCE_TIME_BUDGET_MS
+
+        if time_budget_ms is not None:
+            return self.get_optimal_order_anytime(retrying, time_budget_ms)
+
+        if self.order_solver == "combination":
+            return self.get_optimal_order_combination(retrying)
+
+        return self.get_optimal_order_gtsp(retrying)
+
+    def get_optimal_order_gtsp(self, retrying) -> Tuple[TourPath, float]:
+        """Solve the generalized TSP exactly with the bitmask DP, see get_optimal_order_dp
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+
+        Returns:
+            Tuple[TourPath, float]: cell states along the optimal path and its distance
+        """
+        items, cluster, cost, penalty, members = self.get_gtsp_instance(retrying)
+        n = len(members)
+        n_items = len(items)
+
+        # dp[mask][v]: cheapest cost from the start visiting exactly the obstacles in mask, ending at view state v
+        dp = np.full((1 << n, n_items), np.inf)
+        parent = np.full((1 << n, n_items), -1, dtype=int)
+        dp[0][0] = 0
+
+        for mask in range(1 << n):
+            active = np.flatnonzero(np.isfinite(dp[mask]))
+            if len(active) == 0:
+                continue
+
+            # Cheapest way to reach every view state from any view state ending this mask
+            total = dp[mask][active][:, None] + cost[active]
+            best_prev = np.argmin(total, axis=0)
+            candidate = total[best_prev, np.arange(n_items)] + penalty
+
+            for idx in range(n):
+                if mask & (1 << idx) or len(members[idx]) == 0:
+                    continue
+                new_mask = mask | (1 << idx)
+                targets = members[idx]
+                improved = targets[candidate[targets] < dp[new_mask][targets]]
+                dp[new_mask][improved] = candidate[improved]
+                parent[new_mask][improved] = active[best_prev[improved]]
+
+        # Visit as many obstacles as possible, then pick the cheapest tour
+        best_mask = 0
+        for mask in range(1 << n):
+            if not np.isfinite(dp[mask].min()):
+                continue
+            if bin(mask).count('1') > bin(best_mask).count('1') or \
+                    (bin(mask).count('1') == bin(best_mask).count('1') and dp[mask].min() < dp[best_mask].min()):
+                best_mask = mask
+
+        # Backtrack the visiting order
+        order = []
+        mask = best_mask
+        cur = int(np.argmin(dp[mask]))
+        distance = float(dp[mask][cur])
+        while mask:
+            order.append(cur)
+            prev = parent[mask][cur]
+            mask ^= 1 << cluster[cur]
+            cur = prev
+
+        tour = [items[0]] + [items[i] for i in reversed(order)]
+        self.lower_bound = distance
+        self.optimality_gap = 0.0
+        return self.get_tour_path(tour), distance
+
+    def get_optimal_order_anytime(self, retrying, time_budget_ms) -> Tuple[TourPath, float]:
+        """Find a good tour within a time budget, see algo.tour.solve_anytime
+
+        Starts from the better of a nearest-neighbour and a regret insertion tour over the view states, then
+        improves the visiting order and the view state choice by an adaptive large neighbourhood search until the
+        deadline. The lower bound and optimality gap of the returned tour are kept in self.lower_bound and
+        self.optimality_gap.
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+            time_budget_ms (float): time budget in milliseconds, including the path cost generation
+
+        Returns:
+            Tuple[TourPath, float]: cell states along the best path found and its distance
+        """
+        deadline = time.perf_counter() + time_budget_ms / 1000
+
+        items, cluster, cost, penalty, members = self.get_gtsp_instance(retrying)
+        order, distance, bound = solve_anytime(
+            cost.tolist(), penalty.tolist(), cluster, [m.tolist() for m in members], deadline)
+
+        self.lower_bound = float(bound)
+        self.optimality_gap = (distance - bound) / distance if distance > 0 else 0.0
+        logger.info("Anytime tour: distance %s, lower bound %s, gap %.2f%%",
+                    distance, self.lower_bound, self.optimality_gap * 100)
+
+        tour = [items[0]] + [items[i] for i in order]
+        return self.get_tour_path(tour), float(distance)
+
+    def get_optimal_order_hierarchical(self, retrying, time_budget_ms=None) -> Tuple[TourPath, float]:
+        """Find a tour by ordering the obstacles on a coarse grid and refining every leg inside a corridor
+
+        The obstacle order is solved over the coarse cells of COARSE_FACTOR x COARSE_FACTOR fine cells, see
+        algo.hierarchical, then refined on the fine lattice by refine_coarse_order. The coarse costs ignore the
+        headings and the safe costs, so the refined costs of the legs are fed back into the coarse costs and the
+        order is solved again, for up to HIERARCHICAL_ROUNDS rounds or until the order repeats. The tour is not
+        optimal and has no lower bound.
+
+        A time budget covers the whole tour: no round starts after the deadline and at most half of what is left for
+        a round goes to its coarse order. The legs refined past the deadline are searched from the cheapest view state
+        of the last obstacle only, and on the whole lattice only if their corridor has no path at all. The first
+        round always completes, one corridor search per leg is the least the tour takes.
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
+            time_budget_ms (float, optional): time budget of the tour. Defaults to None, every round is refined
+                in full and the coarse orders share LARGE_INSTANCE_TIME_BUDGET_MS.
+
+        Returns:
+            Tuple[TourPath, float]: cell states along the path and its distance
         """
-        s = []
-        l = bin(2 ** n - 1).count('1')
+        deadline = time.perf_counter() + time_budget_ms / 1000 if time_budget_ms is not None else None
+        all_view_positions = self.get_reachable_view_positions(retrying)
+        self.grid.build_clearance_masks()
+        free = coarsen(self.grid.reachable_mask, COARSE_FACTOR)
+
+        # Coarse leg costs in fine cells between the start and the first view state of every obstacle, at least
+        # the Manhattan distance as the coarse cells of two states can be neighbours
+        anchors = [self.robot.get_start_state()] + [view_positions[0] for view_positions in all_view_positions]
+        searches = [coarse_search(free, self.get_coarse_cell(anchor)) for anchor in anchors]
+        # Index of the start state and of every obstacle in the coarse costs, by screenshot id
+        anchor_index = {anchor.screenshot_id: a for a, anchor in enumerate(anchors)}
+        cost = np.full((len(anchors), len(anchors)), np.inf)
+        for a, (moves, _) in enumerate(searches):
+            for b, anchor in enumerate(anchors):
+                if moves[self.get_coarse_cell(anchor)] != UNREACHED:
+                    cost[a][b] = max(moves[self.get_coarse_cell(anchor)] * COARSE_FACTOR,
+                                     self.compute_state_distance(anchors[a], anchor))
+
+        best_tour, best_distance = None, math.inf
+        tried = set()
+        self.refinement_fallbacks = 0
+        for rounds_left in range(HIERARCHICAL_ROUNDS, 0, -1):
+            round_budget_ms = LARGE_INSTANCE_TIME_BUDGET_MS / HIERARCHICAL_ROUNDS
+            if deadline is not None:
+                remaining_ms = (deadline - time.perf_counter()) * 1000
+                if best_tour is not None and remaining_ms <= 0:
+                    break
+                round_budget_ms = min(round_budget_ms, max(remaining_ms, 0) / rounds_left / 2)
+            order = self.solve_coarse_order(cost, round_budget_ms, self.max_exact_obstacles)
+            if tuple(order) in tried:
+                break
+            tried.add(tuple(order))
+
+            tour, distance = self.refine_coarse_order(order, all_view_positions, anchors, searches, free, deadline)
+            if best_tour is None or is_better(tour[1:], distance, best_tour[1:], best_distance):
+                best_tour, best_distance = tour, distance
+
+            # The refined legs cost at least as much as their coarse estimate
+            for u, v in zip(tour, tour[1:]):
+                a, b = anchor_index[u.screenshot_id], anchor_index[v.screenshot_id]
+                cost[a][b] = cost[b][a] = max(cost[a][b], self.cost_table[(u, v)])
+
+        logger.info("Hierarchical tour: %s legs, %s refined on the whole lattice, %s coarse orders",
+                    len(best_tour) - 1, self.refinement_fallbacks, len(tried))
+        photographed = {state.screenshot_id for state in best_tour[1:]}
+        self.skipped_obstacles = [view_positions[0].screenshot_id for view_positions in all_view_positions
+                                  if view_positions[0].screenshot_id not in photographed]
+        self.lower_bound = None
+        self.optimality_gap = None
+        return self.get_tour_path(best_tour), float(best_distance)
 
-        for i in range(2 ** n):
-            s.append(bin(i)[2:].zfill(l))
+    @staticmethod
+    def get_coarse_cell(state: CellState):
+        """
+        Returns the (x, y) coarse cell of a state for the hierarchical order solver
+        """
+        return state.x // COARSE_FACTOR, state.y // COARSE_FACTOR
 
-        s.sort(key=lambda x: x.count('1'), reverse=True)
-        return s
+    @staticmethod
+    def solve_coarse_order(cost: np.ndarray, time_budget_ms=None, max_exact_obstacles=MAX_EXACT_OBSTACLES) -> List[int]:
+        """Solve the open tour over the coarse costs between the start (index 0) and every obstacle
+
+        Args:
+            cost (np.ndarray): coarse leg costs, see get_optimal_order_hierarchical
+            time_budget_ms (float, optional): time budget of the anytime solver, used above max_exact_obstacles
+                obstacles. Defaults to LARGE_INSTANCE_TIME_BUDGET_MS.
+            max_exact_obstacles (int, optional): largest number of obstacles ordered exactly. Defaults to
+                MAX_EXACT_OBSTACLES.
+
+        Returns:
+            List[int]: obstacle indices in visiting order
+        """
+        n_anchors = len(cost)
+        if n_anchors - 1 <= max_exact_obstacles:
+            # Returning to the start is free
+            open_cost = cost.copy()
+            open_cost[:, 0] = 0
+            _, orders = solve_open_tsp_batch(open_cost[None])
+            return [int(item) - 1 for item in orders[0][1:]]
+
+        deadline = time.perf_counter() + (time_budget_ms or LARGE_INSTANCE_TIME_BUDGET_MS) / 1000
+        items, _, _ = solve_anytime(cost.tolist(), [0] * n_anchors, [-1] + list(range(n_anchors - 1)),
+                                    [[item] for item in range(1, n_anchors)], deadline)
+        return [item - 1 for item in items]
+
+    def refine_coarse_order(self, order: List[int], all_view_positions: List[List[CellState]],
+                            anchors: List[CellState], searches: List[tuple], free: np.ndarray, deadline=None):
+        """Refine the legs of a coarse obstacle order on the fine lattice, inside corridors around the coarse paths
+
+        The legs are searched in order from the view states kept for the last obstacle to all the view states of
+        the next one, through the states within CORRIDOR_RADIUS coarse cells of the coarse path between them, or
+        through the whole lattice if they are only connected through unsafe moves in the corridor. The view state of every obstacle is
+        chosen by a DP over the order. An obstacle that cannot be connected is tried once more at the end.
+
+        Past the deadline, a leg is only searched from the cheapest view state kept for the last obstacle, and on the
+        whole lattice only if it has no path at all in its corridor.
+
+        Args:
+            order (List[int]): obstacle indices in visiting order
+            all_view_positions (List[List[CellState]]): view positions of every obstacle
+            anchors (List[CellState]): start state then the coarse search root of every obstacle
+            searches (List[tuple]): coarse_search result from every anchor
+            free (np.ndarray): mask of the free coarse cells
+            deadline (float, optional): time.perf_counter() deadline of the tour. Defaults to None, no deadline.
+
+        Returns:
+            Tuple[List[CellState], float]: start state followed by the view states in visiting order, and its cost
+        """
+        order = list(order)
+        # layers[-1][state] is the cost of the cheapest refined tour ending at a view state of the last obstacle
+        # and the view state of the obstacle before
+        layers = [{anchors[0]: (0, None)}]
+        last_anchor = anchors[0]
+        retried = set()
+        while order:
+            idx = order.pop(0)
+            targets = all_view_positions[idx]
+            late = deadline is not None and time.perf_counter() >= deadline
+            sources = list(layers[-1])
+            if late:
+                sources = [min(sources, key=lambda source: layers[-1][source][0])]
+            states = sources + targets
+            ends = list(range(len(sources), len(states)))
+
+            def refine(corridor):
+                self.search_pairs(states, {i: ends for i in range(len(sources))}, corridor)
+                # Moves are not symmetric and every path can be driven backwards, as for the tables
+                self.search_pairs(states, {j: [i for i in range(len(sources)) if (states[i], states[j])
+                                               not in self.cost_table] for j in ends}, corridor)
+
+            def leg_cost():
+                return min((self.cost_table[(source, target)] for source in sources for target in targets
+                            if (source, target) in self.cost_table), default=math.inf)
+
+            # Corridor around the coarse path from the last obstacle to this one and the coarse cells of both
+            _, parent = searches[idx + 1]
+            cells = [self.get_coarse_cell(state) for state in states]
+            if self.get_coarse_cell(last_anchor) in parent:
+                cells += coarse_path(parent, self.get_coarse_cell(last_anchor))
+            refine(corridor_states(cells, free.shape, COARSE_FACTOR, CORRIDOR_RADIUS, self.grid.size_x,
+                                   self.grid.size_y))
+            if leg_cost() == math.inf or (leg_cost() >= SAFE_COST and not late):
+                # Nothing connected, or only through unsafe moves that a wider path may avoid
+                self.refinement_fallbacks += 1
+                for source in sources:
+                    for target in targets:
+                        for pair in ((source, target), (target, source)):
+                            self.cost_table.pop(pair, None)
+                            self.path_table.pop(pair, None)
+                refine(None)
+            if leg_cost() == math.inf:
+                # The view states kept for the last obstacle may still reach it after another obstacle
+                if idx not in retried:
+                    retried.add(idx)
+                    order.append(idx)
+                else:
+                    logger.warning("No path to obstacle %s from the tour, skipped", targets[0].screenshot_id)
+                continue
+
+            next_layer = dict()
+            for target in targets:
+                for source in sources:
+                    if (source, target) in self.cost_table:
+                        total = layers[-1][source][0] + self.cost_table[(source, target)] + target.penalty
+                        if target not in next_layer or total < next_layer[target][0]:
+                            next_layer[target] = (total, source)
+            layers.append(next_layer)
+            last_anchor = anchors[idx + 1]
+
+        # Backtrack the view states of the cheapest refined tour
+        state = min(layers[-1], key=lambda end: layers[-1][end][0])
+        distance = layers[-1][state][0]
+        tour = []
+        for layer in reversed(layers):
+            tour.append(state)
+            state = layer[state][1]
+        return tour[::-1], distance
+
+    def get_optimal_order_combination(self, retrying) -> Tuple[TourPath, float]:
+        """Find the optimal tour by solving a TSP for every combination of view positions of every obstacle subset
+
+        The combinations of a subset are explored best-first by a lower bound on their cost, pruning those that
+        cannot beat the best distance found, and solved in batches, see algo.held_karp.solve_open_tsp_batch.
+        At most ITERATIONS combinations are solved per subset.
+
+        Args:
+            retrying (bool): whether the robot is retrying obstacles, see Obstacle.get_view_state
 
-    def get_optimal_order_dp(self, retrying) -> List[CellState]:
+        Returns:
+            Tuple[TourPath, float]: cell states along the optimal path and its distance
+        """
         distance = 1e9
-        optimal_path = []
+        optimal_path = TourPath()
+        self.combinations_solved = 0
+        self.combinations_pruned = 0
 
-        #print(f"Inside get_optimal_order_dp: retrying = {retrying}")
         # Get all possible positions that can view the obstacles
-        all_view_positions = self.grid.get_view_obstacle_positions(retrying)
-        #print(f"all_view_positions: {all_view_positions}")
-        #print(f"All view position: {all_view_positions}")
+        all_view_positions = self.get_reachable_view_positions(retrying)
 
         for op in self.get_visit_options(len(all_view_positions)):
             # op is binary string of length len(all_view_positions) == len(obstacles)
@@ -149,9 +937,6 @@ class MazeSolver:
             items = [self.robot.get_start_state()]
             # Initialize `cur_view_positions` to be an empty list
             cur_view_positions = []
-            
-            # print(f"===================\nop = {op}")
-            # print("List of obstacle visited: \n")
 
             # For each obstacle
             for idx in range(len(all_view_positions)):
@@ -161,75 +946,98 @@ class MazeSolver:
                     items = items + all_view_positions[idx]
                     # Add possible cells to `cur_view_positions`
                     cur_view_positions.append(all_view_positions[idx])
-                    #print("obstacle: {}\n".format(self.grid.obstacles[idx]))
 
             # Generate the path cost for the items
             self.path_cost_generator(items)
-            combination = []
-            self.generate_combination(cur_view_positions, 0, [], combination, [ITERATIONS])
-
-            for c in combination: # run the algo some times ->
-                visited_candidates = [0] # add the start state of the robot
-
-                cur_index = 1
-                fixed_cost = 0 # the cost applying for the position taking obstacle pictures
-                for index, view_position in enumerate(cur_view_positions):
-                    visited_candidates.append(cur_index + c[index])
-                    fixed_cost += view_position[c[index]].penalty
-                    cur_index += len(view_position)
-                
-                cost_np = np.zeros((len(visited_candidates), len(visited_candidates)))
-
-                for s in range(len(visited_candidates) - 1):
-                    for e in range(s + 1, len(visited_candidates)):
-                        u = items[visited_candidates[s]]
-                        v = items[visited_candidates[e]]
-                        if (u, v) in self.cost_table.keys():
-                            cost_np[s][e] = self.cost_table[(u, v)]
-                        else:
-                            cost_np[s][e] = 1e9
-                        cost_np[e][s] = cost_np[s][e]
-                cost_np[:, 0] = 0
-                _permutation, _distance = solve_tsp_dynamic_programming(cost_np)
-                # print(f"fixed_cost = {fixed_cost}")
-                # print(f"distance = {_distance}")
-                if _distance + fixed_cost >= distance:
-                    continue
-
-                optimal_path = [items[0]]
-                distance = _distance + fixed_cost
 
-                for i in range(len(_permutation) - 1):
-                    from_item = items[visited_candidates[_permutation[i]]]
-                    to_item = items[visited_candidates[_permutation[i + 1]]]
-
-                    cur_path = self.path_table[(from_item, to_item)]
-                    for j in range(1, len(cur_path)):
-                        optimal_path.append(CellState(cur_path[j][0], cur_path[j][1], cur_path[j][2]))
+            # Pairwise cost between the items, 1e9 if there is no path
+            item_cost = np.full((len(items), len(items)), 1e9)
+            for s, u in enumerate(items):
+                for e, v in enumerate(items):
+                    if (u, v) in self.cost_table:
+                        item_cost[s][e] = self.cost_table[(u, v)]
+            penalty = np.array([item.penalty for item in items], dtype=float)
+
+            n = len(cur_view_positions)
+            sizes = [len(view_position) for view_position in cur_view_positions]
+            # first_item[t] is the item index of the first view position of obstacle t
+            first_item = 1 + np.cumsum([0] + sizes[:-1])
+
+            # Every view position in a tour is entered once, from the start or from a view position of another
+            # obstacle, so its cheapest such entry plus its penalty is a lower bound of what it adds to the tour
+            item_cluster = np.repeat(np.arange(-1, n), [1] + sizes)
+            entry = np.where(item_cluster[:, None] == item_cluster[None, :], np.inf, item_cost).min(axis=0) + penalty
+
+            # rest_bound[t] and rest_count[t]: lower bound and number of combinations of the view choices of
+            # obstacles t..n-1
+            rest_bound = [0.0] * (n + 1)
+            rest_count = [1] * (n + 1)
+            for t in reversed(range(n)):
+                rest_bound[t] = rest_bound[t + 1] + (entry[first_item[t]:first_item[t] + sizes[t]].min()
+                                                     if sizes[t] else np.inf)
+                rest_count[t] = rest_count[t + 1] * sizes[t]
+
+            # Best-first branch and bound over the view choices. A node fixes the view positions of the first
+            # obstacles and is bounded by their entry costs plus the cheapest entries of the other obstacles.
+            # Complete combinations are solved in batches and a node is pruned with its whole subtree as soon
+            # as its bound cannot beat the best distance found
+            frontier = [(rest_bound[0], 0.0, ())]
+            solved = 0
+            while frontier and solved < ITERATIONS:
+                combination = []
+                while frontier and len(combination) < min(COMBINATION_BATCH, ITERATIONS - solved):
+                    bound, fixed, choice = heapq.heappop(frontier)
+                    if bound >= distance:
+                        # The frontier is ordered by bound, nothing left in it can beat the best distance
+                        self.combinations_pruned += rest_count[len(choice)] + \
+                            sum(rest_count[len(other)] for _, _, other in frontier)
+                        frontier = []
+                        break
+
+                    t = len(choice)
+                    if t == n:
+                        combination.append(choice)
+                        continue
 
-                    optimal_path[-1].set_screenshot(to_item.screenshot_id)
+                    for j in range(sizes[t]):
+                        child_fixed = fixed + entry[first_item[t] + j]
+                        if child_fixed + rest_bound[t + 1] >= distance:
+                            self.combinations_pruned += rest_count[t + 1]
+                        else:
+                            heapq.heappush(frontier, (child_fixed + rest_bound[t + 1], child_fixed, choice + (j,)))
+
+                if not combination:
+                    break
+                solved += len(combination)
+                self.combinations_solved += len(combination)
+
+                # visited_candidates[c] is the start state (item 0) followed by the item of the chosen view
+                # position of every obstacle in combination c
+                choices = np.array(combination, dtype=int).reshape(len(combination), n)
+                visited_candidates = np.hstack([np.zeros((len(combination), 1), dtype=int), choices + first_item])
+
+                # Gather the cost matrix of every combination at once, returning to the start is free
+                cost_np = item_cost[visited_candidates[:, :, None], visited_candidates[:, None, :]]
+                cost_np[:, :, 0] = 0
+                # the cost applying for the position taking obstacle pictures
+                fixed_cost = penalty[visited_candidates[:, 1:]].sum(axis=1)
+
+                _distance, _permutation = solve_open_tsp_batch(cost_np)
+                total = _distance + fixed_cost
+                best = int(np.argmin(total))
+                if total[best] < distance:
+                    distance = float(total[best])
+                    optimal_path = self.get_tour_path(
+                        [items[i] for i in visited_candidates[best][_permutation[best]]])
 
             if optimal_path:
                 # if found optimal path, return
                 break
 
+        logger.info("View position combinations: %s solved, %s pruned",
+                    self.combinations_solved, self.combinations_pruned)
         return optimal_path, distance
 
-    @staticmethod
-    def generate_combination(view_positions, index, current, result, iteration_left):
-        if index == len(view_positions):
-            result.append(current[:])
-            return
-
-        if iteration_left[0] == 0:
-            return
-
-        iteration_left[0] -= 1
-        for j in range(len(view_positions[index])):
-            current.append(j)
-            MazeSolver.generate_combination(view_positions, index + 1, current, result, iteration_left)
-            current.pop()
-
     def get_safe_cost(self, x, y):
         """Get the safe cost of a particular x,y coordinate wrt obstacles that are exactly 2 units away from it in both x and y directions
 
@@ -240,206 +1048,533 @@ class MazeSolver:
         Returns:
             int: safe cost
         """
-        for ob in self.grid.obstacles:
-            if abs(ob.x-x) == 2 and abs(ob.y-y) == 2:
-                return SAFE_COST
-            
-            if abs(ob.x-x) == 1 and abs(ob.y-y) == 2:
-                return SAFE_COST
-            
-            if abs(ob.x-x) == 2 and abs(ob.y-y) == 1:
-                return SAFE_COST
+        return self.grid.safe_cost(x, y)
 
-        return 0
+    def get_neighbors(self, x, y, direction):  # TODO: see the behavior of the robot and adjust...
+        """
+        Return a list of tuples with format:
+        newX, newY, new_direction, safe cost
+        """
+        # Neighbors have the following format: {newX, newY, movement direction, safe cost}
+        # The candidate moves in bounds come from the arena model: forward and backward in the same direction, and
+        # the turn primitives to the adjacent directions, see algo.arena
+        # Neighbors are candidate moves that fulfill the following criteria:
+        #   - A straight move ends at least 2 units away (max of x/y distance) from every nearby obstacle
+        #   - The cells swept by the robot along a turn are free and inside the arena, see Grid.get_sweep_field
+        # If it is exactly 2 units away in both x and y directions, safe cost = SAFECOST. Else, safe cost = 0
+        # A turn has SAFE_COST if an obstacle is within the clearance of its arc, plus the cost of its primitive
+        if 0 <= x < self.grid.size_x and 0 <= y < self.grid.size_y:
+            moves = self.arena.state_moves[self.pack_state(x, y, direction)]
+        else:
+            moves = self.arena.get_moves(x, y, direction)
 
-    def get_safe_turn_cost(self, x, y):
-        """Get the safe cost of a particular x,y coordinate wrt obstacles that are exactly 2 units away from it in both x and y directions
+        neighbors = []
+        for _, next_x, next_y, move_direction, turn in moves:
+            if not turn:
+                if self.grid.reachable(next_x, next_y):
+                    neighbors.append((next_x, next_y, move_direction, self.get_safe_cost(next_x, next_y)))
+            elif self.grid.is_valid_coord(x, y):
+                _, body_cells, margin_cells = self.arena.sweeps[(direction >> 1, turn)]
+                if not self.grid.get_sweep_field(body_cells, walls=True)[x, y]:
+                    safe_cost = SAFE_COST if self.grid.get_sweep_field(margin_cells, walls=False)[x, y] else 0
+                    neighbors.append((next_x, next_y, move_direction, safe_cost + turn.cost))
+        return neighbors
+
+    def get_free_transitions(self):
+        """Get the successors of every packed state on an empty grid of the same size and turn primitive set
+
+        Returns:
+            List[List[tuple]]: (packed successor, move cost) of every packed state
+        """
+        empty_solver = MazeSolver(self.grid.size_x, self.grid.size_y, 0, 0, Direction.NORTH,
+                                  primitives=self.primitives)
+        return [[(nxt, move_cost) for nxt, _, _, move_cost in empty_solver.get_transitions(index)]
+                for index in range(len(empty_solver.transitions))]
+
+    def get_heuristic_table(self):
+        """Get the obstacle-free cost table of this arena and turn primitive set, see algo.heuristic.get_table
+
+        Obstacles only remove moves and add safe costs, so the obstacle-free cost is an admissible and consistent
+        A* heuristic that accounts for the headings and the turn offsets. The tables are generated offline with
+        python -m algo.heuristic, without one the searches use the Manhattan heuristic.
+
+        Returns:
+            np.memmap: table[goal][state], or None if the arena is too large for a table or it was not generated
+        """
+        return get_table(self.grid.size_x, self.grid.size_y, self.primitives)
+
+    def can_turn(self, x: int, y: int, direction: Direction) -> bool:
+        """Check whether any turn is possible from a state, memoised per obstacle layout
 
         Args:
-            x (int): x-coordinate
-            y (int): y-coordinate
+            x (int): x coordinate
+            y (int): y coordinate
+            direction (Direction): direction of the state
 
         Returns:
-            int: safe cost
+            bool: True if get_neighbors has a turn from the state
         """
-        for ob in self.grid.obstacles:
-            if abs(ob.x-x) <= 3 and abs(ob.y-y) <= 3:
-                return SAFE_COST
-        return 0
+        index = self.pack_state(x, y, direction)
+        if self.turn_possible[index] is None:
+            self.turn_possible[index] = any(
+                new_direction != direction for _, _, new_direction, _ in self.get_neighbors(x, y, direction))
+        return self.turn_possible[index]
 
-    def get_neighbors(self, x, y, direction):  # TODO: see the behavior of the robot and adjust...
+    def get_transitions(self, index: int):
+        """Get the successors of a packed state, computed from get_neighbors once per obstacle layout
+
+        With macro edges, a straight move keeps going in the same direction until a state where a turn is possible
+        or a stop state, at the same cost as the single cell moves. Straight runs that end without such a state
+        are dropped, as the robot could only come back from there.
+
+        Args:
+            index (int): packed state index
+
+        Returns:
+            List[tuple]: (packed index, x, y, move cost) of every neighbor
         """
-        Return a list of tuples with format:
-        newX, newY, new_direction
+        transitions = self.transitions[index]
+        if transitions is None:
+            x, y, direction = self.unpack_state(index)
+            rotation_costs = ROTATION_COSTS[index & 3]
+            transitions = []
+            for next_x, next_y, new_direction, safe_cost in self.get_neighbors(x, y, direction):
+                move_cost = rotation_costs[new_direction >> 1] + 1 + safe_cost
+
+                if self.macro_edges and new_direction == direction:
+                    dx, dy = next_x - x, next_y - y
+                    while self.pack_state(next_x, next_y, direction) not in self.stop_states and \
+                            not self.can_turn(next_x, next_y, direction):
+                        if not self.grid.reachable(next_x + dx, next_y + dy):
+                            break
+                        next_x, next_y = next_x + dx, next_y + dy
+                        move_cost += 1 + self.get_safe_cost(next_x, next_y)
+                    else:
+                        transitions.append((self.pack_state(next_x, next_y, direction), next_x, next_y, move_cost))
+                    continue
+
+                transitions.append((self.pack_state(next_x, next_y, new_direction), next_x, next_y, move_cost))
+            self.transitions[index] = transitions
+        return transitions
+
+    @staticmethod
+    def expand_straight_moves(path):
+        """Fill in the cells skipped by straight macro edges, so that consecutive states are single moves
+
+        Args:
+            path (List[tuple]): (x, y, direction) states
+
+        Returns:
+            List[tuple]: the path with every straight move one cell long
         """
-        # Neighbors have the following format: {newX, newY, movement direction, safe cost}
-        # Neighbors are coordinates that fulfill the following criteria:
-        # If moving in the same direction:
-        #   - Valid position within bounds
-        #   - Must be at least 4 units away in total (x+y) 
-        #   - Furthest distance must be at least 3 units away (x or y)
-        # If it is exactly 2 units away in both x and y directions, safe cost = SAFECOST. Else, safe cost = 0
+        expanded = [path[0]]
+        for x, y, direction in path[1:]:
+            prev_x, prev_y, prev_direction = expanded[-1]
+            if prev_direction == direction:
+                steps = abs(x - prev_x) + abs(y - prev_y)
+                dx, dy = (x - prev_x) // max(steps, 1), (y - prev_y) // max(steps, 1)
+                for step in range(1, steps):
+                    expanded.append((prev_x + dx * step, prev_y + dy * step, direction))
+            expanded.append((x, y, direction))
+        return expanded
+
+    def compress_path(self, path: List[int]) -> array:
+        """Keep only the states of a path where it turns or changes between forward and backward moves
+
+        The states in the middle of a straight run are dropped, expand_straight_moves rebuilds them.
 
-        neighbors = []
-        # Assume that after following this direction, the car direction is EXACTLY md
-        for dx, dy, md in MOVE_DIRECTION:
-            if md == direction:  # if the new direction == md
-                # Check for valid position
-                if self.grid.reachable(x + dx, y + dy):  # go forward;
-                    # Get safe cost of destination
-                    safe_cost = self.get_safe_cost(x + dx, y + dy)
-                    neighbors.append((x + dx, y + dy, md, safe_cost))
-                # Check for valid position
-
-                # Removing backwards movement
-                
-                if self.grid.reachable(x - dx, y - dy):  # go back;
-                    # Get safe cost of destination
-                    safe_cost = self.get_safe_cost(x - dx, y - dy)
-                    neighbors.append((x - dx, y - dy, md, safe_cost))
-                
-
-            else:  # consider 8 cases
-                new_x = 0
-                new_y = 0
-                # north <-> east
-                if direction == Direction.NORTH and md == Direction.EAST:
-                    x_change, y_change = self.turn_offsets["forward_right"]
-                    new_x = x + x_change
-                    new_y = y + y_change
-
-                
-                if direction == Direction.EAST and md == Direction.NORTH:
-                    x_change, y_change = self.turn_offsets["forward_left"]
-                    new_x = x + y_change
-                    new_y = y - x_change
-                
-
-                # east <-> south
-                if direction == Direction.EAST and md == Direction.SOUTH:
-                    x_change, y_change = self.turn_offsets["forward_right"]
-                    new_x = x + y_change
-                    new_y = y - x_change
-
-                
-                if direction == Direction.SOUTH and md == Direction.EAST:
-                    x_change, y_change = self.turn_offsets["forward_left"]
-                    new_x = x - x_change
-                    new_y = y - y_change
-                
-
-                # south <-> west
-                if direction == Direction.SOUTH and md == Direction.WEST:
-                    x_change, y_change = self.turn_offsets["forward_right"]
-                    new_x = x - x_change
-                    new_y = y - y_change
-
-                
-                if direction == Direction.WEST and md == Direction.SOUTH:
-                    x_change, y_change = self.turn_offsets["forward_left"]
-                    new_x = x - y_change
-                    new_y = y + x_change
-                
-
-                # west <-> north
-                if direction == Direction.WEST and md == Direction.NORTH:
-                    x_change, y_change = self.turn_offsets["forward_right"]
-                    new_x = x - y_change
-                    new_y = y + x_change
-                
-                if direction == Direction.NORTH and md == Direction.WEST:
-                    x_change, y_change = self.turn_offsets["forward_left"]
-                    new_x = x + x_change
-                    new_y = y + y_change
-                
-                # Check for valid position
-                if self.grid.reachable(new_x, new_y, turn = True) and self.grid.reachable(x, y, preTurn = True):
-                    safe_cost = self.get_safe_turn_cost(x, y)
-                    neighbors.append((new_x, new_y, md, safe_cost))
-        return neighbors
+        Args:
+            path (List[int]): packed states from the start to the end of the path
 
-    def path_cost_generator(self, states: List[CellState]):
-        """Generate the path cost between the input states and update the tables accordingly
+        Returns:
+            array: the remaining packed states
+        """
+        compact = array('i', path[:1])
+        for k in range(1, len(path) - 1):
+            prev, cur, nxt = path[k - 1], path[k], path[k + 1]
+            # Same direction on both moves means two straight moves, which continue each other if in the same sense
+            if not (prev % 4 == cur % 4 == nxt % 4 and (cur - prev) * (nxt - cur) > 0):
+                compact.append(cur)
+        if len(path) > 1:
+            compact.append(path[-1])
+        return compact
+
+    def get_path(self, start: CellState, end: CellState) -> List[tuple]:
+        """Rebuild the path between two states from the path table
+
+        Args:
+            start (CellState): start state
+            end (CellState): end state
+
+        Returns:
+            List[tuple]: (x, y, direction) states from start to end, every move one cell long
+        """
+        compact, reverse = self.path_table[(start, end)]
+        path = self.expand_straight_moves([self.unpack_state(index) for index in compact])
+        return path[::-1] if reverse else path
+
+    def get_search_options(self) -> dict:
+        """Get the options that determine the searched paths, used to rebuild the solver in a worker process
+
+        Returns:
+            dict: MazeSolver keyword arguments
+        """
+        return {
+            'search_mode': self.search_mode,
+            'frontier': self.frontier,
+            'macro_edges': self.macro_edges,
+            'heuristic': self.heuristic,
+            'primitives': self.primitives,
+        }
+
+    def copy(self) -> "MazeSolver":
+        """Get a solver of the same arena, start state, obstacles and search options, with its own grid and tables
+
+        Used to keep working on a layout in another thread without sharing the memoised moves and the search
+        buffers of this solver.
+
+        Returns:
+            MazeSolver: the new solver
+        """
+        start = self.robot.get_start_state()
+        solver = MazeSolver(self.grid.size_x, self.grid.size_y, start.x, start.y, start.direction,
+                            order_solver=self.order_solver, max_exact_obstacles=self.max_exact_obstacles,
+                            **self.get_search_options())
+        for obstacle in self.grid.obstacles:
+            solver.add_obstacle(obstacle.x, obstacle.y, obstacle.direction, obstacle.obstacle_id)
+        return solver
+
+    def search_pairs(self, states: List[CellState], missed: dict, corridor: bytearray = None):
+        """Search the paths between the given state pairs and update the tables accordingly
 
         Args:
             states (List[CellState]): cell states to visit
+            missed (dict): i -> [j, ...], the states to search from states[i]
+            corridor (bytearray, optional): 1 for the packed states the searches may go through, see
+                algo.hierarchical.corridor_states. Defaults to None, the whole lattice.
         """
-        def record_path(start, end, parent: dict, cost: int):
+        # Straight macro edges must stop at every state searched from or to
+        new_stop_states = {self.pack_state(state.x, state.y, state.direction)
+                           for state in states if 0 <= state.x < self.grid.size_x and 0 <= state.y < self.grid.size_y}
+        if not new_stop_states <= self.stop_states:
+            self.stop_states |= new_stop_states
+            if self.macro_edges:
+                self.clear_transitions()
+
+        heuristic_table = self.get_heuristic_table() if self.heuristic == "table" else None
+        size_y = self.grid.size_y
+        g_cost = self.g_cost
+        parent = self.parent_state
+        open_stamp = self.open_stamp
+        closed_stamp = self.closed_stamp
+        transitions = self.transitions
+        # States outside the corridor are closed at the start of every search, so the searches never expand them
+        outside = np.flatnonzero(np.frombuffer(corridor, dtype=np.uint8) == 0) if corridor is not None else None
+        closed_view = np.frombuffer(closed_stamp, dtype=np.int64)
+
+        def in_lattice(state: CellState):
+            return 0 <= state.x < self.grid.size_x and 0 <= state.y < size_y
+
+        def record_path(start, end, end_index: int, cost: int):
 
             # Update cost table for the (start,end) and (end,start) edges
             self.cost_table[(start, end)] = cost
             self.cost_table[(end, start)] = cost
 
-            path = []
-            cursor = (end.x, end.y, end.direction)
+            path = [end_index]
+            cursor = end_index
+            start_index = self.pack_state(start.x, start.y, start.direction)
 
-            while cursor in parent:
-                path.append(cursor)
+            while cursor != start_index:
                 cursor = parent[cursor]
+                path.append(cursor)
 
-            path.append(cursor)
-
-            # Update path table for the (start,end) and (end,start) edges, with the (start,end) edge being the reversed path
-            self.path_table[(start, end)] = path[::-1]
-            self.path_table[(end, start)] = path
+            # Update path table for the (start,end) and (end,start) edges, sharing one compact path that is
+            # expanded by get_path when the tour is assembled
+            compact = self.compress_path(path[::-1])
+            self.path_table[(start, end)] = (compact, False)
+            self.path_table[(end, start)] = (compact, True)
 
         def astar_search(start: CellState, end: CellState):
-            # astar search algo with three states: x, y, direction
+            # astar search algo with three states: x, y, direction, packed into a single index
 
             # If it is already done before, return
-            if (start, end) in self.path_table:
+            if (start, end) in self.path_table or not in_lattice(start) or not in_lattice(end):
                 return
 
+            # Start a new search, invalidating the entries of the previous one
+            self.search_stamp += 1
+            stamp = self.search_stamp
+            if outside is not None:
+                closed_view[outside] = stamp
+
             # Heuristic to guide the search: 'distance' is calculated by f = g + h
             # g is the actual distance moved so far from the start node to current node
             # h is the heuristic distance from current node to end node
-            g_distance = {(start.x, start.y, start.direction): 0}
-
-            # format of each item in heap: (f_distance of node, x coord of node, y coord of node)
-            # heap in Python is a min-heap
-            heap = [(self.compute_state_distance(start, end), start.x, start.y, start.direction)]
-            parent = dict()
-            visited = set()
-
-            while heap:
+            start_index = self.pack_state(start.x, start.y, start.direction)
+            end_index = self.pack_state(end.x, end.y, end.direction)
+            end_x, end_y = end.x, end.y
+            g_cost[start_index] = 0
+            open_stamp[start_index] = stamp
+
+            # Obstacle-free cost of every state to the end state, if the table heuristic is used
+            free_cost = heuristic_table[end_index].tolist() if heuristic_table is not None else None
+
+            # format of each item in the frontier: (f_distance of node, packed index of node)
+            # the heap frontier breaks ties by (x, y, direction) as the packing preserves their order
+            frontier = FRONTIERS[self.frontier]()
+            push = frontier.push
+            pop = frontier.pop
+            if free_cost is None:
+                push(abs(start.x - end_x) + abs(start.y - end_y), start_index)
+            elif free_cost[start_index] != UNREACHABLE:
+                push(free_cost[start_index], start_index)
+
+            while frontier:
                 # Pop the node with the smallest distance
-                _, cur_x, cur_y, cur_direction = heapq.heappop(heap)
-                
-                if (cur_x, cur_y, cur_direction) in visited:
+                _, cur = pop()
+
+                if closed_stamp[cur] == stamp:
                     continue
 
-                if end.is_eq(cur_x, cur_y, cur_direction):
-                    record_path(start, end, parent, g_distance[(cur_x, cur_y, cur_direction)])
+                if cur == end_index:
+                    record_path(start, end, cur, g_cost[cur])
                     return
 
-                visited.add((cur_x, cur_y, cur_direction))
-                cur_distance = g_distance[(cur_x, cur_y, cur_direction)]
+                closed_stamp[cur] = stamp
+                self.expanded_states += 1
+                cur_distance = g_cost[cur]
 
-                for next_x, next_y, new_direction, safe_cost in self.get_neighbors(cur_x, cur_y, cur_direction):
-                    if (next_x, next_y, new_direction) in visited:
+                for nxt, next_x, next_y, move_cost in transitions[cur] or self.get_transitions(cur):
+                    if closed_stamp[nxt] == stamp:
                         continue
 
-                    move_cost = Direction.rotation_cost(new_direction, cur_direction) * TURN_FACTOR + 1 + safe_cost
+                    next_distance = cur_distance + move_cost
 
-                    # the cost to check if any obstacles that considered too near the robot; if it
-                    # safe_cost =
+                    if open_stamp[nxt] != stamp or g_cost[nxt] > next_distance:
+                        open_stamp[nxt] = stamp
+                        g_cost[nxt] = next_distance
+                        parent[nxt] = cur
 
-                    # new cost is calculated by the cost to reach current state + cost to move from
-                    # current state to new state + heuristic cost from new state to end state
-                    next_cost = cur_distance + move_cost + \
-                                self.compute_coord_distance(next_x, next_y, end.x, end.y)
+                        # new cost is calculated by the cost to reach new state + heuristic cost from new state to end state
+                        if free_cost is None:
+                            push(next_distance + abs(next_x - end_x) + abs(next_y - end_y), nxt)
+                        elif free_cost[nxt] != UNREACHABLE:
+                            push(next_distance + free_cost[nxt], nxt)
 
-                    if (next_x, next_y, new_direction) not in g_distance or \
-                            g_distance[(next_x, next_y, new_direction)] > cur_distance + move_cost:
-                        g_distance[(next_x, next_y, new_direction)] = cur_distance + move_cost
-                        parent[(next_x, next_y, new_direction)] = (cur_x, cur_y, cur_direction)
+        def dijkstra_search(start: CellState, ends: List[CellState]):
+            # single-source dijkstra with three states: x, y, direction, packed into a single index
+            # every end state is settled by the same expansion and recorded from the same parent map
 
-                        heapq.heappush(heap, (next_cost, next_x, next_y, new_direction))
+            # Group the end states that are not done before by position, several view states can share one
+            pending = dict()
+            for end in ends:
+                if (start, end) not in self.path_table and in_lattice(end):
+                    pending.setdefault(self.pack_state(end.x, end.y, end.direction), []).append(end)
 
-        # Nested loop through all the state pairings
+            if not pending or not in_lattice(start):
+                return
+
+            # Start a new search, invalidating the entries of the previous one
+            self.search_stamp += 1
+            stamp = self.search_stamp
+            if outside is not None:
+                closed_view[outside] = stamp
+
+            start_index = self.pack_state(start.x, start.y, start.direction)
+            g_cost[start_index] = 0
+            open_stamp[start_index] = stamp
+            frontier = FRONTIERS[self.frontier]()
+            push = frontier.push
+            pop = frontier.pop
+            push(0, start_index)
+
+            # Stop as soon as all the end states are settled
+            while frontier and pending:
+                cur_distance, cur = pop()
+
+                if closed_stamp[cur] == stamp:
+                    continue
+
+                closed_stamp[cur] = stamp
+                self.expanded_states += 1
+                for end in pending.pop(cur, []):
+                    record_path(start, end, cur, cur_distance)
+
+                for nxt, next_x, next_y, move_cost in transitions[cur] or self.get_transitions(cur):
+                    if closed_stamp[nxt] == stamp:
+                        continue
+
+                    next_distance = cur_distance + move_cost
+
+                    if open_stamp[nxt] != stamp or g_cost[nxt] > next_distance:
+                        open_stamp[nxt] = stamp
+                        g_cost[nxt] = next_distance
+                        parent[nxt] = cur
+
+                        push(next_distance, nxt)
+
+        if self.search_mode == "dijkstra":
+            # One search per source state settles all the later states at once
+            for i, ends in missed.items():
+                dijkstra_search(states[i], [states[j] for j in ends])
+        else:
+            # Nested loop through all the state pairings
+            for i, ends in missed.items():
+                for j in ends:
+                    astar_search(states[i], states[j])
+
+    def carry_over_cached_paths(self, layout_key):
+        """Copy the cached pairs of the most similar previous layout that are still optimal on this one
+
+        A straight move only depends on the clearance mask and safe cost of its end cell, and a turn on the sweep
+        fields at its start cell, see get_unit_moves. A cached path that avoids every cell where they changed keeps
+        its cost, and a cheaper path would have to use a cell where they were relaxed, so the path is kept if its
+        cost is at most the obstacle-free cost of going through any such cell. Pairs without a path are kept if
+        nothing was relaxed. The bound uses the offline heuristic table whatever the search heuristic, without one
+        the pairs that could have gotten cheaper are dropped rather than building the table here.
+
+        Args:
+            layout_key (tuple): key of the current layout, see path_cost_generator
+        """
+        size_x, size_y, positions = layout_key[0]
+        best_key, best_delta = None, PATH_CACHE_MAX_DELTA + 1
+        for old_key in PATH_CACHE.get_layout_keys():
+            if old_key[1:] != layout_key[1:] or old_key[0][:2] != (size_x, size_y):
+                continue
+            delta = len(set(old_key[0][2]) ^ set(positions))
+            if delta < best_delta:
+                best_key, best_delta = old_key, delta
+        if best_key is None:
+            return
+
+        old_grid = Grid(size_x, size_y)
+        for obstacle_id, (x, y) in enumerate(best_key[0][2]):
+            old_grid.add_obstacle(Obstacle(x, y, Direction.NORTH, obstacle_id))
+        old_grid.build_clearance_masks()
+        self.grid.build_clearance_masks()
+
+        # A turn depends on the sweep fields at its start cell, True where it is possible or cheap
+        old_fields = [old_grid.reachable_mask, -old_grid.safe_cost_field]
+        new_fields = [self.grid.reachable_mask, -self.grid.safe_cost_field]
+        for _, body_cells, margin_cells in self.arena.sweeps.values():
+            for cells, walls in ((body_cells, True), (margin_cells, False)):
+                old_fields.append(~old_grid.get_sweep_field(cells, walls))
+                new_fields.append(~self.grid.get_sweep_field(cells, walls))
+        changed = np.zeros((size_x, size_y), dtype=bool)
+        relaxed = np.zeros((size_x, size_y), dtype=bool)
+        for old_field, new_field in zip(old_fields, new_fields):
+            changed |= old_field != new_field
+            relaxed |= new_field > old_field
+
+        # States on the relaxed cells, every path getting cheaper goes through one of them
+        relaxed_states = None
+        if relaxed.any():
+            # Only an already generated table, see algo.heuristic.get_table
+            table = self.get_heuristic_table()
+            xs, ys = np.nonzero(relaxed)
+            relaxed_states = ((xs * size_y + ys)[:, None] * 4 + np.arange(4)).ravel()
+
+        kept = 0
+        entries = PATH_CACHE.get_layout_entries(best_key)
+        for start_key, end_key, value in entries:
+            if value is None:
+                if relaxed_states is not None:
+                    continue
+            else:
+                cost, path = value
+                cells = self.expand_straight_moves([self.unpack_state(index) for index in path])
+                if any(changed[x][y] for x, y, _ in cells):
+                    continue
+                if relaxed_states is not None:
+                    if table is None:
+                        continue
+                    start_index, end_index = path[0], path[-1]
+                    bound = (table[relaxed_states, start_index].astype(int) + table[end_index, relaxed_states]).min()
+                    if cost > bound:
+                        continue
+            PATH_CACHE.put(layout_key, start_key, end_key, value)
+            kept += 1
+
+        logger.info("Carried over %s of %s cached pairs from a layout %s obstacles away",
+                    kept, len(entries), best_delta)
+
+    def path_cost_generator(self, states: List[CellState]):
+        """Generate the path cost between the input states and update the tables accordingly
+
+        Args:
+            states (List[CellState]): cell states to visit
+        """
+        # Reuse the pairs solved by previous requests on the same layout, in either direction
+        layout_key = (self.grid.get_layout_key(), self.primitives,
+                      self.search_mode, self.frontier, self.macro_edges, self.heuristic)
+        # After an obstacle edit, start from the pairs of the previous layout that the edit does not affect
+        if layout_key not in PATH_CACHE.get_layout_keys():
+            self.carry_over_cached_paths(layout_key)
+        hits = 0
+        # missed[i] lists the later states that still have to be searched from states[i]
+        missed = dict()
         for i in range(len(states) - 1):
             for j in range(i + 1, len(states)):
-                astar_search(states[i], states[j])
+                start, end = states[i], states[j]
+                if (start, end) in self.path_table:
+                    continue
+
+                cached = PATH_CACHE.get(layout_key, start.get_state_key(), end.get_state_key())
+                if cached is MISSING:
+                    missed.setdefault(i, []).append(j)
+                    continue
+
+                hits += 1
+                if cached is not None:
+                    cost, path = cached
+                    self.cost_table[(start, end)] = cost
+                    self.cost_table[(end, start)] = cost
+                    self.path_table[(start, end)] = (path, False)
+                    self.path_table[(end, start)] = (path, True)
+
+        n_missed = sum(len(ends) for ends in missed.values())
+        if hits or n_missed:
+            logger.info("Path cache: %s hits, %s misses (total %s hits, %s misses, %s pairs cached)",
+                        hits, n_missed, PATH_CACHE.hits, PATH_CACHE.misses, len(PATH_CACHE.entries))
+
+        # A retry request looks the missed pairs up in the cost-to-go fields of its session first
+        to_search = missed
+        if self.retry_session is not None and missed:
+            resolved = self.retry_session.resolve(self, states, missed)
+            to_search = {i: [j for j in ends if (i, j) not in resolved] for i, ends in missed.items()}
+            to_search = {i: ends for i, ends in to_search.items() if ends}
+            logger.info("Retry session: %s of %s missed pairs resolved", len(resolved), n_missed)
+            n_missed -= len(resolved)
+
+        if self.workers > 1 and n_missed >= MIN_PARALLEL_PAIRS:
+            # Spread the per-source searches over the process pool and merge the results into the tables
+            results, expanded = search_parallel(self, states, to_search, self.workers)
+            self.expanded_states += expanded
+            for i, j, cost, path in results:
+                if cost is None:
+                    continue
+                start, end = states[i], states[j]
+                self.cost_table[(start, end)] = cost
+                self.cost_table[(end, start)] = cost
+                self.path_table[(start, end)] = (path, False)
+                self.path_table[(end, start)] = (path, True)
+        else:
+            self.search_pairs(states, to_search)
+
+        if to_search:
+            logger.info("Searched %s pairs, %s states expanded so far", n_missed, self.expanded_states)
+
+        # Store the newly searched pairs, including the ones without any path
+        for i, ends in missed.items():
+            start = states[i]
+            for end in (states[j] for j in ends):
+                if (start, end) in self.path_table:
+                    compact, reverse = self.path_table[(start, end)]
+                    value = (self.cost_table[(start, end)], compact[::-1] if reverse else compact)
+                else:
+                    value = None
+                PATH_CACHE.put(layout_key, start.get_state_key(), end.get_state_key(), value)
 
 if __name__ == "__main__":
     pass
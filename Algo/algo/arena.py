@@ -0,0 +1,166 @@
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+import numpy as np
+from entities.Entity import CellState, Obstacle
+from consts import Direction, MOVE_DIRECTION, ARENA_MODELS_SIZE
+from algo.symmetry import transform_vector
+from algo.primitives import TurnPrimitive
+
+# Directions in the order of their packed index, see MazeSolver.pack_state
+DIRECTIONS = [Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST]
+
+# Obstacle used to read the view state offsets off Obstacle.get_view_state, far enough from the walls for all of
+# them to be valid
+VIEW_PROBE = 10
+
+
+class ArenaModel:
+    """Everything the planner needs that depends on the arena size and the turn primitives but not on the obstacles
+
+    Built once per (size_x, size_y, turn primitive set) by get_arena_model and shared by every MazeSolver, so that
+    a solver only checks the candidate moves and view states against its obstacles.
+    """
+
+    def __init__(self, size_x: int, size_y: int, primitives: Tuple[TurnPrimitive, ...]):
+        """
+        Args:
+            size_x (int): Size of the arena in the x direction
+            size_y (int): Size of the arena in the y direction
+            primitives (Tuple[TurnPrimitive, ...]): turn primitives, see algo.primitives
+        """
+        self.size_x = size_x
+        self.size_y = size_y
+        self.primitives = tuple(primitives)
+        # Candidate moves from every packed direction: (dx, dy, new direction, turn primitive or None)
+        self.moves = [self.get_direction_moves(direction) for direction in DIRECTIONS]
+        # Swept cells of every turn from every packed direction, see algo.primitives:
+        # (packed direction, turn primitive) -> (move column, body cells, margin cells)
+        self.sweeps = dict()
+        for d, direction_moves in enumerate(self.moves):
+            for column, (_, _, _, turn) in enumerate(direction_moves):
+                if turn is not None:
+                    self.sweeps[(d, turn)] = (column,) + tuple(
+                        tuple(sorted(transform_vector((d, False), dx, dy) for dx, dy in cells))
+                        for cells in (turn.body_cells, turn.margin_cells))
+
+        # The same moves from every packed state as (n_states, moves per direction) arrays, see
+        # MazeSolver.fill_transitions, with a -1 successor where the move ends out of bounds
+        index = np.arange(size_x * size_y * 4)
+        self.state_x, self.state_y, self.state_direction = index // 4 // size_y, index // 4 % size_y, index % 4
+        # Every direction has the same number of moves, the turns add their extra cost
+        moves = np.array([[(dx, dy, move_direction >> 1, turn is not None, turn.cost if turn else 0)
+                           for dx, dy, move_direction, turn in direction_moves]
+                          for direction_moves in self.moves])
+        moves = moves[self.state_direction]
+        self.move_x = self.state_x[:, None] + moves[:, :, 0]
+        self.move_y = self.state_y[:, None] + moves[:, :, 1]
+        self.move_direction = moves[:, :, 2]
+        self.move_turn = moves[:, :, 3].astype(bool)
+        self.move_cost = moves[:, :, 4]
+        in_bounds = (self.move_x > 0) & (self.move_x < size_x - 1) & (self.move_y > 0) & (self.move_y < size_y - 1)
+        self.move_next = np.where(in_bounds, (self.move_x * size_y + self.move_y) * 4 + self.move_direction, -1)
+        # Out of bounds moves point at the first state, so that the arrays can index the masks of the arena
+        self.move_x[~in_bounds] = 0
+        self.move_y[~in_bounds] = 0
+
+        # Candidate moves of every packed state that end in bounds: (packed successor, x, y, new direction, turn)
+        self.state_moves = [
+            [(nxt, x, y, DIRECTIONS[d], move[3]) for nxt, x, y, d, move in zip(*row, self.moves[direction])
+             if nxt >= 0]
+            for direction, *row in zip(self.state_direction.tolist(), self.move_next.tolist(), self.move_x.tolist(),
+                                       self.move_y.tolist(), self.move_direction.tolist())]
+        # View state offsets from an obstacle facing every direction: (dx, dy, view direction, penalty)
+        size = 2 * VIEW_PROBE + 1
+        self.view_offsets = dict()
+        for direction in DIRECTIONS:
+            for retrying in (False, True):
+                probe = Obstacle(VIEW_PROBE, VIEW_PROBE, direction, -1)
+                self.view_offsets[(int(direction), retrying)] = [
+                    (view_state.x - VIEW_PROBE, view_state.y - VIEW_PROBE, view_state.direction, view_state.penalty)
+                    for view_state in probe.get_view_state(retrying, size, size)]
+
+    def get_direction_moves(self, direction: Direction) -> List[tuple]:
+        """Get the candidate moves from a direction, in the order MazeSolver.get_neighbors lists them
+
+        Straight moves go forward and backward. The turn primitives ending in a direction follow its straight
+        moves, with the offset of a robot facing north rotated to the direction.
+
+        Args:
+            direction (Direction): direction of the robot
+
+        Returns:
+            List[tuple]: (dx, dy, new direction, turn primitive or None for a straight move)
+        """
+        moves = []
+        for dx, dy, move_direction in MOVE_DIRECTION:
+            if move_direction == direction:
+                moves.append((dx, dy, move_direction, None))
+                moves.append((-dx, -dy, move_direction, None))
+            for primitive in self.primitives:
+                if move_direction == (direction + primitive.heading) % 8:
+                    moves.append(transform_vector((direction >> 1, False), *primitive.offset)
+                                 + (move_direction, primitive))
+        return moves
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        """
+        Returns whether the robot fits in the arena at x, y, see helper.is_valid
+        """
+        return 0 < x < self.size_x - 1 and 0 < y < self.size_y - 1
+
+    def get_moves(self, x: int, y: int, direction: Direction) -> List[tuple]:
+        """Get the candidate moves from a state that end in bounds, looked up in state_moves inside the arena
+
+        Args:
+            x (int): x coordinate
+            y (int): y coordinate
+            direction (Direction): direction of the robot
+
+        Returns:
+            List[tuple]: (packed successor, x, y, new direction, turn primitive or None)
+        """
+        return [((next_x * self.size_y + next_y) * 4 + (move_direction >> 1), next_x, next_y, move_direction, turn)
+                for next_x, next_y, move_direction, turn in
+                ((x + dx, y + dy, move_direction, turn) for dx, dy, move_direction, turn in self.moves[direction >> 1])
+                if self.in_bounds(next_x, next_y)]
+
+    def get_view_states(self, obstacle: Obstacle, retrying) -> List[CellState]:
+        """Get the view states of an obstacle that are in bounds, as Obstacle.get_view_state does
+
+        Args:
+            obstacle (Obstacle): obstacle
+            retrying (bool): whether the robot is retrying the obstacle, which allows other view positions
+
+        Returns:
+            List[CellState]: cell states where the robot can be positioned to view the symbol on the obstacle
+        """
+        return [CellState(obstacle.x + dx, obstacle.y + dy, direction, obstacle.obstacle_id, penalty)
+                for dx, dy, direction, penalty in self.view_offsets.get((int(obstacle.direction), retrying), ())
+                if self.in_bounds(obstacle.x + dx, obstacle.y + dy)]
+
+
+# Arena models by (size_x, size_y, turn primitives), least recently used first
+ARENA_MODELS = OrderedDict()
+_arena_models_lock = threading.Lock()
+
+
+def get_arena_model(size_x: int, size_y: int, primitives: Tuple[TurnPrimitive, ...]) -> ArenaModel:
+    """Get the shared model of an arena, building it on first use
+
+    Args:
+        size_x (int): Size of the arena in the x direction
+        size_y (int): Size of the arena in the y direction
+        primitives (Tuple[TurnPrimitive, ...]): turn primitives, see algo.primitives
+
+    Returns:
+        ArenaModel: the model, shared by every MazeSolver with the same arena and turn primitives
+    """
+    key = (size_x, size_y, tuple(primitives))
+    with _arena_models_lock:
+        if key not in ARENA_MODELS:
+            ARENA_MODELS[key] = ArenaModel(size_x, size_y, primitives)
+            while len(ARENA_MODELS) > ARENA_MODELS_SIZE:
+                ARENA_MODELS.popitem(last=False)
+        ARENA_MODELS.move_to_end(key)
+        return ARENA_MODELS[key]
@@ -0,0 +1,80 @@
+import heapq
+
+
+class HeapFrontier:
+    """Binary heap frontier, pops the smallest priority first and breaks ties by the smallest item"""
+
+    def __init__(self):
+        self.heap = []
+
+    def push(self, priority: int, item: int):
+        """Add an item to the frontier
+
+        Args:
+            priority (int): priority of the item, smaller is popped first
+            item (int): packed state index
+        """
+        heapq.heappush(self.heap, (priority, item))
+
+    def pop(self):
+        """Remove the item with the smallest priority
+
+        Returns:
+            tuple: (priority, item)
+        """
+        return heapq.heappop(self.heap)
+
+    def __bool__(self):
+        return bool(self.heap)
+
+
+class BucketFrontier:
+    """Bucket queue frontier (Dial's algorithm) for integer priorities
+
+    Items with the same priority share a bucket, so only the first push of a priority and the pop emptying its
+    bucket touch the ordered index of priorities. Search costs are small integers with many ties, so most pushes
+    and pops are O(1) list operations. The index is a heap of the distinct priorities rather than a dense array,
+    because SAFE_COST makes the priorities jump by thousands, and it keeps the order exact when A* pushes a
+    priority below the last popped one. Items in the same bucket are popped last in, first out.
+    """
+
+    def __init__(self):
+        self.buckets = dict()
+        self.priorities = []
+
+    def push(self, priority: int, item: int):
+        """Add an item to the frontier
+
+        Args:
+            priority (int): priority of the item, smaller is popped first
+            item (int): packed state index
+        """
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            self.buckets[priority] = [item]
+            heapq.heappush(self.priorities, priority)
+        else:
+            bucket.append(item)
+
+    def pop(self):
+        """Remove an item with the smallest priority
+
+        Returns:
+            tuple: (priority, item)
+        """
+        priority = self.priorities[0]
+        bucket = self.buckets[priority]
+        item = bucket.pop()
+        if not bucket:
+            heapq.heappop(self.priorities)
+            del self.buckets[priority]
+        return priority, item
+
+    def __bool__(self):
+        return bool(self.priorities)
+
+
+FRONTIERS = {
+    "heap": HeapFrontier,
+    "bucket": BucketFrontier,
+}
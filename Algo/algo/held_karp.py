@@ -0,0 +1,58 @@
+import numpy as np
+
+# Largest number of DP entries computed at once, larger batches are solved in chunks to bound the memory use
+MAX_DP_ENTRIES = 1 << 22
+
+
+def solve_open_tsp_batch(cost: np.ndarray):
+    """Solve a batch of open-path TSPs starting at node 0 with one vectorized Held-Karp DP
+
+    Every instance starts at node 0, visits every other node once and does not return, so the tours of all
+    the instances are found by the same pass over the subsets of nodes 1..k-1.
+
+    Args:
+        cost (np.ndarray): (batch, k, k) cost tensor, cost[b][u][v] is the cost of moving from u to v in instance b
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (batch,) tour costs and (batch, k) visiting orders starting with node 0
+    """
+    batch, k, _ = cost.shape
+    m = k - 1
+    if m == 0:
+        return np.zeros(batch), np.zeros((batch, 1), dtype=int)
+
+    chunk = max(1, MAX_DP_ENTRIES // ((1 << m) * m))
+    if batch > chunk:
+        solved = [solve_open_tsp_batch(cost[start:start + chunk]) for start in range(0, batch, chunk)]
+        return np.concatenate([d for d, _ in solved]), np.concatenate([o for _, o in solved])
+
+    # dp[b][mask][j]: cheapest cost from node 0 visiting the nodes in mask (bit j is node j + 1), ending at node j + 1
+    dp = np.full((batch, 1 << m, m), np.inf)
+    parent = np.full((batch, 1 << m, m), -1, dtype=np.int8)
+    inner = cost[:, 1:, 1:]
+    for j in range(m):
+        dp[:, 1 << j, j] = cost[:, 0, j + 1]
+
+    for mask in range(1, 1 << m):
+        bits = np.array([j for j in range(m) if mask & (1 << j)])
+        if len(bits) < 2:
+            continue
+        # Extend the best path over mask without node j by the edge to node j, for every j in mask at once
+        total = dp[:, mask ^ (1 << bits), :] + inner[:, :, bits].transpose(0, 2, 1)
+        best_prev = np.argmin(total, axis=2)
+        dp[:, mask, bits] = np.take_along_axis(total, best_prev[:, :, None], axis=2)[:, :, 0]
+        parent[:, mask, bits] = best_prev
+
+    # Backtrack the visiting orders of all the instances together
+    full = (1 << m) - 1
+    last = np.argmin(dp[:, full, :], axis=1)
+    distance = dp[np.arange(batch), full, last]
+    order = np.zeros((batch, k), dtype=int)
+    mask = np.full(batch, full)
+    for pos in range(k - 1, 0, -1):
+        order[:, pos] = last + 1
+        prev = parent[np.arange(batch), mask, last]
+        mask = mask ^ (1 << last)
+        last = prev.astype(int)
+
+    return distance, order
@@ -0,0 +1,148 @@
+import argparse
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+import numpy as np
+from consts import MOVE_DIRECTION, TURN_FACTOR, TURN_SWEEP_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+# Generated tables are stored here, named after the arena size and a digest of the motion parameters,
+# so a change of the turn parameters in consts.py leads to a new table instead of a stale one
+HEURISTIC_DIR = Path(__file__).resolve().parent.parent / 'heuristics'
+
+# Bump when the neighbor generation changes in a way the motion parameters do not capture
+HEURISTIC_VERSION = 2
+
+# Cost stored for states that cannot reach the goal even without obstacles
+UNREACHABLE = np.iinfo(np.uint16).max
+
+# Tables above this many states (5 MB for the 20x20 arena) are not generated, the searches fall back to Manhattan
+MAX_TABLE_STATES = 10000
+
+# Goals relaxed together by generate_table, bounds its int32 arrays to GOAL_CHUNK x states
+GOAL_CHUNK = 512
+
+# Loaded tables, shared by every MazeSolver in the process, and the missing ones already reported
+_tables = dict()
+_missing = set()
+_tables_lock = threading.Lock()
+
+
+def table_path(size_x: int, size_y: int, primitives: tuple) -> Path:
+    """Get the file of the obstacle-free cost table for an arena size and turn primitive set
+
+    Args:
+        size_x (int): Size of the grid in the x direction
+        size_y (int): Size of the grid in the y direction
+        primitives (tuple): turn primitives used by MazeSolver.get_neighbors, see algo.primitives
+
+    Returns:
+        Path: .npy file of the table
+    """
+    params = (HEURISTIC_VERSION, size_x, size_y, list(primitives), TURN_FACTOR, TURN_SWEEP_SAMPLES,
+              [(dx, dy, int(md)) for dx, dy, md in MOVE_DIRECTION])
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return HEURISTIC_DIR / f"free_cost_{size_x}x{size_y}_{digest}.npy"
+
+
+def generate_table(path: Path, transitions):
+    """Compute the exact obstacle-free cost between every pair of states and save it as a .npy file
+
+    table[goal][state] is the cost from state to goal. The rows are computed GOAL_CHUNK at a time with a vectorized
+    Bellman-Ford relaxation: cost(state) = min over successors of move cost + cost(successor). This takes seconds
+    to minutes, so it only runs offline, see the __main__ block.
+
+    Args:
+        path (Path): file to write
+        transitions (List[List[tuple]]): (packed successor, move cost) of every packed state on an empty grid
+    """
+    n_states = len(transitions)
+    n_slots = max((len(t) for t in transitions), default=0)
+
+    # successors[k][state] is the k-th successor of state, padded with the state itself at an infinite cost
+    successors = np.tile(np.arange(n_states), (n_slots, 1))
+    move_costs = np.full((n_slots, n_states), UNREACHABLE, dtype=np.int32)
+    for state, state_transitions in enumerate(transitions):
+        for k, (successor, move_cost) in enumerate(state_transitions):
+            successors[k][state] = successor
+            move_costs[k][state] = move_cost
+
+    HEURISTIC_DIR.mkdir(exist_ok=True)
+    # Write to a temporary file of this process first so that a concurrent reader never sees a partial table
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp.npy')
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint16, shape=(n_states, n_states))
+    for first in range(0, n_states, GOAL_CHUNK):
+        goals = np.arange(first, min(first + GOAL_CHUNK, n_states))
+        table = np.full((len(goals), n_states), UNREACHABLE, dtype=np.int32)
+        table[np.arange(len(goals)), goals] = 0
+        changed = True
+        while changed:
+            changed = False
+            for k in range(n_slots):
+                relaxed = np.minimum(table[:, successors[k]] + move_costs[k], UNREACHABLE)
+                improved = relaxed < table
+                if improved.any():
+                    table[improved] = relaxed[improved]
+                    changed = True
+        out[goals] = table
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+
+
+def get_table(size_x: int, size_y: int, primitives: tuple):
+    """Get the memory-mapped obstacle-free cost table generated offline, see the __main__ block
+
+    Args:
+        size_x (int): Size of the grid in the x direction
+        size_y (int): Size of the grid in the y direction
+        primitives (tuple): turn primitives used by MazeSolver.get_neighbors, see algo.primitives
+
+    Returns:
+        np.memmap: table[goal][state], or None if the arena is too large for a table or it was not generated
+    """
+    if size_x * size_y * 4 > MAX_TABLE_STATES:
+        return None
+
+    path = table_path(size_x, size_y, primitives)
+    with _tables_lock:
+        if path not in _tables:
+            if not path.exists():
+                if path not in _missing:
+                    _missing.add(path)
+                    logger.warning("No obstacle-free cost table %s, run python -m algo.heuristic", path.name)
+                return None
+            _tables[path] = np.load(path, mmap_mode='r')
+        return _tables[path]
+
+
+def main():
+    # Offline generation of the tables of an arena size and its turn primitive sets, run from the Algo directory:
+    #     python -m algo.heuristic [--size 20 20] [--primitives 3-1 4-2 tight]
+    from algo.algo import MazeSolver
+    from algo.primitives import PRIMITIVE_SETS
+    from consts import WIDTH, HEIGHT
+
+    parser = argparse.ArgumentParser(description="Generate the obstacle-free cost tables of the A* table heuristic")
+    parser.add_argument("--size", type=int, nargs=2, default=[WIDTH, HEIGHT], metavar=("X", "Y"))
+    parser.add_argument("--primitives", nargs="+", default=sorted(PRIMITIVE_SETS), choices=sorted(PRIMITIVE_SETS))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    size_x, size_y = args.size
+    if size_x * size_y * 4 > MAX_TABLE_STATES:
+        parser.error(f"{size_x}x{size_y} has more than MAX_TABLE_STATES = {MAX_TABLE_STATES} states")
+    for name in args.primitives:
+        maze_solver = MazeSolver(size_x, size_y, 1, 1, 0, primitives=name)
+        path = table_path(size_x, size_y, maze_solver.primitives)
+        if not path.exists():
+            logger.info("Generating obstacle-free cost table %s", path.name)
+            generate_table(path, maze_solver.get_free_transitions())
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from collections import deque
+from typing import List
+import numpy as np
+
+# Coarse distance of the cells that cannot be reached
+UNREACHED = -1
+
+
+def coarsen(reachable_mask: np.ndarray, factor: int) -> np.ndarray:
+    """Coarsen the clearance mask of the fine grid into blocks of factor x factor cells
+
+    A block is free if the robot can be placed on any of its cells, so that narrow passages stay open on the
+    coarse grid. The coarse costs are only estimates, the legs are refined on the fine lattice.
+
+    Args:
+        reachable_mask (np.ndarray): (size_x, size_y) mask of the fine cells where the robot can be placed
+        factor (int): fine cells per coarse cell along each axis
+
+    Returns:
+        np.ndarray: (ceil(size_x / factor), ceil(size_y / factor)) mask of the free coarse cells
+    """
+    size_x, size_y = reachable_mask.shape
+    coarse_x, coarse_y = -(-size_x // factor), -(-size_y // factor)
+    padded = np.zeros((coarse_x * factor, coarse_y * factor), dtype=bool)
+    padded[:size_x, :size_y] = reachable_mask
+    return padded.reshape(coarse_x, factor, coarse_y, factor).any(axis=(1, 3))
+
+
+def coarse_search(free: np.ndarray, source: tuple):
+    """Breadth-first search over the free coarse cells, moving to the 4 neighbouring cells
+
+    Args:
+        free (np.ndarray): mask of the free coarse cells, see coarsen
+        source (tuple): (x, y) coarse cell to search from, searched from even if not free
+
+    Returns:
+        Tuple[np.ndarray, dict]: number of coarse moves to every cell (UNREACHED if none) and the parent of every
+        reached cell
+    """
+    coarse_x, coarse_y = free.shape
+    distance = np.full(free.shape, UNREACHED, dtype=int)
+    distance[source] = 0
+    parent = {source: None}
+    queue = deque([source])
+    while queue:
+        x, y = queue.popleft()
+        for next_x, next_y in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= next_x < coarse_x and 0 <= next_y < coarse_y and free[next_x, next_y] \
+                    and distance[next_x, next_y] == UNREACHED:
+                distance[next_x, next_y] = distance[x, y] + 1
+                parent[(next_x, next_y)] = (x, y)
+                queue.append((next_x, next_y))
+    return distance, parent
+
+
+def coarse_path(parent: dict, target: tuple) -> List[tuple]:
+    """Rebuild the coarse cells from the source of a coarse_search to a target it reached
+
+    Args:
+        parent (dict): parent of every reached cell, see coarse_search
+        target (tuple): (x, y) coarse cell
+
+    Returns:
+        List[tuple]: (x, y) coarse cells from the target back to the source
+    """
+    path = []
+    cell = target
+    while cell is not None:
+        path.append(cell)
+        cell = parent[cell]
+    return path
+
+
+def corridor_states(cells: List[tuple], coarse_shape: tuple, factor: int, radius: int, size_x: int,
+                    size_y: int) -> bytearray:
+    """Mark the fine lattice states within radius coarse cells of the given coarse cells
+
+    Args:
+        cells (List[tuple]): (x, y) coarse cells along the corridor
+        coarse_shape (tuple): shape of the coarse grid
+        factor (int): fine cells per coarse cell along each axis
+        radius (int): coarse cells added around the given ones in every direction
+        size_x (int): Size of the fine grid in the x direction
+        size_y (int): Size of the fine grid in the y direction
+
+    Returns:
+        bytearray: 1 for every packed state inside the corridor, see MazeSolver.pack_state
+    """
+    coarse = np.zeros(coarse_shape, dtype=bool)
+    for x, y in cells:
+        coarse[max(0, x - radius):x + radius + 1, max(0, y - radius):y + radius + 1] = True
+    fine = coarse.repeat(factor, axis=0).repeat(factor, axis=1)[:size_x, :size_y]
+    # Packed states are ordered by (x, y, direction), as the C order of a (size_x, size_y, 4) array
+    return bytearray(fine.repeat(4).astype(np.uint8).tobytes())
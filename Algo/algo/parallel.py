@@ -0,0 +1,175 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List
+import numpy as np
+from entities.Entity import CellState
+from consts import Direction
+
+# Fewer missed pairs than this are searched in the request thread, the round trip to the pool is not worth it
+MIN_PARALLEL_PAIRS = 64
+
+# Tasks per worker, so that a worker finishing early picks up more sources instead of idling
+TASKS_PER_WORKER = 4
+
+# Process pool shared by every MazeSolver in the server process, created on first use
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Solver of the last layout searched by this worker process, reused while the tasks of one request come in
+_worker_solver = None
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """Get the process pool, creating it on first use or when the number of workers changes
+
+    Args:
+        workers (int): number of worker processes
+
+    Returns:
+        ProcessPoolExecutor: the pool
+    """
+    global _pool, _pool_workers
+    # Requests are served by several threads, only one of them may create the pool
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+def default_workers() -> int:
+    """Number of workers when none is configured: every core but the one serving requests"""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def get_worker_solver(layout: bytes, n_obstacles: int, size_x: int, size_y: int, options: dict):
+    """Get a MazeSolver for the layout in this worker process, reusing the previous one if nothing changed
+
+    Args:
+        layout (bytes): obstacle array read from the shared memory block
+        n_obstacles (int): number of obstacles in the array
+        size_x (int): Size of the grid in the x direction
+        size_y (int): Size of the grid in the y direction
+        options (dict): search options, see MazeSolver.get_search_options
+
+    Returns:
+        MazeSolver: solver with the obstacles added
+    """
+    # Imported here to avoid the circular import with algo.algo
+    from algo.algo import MazeSolver
+
+    global _worker_solver
+    key = (layout, size_x, size_y, tuple(sorted(options.items())))
+    if _worker_solver is None or _worker_solver[0] != key:
+        maze_solver = MazeSolver(size_x, size_y, 1, 1, 0, **options)
+        for x, y, direction, obstacle_id in np.frombuffer(layout, dtype=np.int64).reshape(n_obstacles, 4).tolist():
+            maze_solver.add_obstacle(x, y, direction, obstacle_id)
+        _worker_solver = (key, maze_solver)
+    return _worker_solver[1]
+
+
+def search_sources(shm_name: str, n_obstacles: int, size_x: int, size_y: int, options: dict,
+                   state_keys: List[tuple], tasks: List[tuple]):
+    """Worker entry point: search the paths from a few source states
+
+    Args:
+        shm_name (str): name of the shared memory block holding the obstacle array
+        n_obstacles (int): number of obstacles in the array
+        size_x (int): Size of the grid in the x direction
+        size_y (int): Size of the grid in the y direction
+        options (dict): search options, see MazeSolver.get_search_options
+        state_keys (List[tuple]): (x, y, direction) of every state of the request
+        tasks (List[tuple]): (i, [j, ...]) pairs, search from state i to each state j
+
+    Returns:
+        tuple: ([(i, j, cost, path), ...], states expanded), path is the compact path from i to j, see
+            MazeSolver.compress_path, cost and path are None if there is no path
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        layout = bytes(shm.buf[:n_obstacles * 4 * 8])
+    finally:
+        shm.close()
+
+    maze_solver = get_worker_solver(layout, n_obstacles, size_x, size_y, options)
+    # Only this task's pairs are returned, so the tables of the previous task are dropped
+    maze_solver.path_table = dict()
+    maze_solver.cost_table = dict()
+    expanded = maze_solver.expanded_states
+
+    states = [CellState.intern(x, y, Direction(direction)) for x, y, direction in state_keys]
+    maze_solver.search_pairs(states, dict(tasks))
+
+    results = []
+    for i, ends in tasks:
+        for j in ends:
+            pair = (states[i], states[j])
+            if pair in maze_solver.path_table:
+                compact, reverse = maze_solver.path_table[pair]
+                results.append((i, j, maze_solver.cost_table[pair], compact[::-1] if reverse else compact))
+            else:
+                results.append((i, j, None, None))
+    return results, maze_solver.expanded_states - expanded
+
+
+def split_tasks(missed: dict, n_tasks: int) -> List[List[tuple]]:
+    """Split the per-source searches into tasks with a similar number of pairs
+
+    Args:
+        missed (dict): i -> [j, ...], the states to search from states[i]
+        n_tasks (int): maximum number of tasks
+
+    Returns:
+        List[List[tuple]]: the (i, [j, ...]) pairs of every task
+    """
+    tasks = [[] for _ in range(min(n_tasks, len(missed)))]
+    loads = [0] * len(tasks)
+    # Largest sources first, each to the least loaded task
+    for i, ends in sorted(missed.items(), key=lambda item: -len(item[1])):
+        k = loads.index(min(loads))
+        tasks[k].append((i, ends))
+        loads[k] += len(ends)
+    return tasks
+
+
+def search_parallel(maze_solver, states: List, missed: dict, workers: int):
+    """Search the missed pairs in the process pool
+
+    The obstacle layout is written once to a shared memory block that every task attaches to by name,
+    the states and the source/target indices are sent with the task.
+
+    Args:
+        maze_solver (MazeSolver): solver of the request
+        states (List[CellState]): states of the request
+        missed (dict): i -> [j, ...], the states to search from states[i]
+        workers (int): number of worker processes
+
+    Returns:
+        tuple: ([(i, j, cost, path), ...], states expanded)
+    """
+    obstacles = maze_solver.grid.obstacles
+    layout = np.array([[ob.x, ob.y, int(ob.direction), ob.obstacle_id] for ob in obstacles],
+                      dtype=np.int64).reshape(len(obstacles), 4)
+    shm = shared_memory.SharedMemory(create=True, size=max(layout.nbytes, 1))
+    try:
+        shm.buf[:layout.nbytes] = layout.tobytes()
+        state_keys = [state.get_state_key() for state in states]
+        pool = get_pool(workers)
+        futures = [pool.submit(search_sources, shm.name, len(obstacles), maze_solver.grid.size_x,
+                               maze_solver.grid.size_y, maze_solver.get_search_options(), state_keys, tasks)
+                   for tasks in split_tasks(missed, workers * TASKS_PER_WORKER)]
+        results = []
+        expanded = 0
+        for future in futures:
+            task_results, task_expanded = future.result()
+            results.extend(task_results)
+            expanded += task_expanded
+    finally:
+        shm.close()
+        shm.unlink()
+    return results, expanded
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+from consts import PATH_CACHE_SIZE
+
+# Returned by PathCache.get when the key is not cached, None is a valid cached value (no path exists)
+MISSING = object()
+
+
+class PathCache:
+    """Size-bounded LRU cache of pairwise path costs and paths, shared by every MazeSolver in the process
+
+    Keys are built from the obstacle layout, the pair of (x, y, direction) states and the turn primitive set,
+    so the robot start position does not matter and identical states from different requests match.
+    Values are (cost, path) tuples, path being the packed states kept by MazeSolver.compress_path, or None when no
+    path exists between the two states.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size (int): Maximum number of state pairs kept in the cache
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # (start_key, end_key) pairs cached for every layout key, to carry them over to an edited layout
+        self.layouts = dict()
+        self.lock = threading.Lock()
+
+    def get(self, layout_key, start_key, end_key):
+        """Look up the path between two states in either direction, marking it as most recently used
+
+        Args:
+            layout_key (tuple): key of the obstacle layout, turn primitive set and search mode
+            start_key (tuple): (x, y, direction) of the start state
+            end_key (tuple): (x, y, direction) of the end state
+
+        Returns:
+            tuple: (cost, path) from start to end, None if there is no path, or MISSING if the pair is not cached
+        """
+        with self.lock:
+            for key, reverse in (((layout_key, start_key, end_key), False), ((layout_key, end_key, start_key), True)):
+                if key not in self.entries:
+                    continue
+                self.hits += 1
+                self.entries.move_to_end(key)
+                value = self.entries[key]
+                if value is not None and reverse:
+                    value = (value[0], value[1][::-1])
+                return value
+
+            self.misses += 1
+            return MISSING
+
+    def put(self, layout_key, start_key, end_key, value):
+        """Store the path between two states, evicting the least recently used pairs when the cache is full
+
+        Args:
+            layout_key (tuple): key of the obstacle layout, turn primitive set and search mode
+            start_key (tuple): (x, y, direction) of the start state
+            end_key (tuple): (x, y, direction) of the end state
+            value (tuple): (cost, path) from start to end, or None if there is no path
+        """
+        key = (layout_key, start_key, end_key)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.layouts.setdefault(layout_key, set()).add((start_key, end_key))
+            while len(self.entries) > self.max_size:
+                (old_layout_key, old_start_key, old_end_key), _ = self.entries.popitem(last=False)
+                pairs = self.layouts[old_layout_key]
+                pairs.discard((old_start_key, old_end_key))
+                if not pairs:
+                    del self.layouts[old_layout_key]
+
+    def get_layout_keys(self):
+        """
+        Returns the layout keys with at least one cached pair
+        """
+        with self.lock:
+            return list(self.layouts)
+
+    def get_layout_entries(self, layout_key):
+        """Get every pair cached for a layout, without counting hits or marking them as recently used
+
+        Args:
+            layout_key (tuple): key of the obstacle layout, turn primitive set and search mode
+
+        Returns:
+            List[tuple]: (start_key, end_key, value) of every cached pair, see put
+        """
+        with self.lock:
+            return [(start_key, end_key, self.entries[(layout_key, start_key, end_key)])
+                    for start_key, end_key in self.layouts.get(layout_key, ())]
+
+    def clear(self):
+        """
+        Removes every cached pair and resets the counters
+        """
+        with self.lock:
+            self.entries.clear()
+            self.layouts.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+PATH_CACHE = PathCache(PATH_CACHE_SIZE)
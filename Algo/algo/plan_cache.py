@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+from consts import PLAN_CACHE_SIZE
+
+# Part of every plan key, bump when the planner returns other plans for the same request so that the plans cached
+# or stored before are not served any more. 2 since the turns are checked against their swept cells, 3 since the
+# commands of a mirrored request are not stored
+PLAN_VERSION = 3
+
+
+class PlanCache:
+    """Size-bounded LRU cache of solved plans, shared by every MazeSolver in the process
+
+    Keys are canonical forms of the layout and start state under the symmetries of the arena, see algo.symmetry,
+    with the options of the request, so a rotated copy of a solved layout is a lookup. Values are plans in the
+    canonical arena, see MazeSolver.get_canonical_plan.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size (int): Maximum number of plans kept in the cache
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Look up a plan, marking it as most recently used
+
+        Args:
+            key (tuple): canonical key of the request, see MazeSolver.get_plan_key
+
+        Returns:
+            tuple: the canonical plan, or None if it is not cached
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, plan):
+        """Store a plan, evicting the least recently used plans when the cache is full
+
+        Args:
+            key (tuple): canonical key of the request, see MazeSolver.get_plan_key
+            plan (tuple): the canonical plan
+        """
+        with self.lock:
+            self.entries[key] = plan
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every cached plan and resets the counters
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+PLAN_CACHE = PlanCache(PLAN_CACHE_SIZE)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+# Store of the /path endpoint when the PLAN_STORE environment variable is not set
+DEFAULT_STORE = Path(__file__).resolve().parent.parent / 'plans.db'
+
+
+def get_store_key(plan_key: tuple) -> tuple:
+    """Split a plan key into the key columns of the store
+
+    Args:
+        plan_key (tuple): canonical key of the request, see MazeSolver.get_plan_key
+
+    Returns:
+        tuple: (layout hash, start x, start y, start direction, options hash) in the canonical arena, the options
+        include PLAN_VERSION so that the plans of an older planner are not served
+    """
+    size_x, size_y, obstacles, start = plan_key[:4]
+    layout_hash = hashlib.sha1(repr((size_x, size_y, obstacles)).encode()).hexdigest()
+    options_hash = hashlib.sha1(repr(plan_key[4:]).encode()).hexdigest()
+    return (layout_hash,) + tuple(start) + (options_hash,)
+
+
+def get_canonical_commands(commands: List[str], transform: tuple, obstacle_ids: List[int]) -> List[str]:
+    """Replace the obstacle ids of the SNAP commands by their position in the canonical layout
+
+    The other commands are relative to the robot, so they are the same for every rotation of the layout. A mirror
+    swaps left and right, so the commands of a mirrored request are not kept.
+
+    Args:
+        commands (List[str]): commands of the plan, see command_generator
+        transform (tuple): transform from the arena of the request to the canonical one, see algo.symmetry
+        obstacle_ids (List[int]): id of the obstacle at every position of the canonical layout
+
+    Returns:
+        List[str]: the commands with SNAP{position}_{L|C|R}, or None if the transform is mirrored
+    """
+    if transform[1]:
+        return None
+    index = {str(obstacle_id): i for i, obstacle_id in enumerate(obstacle_ids)}
+    canonical = []
+    for command in commands:
+        if command.startswith("SNAP"):
+            obstacle_id, side = command[4:].rsplit("_", 1)
+            command = f"SNAP{index[obstacle_id]}_{side}"
+        canonical.append(command)
+    return canonical
+
+
+def restore_commands(commands: List[str], transform: tuple, obstacle_ids: List[int]):
+    """Map stored commands back to the obstacle ids of a request, see get_canonical_commands
+
+    Args:
+        commands (List[str]): stored commands
+        transform (tuple): transform from the arena of the request to the canonical one, see algo.symmetry
+        obstacle_ids (List[int]): id of the obstacle at every position of the canonical layout
+
+    Returns:
+        List[str]: the commands, or None if they have to be generated again as a mirror swaps left and right
+    """
+    if commands is None or transform[1]:
+        return None
+    restored = []
+    for command in commands:
+        if command.startswith("SNAP"):
+            position, side = command[4:].rsplit("_", 1)
+            command = f"SNAP{obstacle_ids[int(position)]}_{side}"
+        restored.append(command)
+    return restored
+
+
+class PlanStore:
+    """Solved plans kept in an SQLite file, so that they outlive the server process
+
+    Plans are stored in the canonical arena of MazeSolver.get_plan_key, keyed by a hash of the canonical layout,
+    the canonical start pose and a hash of the solver options, with their commands and distance. The commands
+    are kept as the first request without a mirror drove them, see get_canonical_commands. The store is
+    filled by the /path endpoint and ahead of time by algo.precompute.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): SQLite file, created if missing
+        """
+        self.path = str(path)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Flask serves requests from several threads, the lock serializes them on the one connection
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                "layout_hash TEXT, start_x INTEGER, start_y INTEGER, start_direction INTEGER, options_hash TEXT, "
+                "path TEXT, commands TEXT, distance REAL, unreachable TEXT, lower_bound REAL, optimality_gap REAL, "
+                "PRIMARY KEY (layout_hash, start_x, start_y, start_direction, options_hash))")
+
+    def get(self, plan_key: tuple):
+        """Look up a plan
+
+        Args:
+            plan_key (tuple): canonical key of the request, see MazeSolver.get_plan_key
+
+        Returns:
+            Tuple[tuple, List[str]]: the canonical plan, see MazeSolver.get_canonical_plan, and its canonical
+            commands (None if they were not kept), or None if the plan is not stored
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT path, commands, distance, unreachable, lower_bound, optimality_gap FROM plans "
+                "WHERE layout_hash = ? AND start_x = ? AND start_y = ? AND start_direction = ? AND options_hash = ?",
+                get_store_key(plan_key)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        path, commands, distance, unreachable, lower_bound, optimality_gap = row
+        plan = (tuple(tuple(state) for state in json.loads(path)), distance, tuple(json.loads(unreachable)),
+                lower_bound, optimality_gap)
+        return plan, json.loads(commands)
+
+    def put(self, plan_key: tuple, plan: tuple, commands: List[str]):
+        """Store a plan, replacing the stored one with the same key
+
+        Args:
+            plan_key (tuple): canonical key of the request, see MazeSolver.get_plan_key
+            plan (tuple): the canonical plan, see MazeSolver.get_canonical_plan
+            commands (List[str]): the canonical commands, see get_canonical_commands, None for a mirrored request
+        """
+        path, distance, unreachable, lower_bound, optimality_gap = plan
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                get_store_key(plan_key) + (json.dumps(path), json.dumps(commands), distance,
+                                           json.dumps(unreachable), lower_bound, optimality_gap))
+
+    def __contains__(self, plan_key: tuple) -> bool:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT 1 FROM plans WHERE layout_hash = ? AND start_x = ? AND start_y = ? AND start_direction = ? "
+                "AND options_hash = ?", get_store_key(plan_key)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+
+    def close(self):
+        """
+        Closes the SQLite connection
+        """
+        with self.lock:
+            self.connection.close()
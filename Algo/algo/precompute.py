@@ -0,0 +1,142 @@
+"""Solve a corpus of /path requests ahead of time into the plan store
+
+The corpus is a JSON file holding a list of /path request payloads, or a file with one payload per line. Every
+request is solved as the /path endpoint would solve it and stored with its commands, see algo.plan_store.
+Requests already in the store, or rotated copies of them, are skipped.
+
+Usage (from the Algo directory):
+    python -m algo.precompute corpus.json [--store plans.db] [--workers 4]
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from algo.algo import MazeSolver
+from algo.parallel import default_workers
+from algo.plan_store import PlanStore, DEFAULT_STORE, get_canonical_commands
+from algo.primitives import get_robot_primitives
+from helper import command_generator, get_default_order_solver, get_default_search_mode, get_default_time_budget_ms
+from consts import WIDTH, HEIGHT
+
+logger = logging.getLogger(__name__)
+
+
+def load_corpus(path: str) -> list:
+    """Read the request payloads of a corpus file, a JSON list or one JSON payload per line"""
+    with open(path) as file:
+        text = file.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def make_solver(payload: dict) -> MazeSolver:
+    """Build the MazeSolver of a /path request payload, with the defaults of the endpoint
+
+    Args:
+        payload (dict): /path request payload
+
+    Returns:
+        MazeSolver: solver with the obstacles added
+    """
+    size_x = int(payload.get('size_x', WIDTH))
+    size_y = int(payload.get('size_y', HEIGHT))
+    search_mode = payload.get('search_mode', get_default_search_mode(size_x, size_y))
+    order_solver = payload.get('order_solver', get_default_order_solver(size_x, size_y, len(payload['obstacles'])))
+    primitives = get_robot_primitives(payload.get('primitives'), payload.get('big_turn'))
+    maze_solver = MazeSolver(size_x, size_y, int(payload['robot_x']), int(payload['robot_y']),
+                             int(payload['robot_dir']), primitives=primitives, search_mode=search_mode,
+                             order_solver=order_solver)
+    for ob in payload['obstacles']:
+        maze_solver.add_obstacle(ob['x'], ob['y'], ob['d'], ob['id'])
+    return maze_solver
+
+
+def get_options(payload: dict):
+    """
+    Returns the (retrying, time_budget_ms) of a /path request payload, parsed as the endpoint does
+    """
+    size_x, size_y = int(payload.get('size_x', WIDTH)), int(payload.get('size_y', HEIGHT))
+    order_solver = payload.get('order_solver', get_default_order_solver(size_x, size_y, len(payload['obstacles'])))
+    time_budget_ms = payload.get('time_budget_ms', get_default_time_budget_ms(size_x, size_y, order_solver))
+    return payload.get('retrying', False), float(time_budget_ms) if time_budget_ms is not None else None
+
+
+def solve(payload: dict):
+    """Solve one request, run in a worker process
+
+    Args:
+        payload (dict): /path request payload
+
+    Returns:
+        Tuple[tuple, tuple, List[str]]: the plan key, the canonical plan and its canonical commands
+    """
+    maze_solver = make_solver(payload)
+    retrying, time_budget_ms = get_options(payload)
+    plan_key, transform, obstacle_ids = maze_solver.get_plan_key(retrying, time_budget_ms)
+    optimal_path, distance = maze_solver.get_optimal_order_dp(retrying, time_budget_ms)
+    commands = command_generator(optimal_path, payload['obstacles'], maze_solver.primitives)
+    return (plan_key, maze_solver.get_canonical_plan(optimal_path, distance, transform, obstacle_ids),
+            get_canonical_commands(commands, transform, obstacle_ids))
+
+
+def precompute(corpus: list, store: PlanStore, workers: int):
+    """Solve the requests of a corpus that are not in the store yet, in parallel, and store their plans
+
+    Args:
+        corpus (list): /path request payloads
+        store (PlanStore): plan store to fill
+        workers (int): number of worker processes
+
+    Returns:
+        Tuple[int, int, int]: number of requests solved, skipped as already stored or repeated, and failed
+    """
+    # Requests with the same canonical key are solved once
+    pending = dict()
+    failed = 0
+    for payload in corpus:
+        try:
+            plan_key = make_solver(payload).get_plan_key(*get_options(payload))[0]
+        except Exception as e:
+            logger.warning("Skipping invalid request %s: %s", payload, e)
+            failed += 1
+            continue
+        if plan_key not in store:
+            pending.setdefault(plan_key, payload)
+    skipped = len(corpus) - failed - len(pending)
+
+    # The store is written from this process only, as the results come in
+    solved = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(solve, payload): payload for payload in pending.values()}
+        for future in as_completed(futures):
+            try:
+                store.put(*future.result())
+                solved += 1
+            except Exception as e:
+                logger.warning("Failed to solve request %s: %s", futures[future], e)
+                failed += 1
+    return solved, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", help="JSON file of /path request payloads")
+    parser.add_argument("--store", default=str(DEFAULT_STORE), help="SQLite plan store, see algo.plan_store")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="worker processes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    corpus = load_corpus(args.corpus)
+    store = PlanStore(args.store)
+    start = time.perf_counter()
+    solved, skipped, failed = precompute(corpus, store, args.workers)
+    print(f"Solved {solved}, skipped {skipped} stored or repeated, {failed} failed in "
+          f"{time.perf_counter() - start:.1f} s, {len(store)} plans in {args.store}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import logging
+import math
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+from consts import EXPANDED_CELL, TURN_RADIUS, TURN_SWEEP_SAMPLES, CALIBRATED_PRIMITIVES
+
+logger = logging.getLogger(__name__)
+
+
+class TurnPrimitive(NamedTuple):
+    """A 90 degree turn of a robot facing north, rotated to the other directions by the arena model, see algo.arena
+
+    A forward turn ends ahead of the start cell and a reverse turn behind it. Reverse turns steer to the other side
+    of their heading change, the robot backing to the left ends up facing east.
+
+    The robot centre follows a quarter ellipse from the start to the end cell, tangent to the start and end
+    headings. The cells its footprint sweeps along the arc are checked against the obstacles, see
+    Grid.get_sweep_field, which makes the turn collision checks exact.
+    """
+    # Heading change in Direction steps, 2 turns right and 6 turns left
+    heading: int
+    # (dx, dy) from the start to the end cell, x to the right and y ahead of the robot
+    offset: Tuple[int, int]
+    # Whether the robot drives backward through the turn
+    reverse: bool = False
+    # Cost on top of the rotation cost and the cell moved, see MazeSolver.get_unit_moves
+    cost: int = 0
+    # Chebyshev distance from the robot centre along the arc below which an obstacle adds SAFE_COST to the turn
+    clearance: int = EXPANDED_CELL * 2 + 1
+
+    @property
+    def body_cells(self) -> Tuple[Tuple[int, int], ...]:
+        """
+        Returns the cells swept by the robot footprint, which must be free and inside the arena
+        """
+        return get_swept_cells(self, EXPANDED_CELL + 0.5)
+
+    @property
+    def margin_cells(self) -> Tuple[Tuple[int, int], ...]:
+        """
+        Returns the cells swept by the footprint grown to the clearance, an obstacle there adds SAFE_COST
+        """
+        return get_swept_cells(self, self.clearance - 0.5)
+
+    @property
+    def command(self) -> str:
+        """
+        Returns the robot command driving the turn, see helper.command_generator
+        """
+        right = (self.heading == 2) != self.reverse
+        return ("B" if self.reverse else "F") + ("R" if right else "L") + "090"
+
+
+# Turn primitive sets a request can select, the turns of a set are tried in this order from every direction
+PRIMITIVE_SETS = {
+    # Turns the robot is calibrated for, see FL_OFFSET and FR_OFFSET
+    "3-1": (
+        TurnPrimitive(2, (4 * TURN_RADIUS, 2 * TURN_RADIUS)),
+        TurnPrimitive(6, (-3 * TURN_RADIUS, 1 * TURN_RADIUS)),
+    ),
+    # Wide turns, the left one as large as the right one
+    "4-2": (
+        TurnPrimitive(2, (4 * TURN_RADIUS, 2 * TURN_RADIUS)),
+        TurnPrimitive(6, (-4 * TURN_RADIUS, 2 * TURN_RADIUS)),
+    ),
+    # Quarter circles of radius 2 both ways, for cramped layouts. They keep the straight move clearance, and the
+    # reverse turns pay for the stop before them
+    "tight": (
+        TurnPrimitive(2, (2 * TURN_RADIUS, 2 * TURN_RADIUS), clearance=EXPANDED_CELL * 2),
+        TurnPrimitive(6, (-2 * TURN_RADIUS, 2 * TURN_RADIUS), clearance=EXPANDED_CELL * 2),
+        TurnPrimitive(2, (-2 * TURN_RADIUS, -2 * TURN_RADIUS), reverse=True, cost=2, clearance=EXPANDED_CELL * 2),
+        TurnPrimitive(6, (2 * TURN_RADIUS, -2 * TURN_RADIUS), reverse=True, cost=2, clearance=EXPANDED_CELL * 2),
+    ),
+}
+DEFAULT_PRIMITIVES = "3-1"
+# Primitive set of the legacy big_turn request field, 0 for the 3-1 turn and 1 for the 4-2 turn
+BIG_TURN_PRIMITIVES = ["3-1", "4-2"]
+
+
+def get_primitives(primitives=None, big_turn=None) -> Tuple[TurnPrimitive, ...]:
+    """Resolve the turn primitives of a request
+
+    Args:
+        primitives (str | tuple, optional): name in PRIMITIVE_SETS or the primitives themselves. Defaults to the
+            set of big_turn.
+        big_turn (int, optional): index in BIG_TURN_PRIMITIVES, used when primitives is not set. Defaults to
+            DEFAULT_PRIMITIVES.
+
+    Returns:
+        Tuple[TurnPrimitive, ...]: the turn primitives
+
+    Raises:
+        ValueError: if the set or big_turn is unknown
+    """
+    if primitives is None:
+        if big_turn is None:
+            primitives = DEFAULT_PRIMITIVES
+        elif 0 <= int(big_turn) < len(BIG_TURN_PRIMITIVES):
+            primitives = BIG_TURN_PRIMITIVES[int(big_turn)]
+        else:
+            raise ValueError(f"unknown big_turn {big_turn}, expected 0 to {len(BIG_TURN_PRIMITIVES) - 1}")
+    if isinstance(primitives, str):
+        if primitives not in PRIMITIVE_SETS:
+            raise ValueError(f"unknown primitive set {primitives}, expected one of {sorted(PRIMITIVE_SETS)}")
+        return PRIMITIVE_SETS[primitives]
+    return tuple(TurnPrimitive(heading, tuple(offset), *rest) for heading, offset, *rest in primitives)
+
+
+def check_calibrated(primitives: Tuple[TurnPrimitive, ...]):
+    """Check that the robot firmware drives the turns of a primitive set as planned
+
+    The commands of a turn only tell its side and driving direction, see TurnPrimitive.command, so the robot turns
+    along the arc it is calibrated for whatever set the plan was made with. Only the sets in CALIBRATED_PRIMITIVES
+    can be sent to the robot, the others are for simulation and benchmarks.
+
+    Args:
+        primitives (Tuple[TurnPrimitive, ...]): turn primitives, see get_primitives
+
+    Raises:
+        ValueError: if the firmware has no calibration for the set
+    """
+    if not any(tuple(primitives) == PRIMITIVE_SETS[name] for name in CALIBRATED_PRIMITIVES):
+        names = [name for name, primitive_set in PRIMITIVE_SETS.items() if primitive_set == tuple(primitives)]
+        raise ValueError(f"no firmware calibration for the turn primitives {names[0] if names else primitives}, "
+                         f"the robot is calibrated for {CALIBRATED_PRIMITIVES}")
+
+
+def get_robot_primitives(primitives=None, big_turn=None) -> Tuple[TurnPrimitive, ...]:
+    """Resolve the turn primitives of a request whose commands are sent to the robot, such as /path
+
+    The other sets of PRIMITIVE_SETS are for the simulator and the benchmarks, which give them to MazeSolver
+    directly. The legacy big_turn field was ignored before the primitive sets and the Android app still sends it,
+    so a big_turn the firmware is not calibrated for plans with DEFAULT_PRIMITIVES and a warning.
+
+    Args:
+        primitives (str | tuple, optional): turn primitives, see get_primitives, they have to be calibrated
+        big_turn (int, optional): index in BIG_TURN_PRIMITIVES, used when primitives is not set
+
+    Returns:
+        Tuple[TurnPrimitive, ...]: the turn primitives
+
+    Raises:
+        ValueError: if primitives is unknown or has no firmware calibration, see check_calibrated
+    """
+    if primitives is not None:
+        primitives = get_primitives(primitives)
+        check_calibrated(primitives)
+        return primitives
+    try:
+        primitives = get_primitives(big_turn=big_turn)
+        check_calibrated(primitives)
+    except ValueError as e:
+        logger.warning("Ignoring big_turn %s, planning with the %s turns: %s", big_turn, DEFAULT_PRIMITIVES, e)
+        primitives = get_primitives()
+    return primitives
+
+
+def get_arc(primitive: TurnPrimitive, samples: int = TURN_SWEEP_SAMPLES):
+    """Get robot poses along the arc of a turn, the quarter ellipse x = dx (1 - cos t), y = dy sin t
+
+    Args:
+        primitive (TurnPrimitive): turn primitive
+        samples (int, optional): number of poses. Defaults to TURN_SWEEP_SAMPLES.
+
+    Returns:
+        List[tuple]: (x, y, angle of the robot axis) from the start to the end of the turn
+    """
+    dx, dy = primitive.offset
+    poses = []
+    for i in range(samples + 1):
+        t = math.pi / 2 * i / samples
+        # The footprint is square, so the axis of the robot is the tangent whichever way it drives
+        poses.append((dx * (1 - math.cos(t)), dy * math.sin(t), math.atan2(dy * math.cos(t), dx * math.sin(t))))
+    return poses
+
+
+@lru_cache(maxsize=None)
+def get_swept_cells(primitive: TurnPrimitive, half_width: float) -> Tuple[Tuple[int, int], ...]:
+    """Get the cells whose centre a square footprint covers at some pose along the arc of a turn
+
+    Args:
+        primitive (TurnPrimitive): turn primitive
+        half_width (float): half width of the footprint, in cells from the robot centre
+
+    Returns:
+        Tuple[Tuple[int, int], ...]: (dx, dy) of the cells from the start cell of a robot facing north, sorted
+    """
+    cells = set()
+    reach = int(math.ceil(half_width * math.sqrt(2)))
+    for x, y, angle in get_arc(primitive):
+        cos, sin = math.cos(angle), math.sin(angle)
+        for cx in range(int(math.floor(x)) - reach, int(math.ceil(x)) + reach + 1):
+            for cy in range(int(math.floor(y)) - reach, int(math.ceil(y)) + reach + 1):
+                u, v = (cx - x) * cos + (cy - y) * sin, (cy - y) * cos - (cx - x) * sin
+                if max(abs(u), abs(v)) <= half_width + 1e-9:
+                    cells.add((cx, cy))
+    return tuple(sorted(cells))
@@ -0,0 +1,277 @@
+import heapq
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List
+from entities.Entity import CellState
+from consts import RETRY_SESSIONS_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Cost-to-go of the states that cannot reach the goal
+NO_PATH = -1
+
+
+class RetrySession:
+    """Goal-rooted searches kept from the first run of a session for its retry
+
+    The retry request plans from wherever the robot stopped, for the failed obstacles and with the same obstacle
+    positions. As in D* Lite, the searches are rooted at the goals, the view states of the retry, and run over
+    the reversed moves. Each search gives the cost-to-go of every state, so the cost and path from any start
+    state is a lookup. The obstacle positions do not change between the two requests, so no move cost changes
+    and the cost-to-go fields never need repairing.
+    """
+
+    def __init__(self, layout_key, forward: List[List[tuple]], backward: List[List[tuple]]):
+        """
+        Args:
+            layout_key (tuple): obstacle layout and turn primitive set the moves were generated for
+            forward (List[List[tuple]]): (packed successor, move cost) of every packed state
+            backward (List[List[tuple]]): (packed predecessor, move cost) of every packed state
+        """
+        self.layout_key = layout_key
+        self.forward = forward
+        self.backward = backward
+        # packed goal state -> cost-to-go of every packed state, NO_PATH if the goal cannot be reached, as 8 bytes
+        # per state rather than a list of ints
+        self.fields = dict()
+        # Connected component of every packed state with the moves taken in either direction
+        self.components = None
+        self.lock = threading.Lock()
+
+    def label_components(self):
+        """
+        Label the states connected by moves taken in either direction, see MazeSolver.get_reachable_states
+        """
+        components = array('q', [-1]) * len(self.forward)
+        for root in range(len(self.forward)):
+            if components[root] != -1:
+                continue
+            components[root] = root
+            stack = [root]
+            while stack:
+                cur = stack.pop()
+                for nxt, _ in self.forward[cur] + self.backward[cur]:
+                    if components[nxt] == -1:
+                        components[nxt] = root
+                        stack.append(nxt)
+        self.components = components
+
+    def get_reachable_states(self, start: int) -> bytearray:
+        """Get the states connected to a start state, without a new flood of the lattice
+
+        Args:
+            start (int): packed start state
+
+        Returns:
+            bytearray: 1 for every reachable packed state, 0 otherwise
+        """
+        component = self.components[start]
+        return bytearray(label == component for label in self.components)
+
+    def compute_field(self, goal: int):
+        """Run a Dijkstra search from the goal over the reversed moves and keep its cost-to-go field
+
+        Args:
+            goal (int): packed goal state
+        """
+        with self.lock:
+            if goal in self.fields:
+                return
+
+        field = array('q', [NO_PATH]) * len(self.backward)
+        field[goal] = 0
+        frontier = [(0, goal)]
+        while frontier:
+            cost, cur = heapq.heappop(frontier)
+            if cost > field[cur]:
+                continue
+            for prev, move_cost in self.backward[cur]:
+                if field[prev] == NO_PATH or cost + move_cost < field[prev]:
+                    field[prev] = cost + move_cost
+                    heapq.heappush(frontier, (cost + move_cost, prev))
+
+        with self.lock:
+            self.fields[goal] = field
+
+    def get_field(self, goal: int):
+        """
+        Returns the cost-to-go field of a goal, or None if it is not computed (yet)
+        """
+        with self.lock:
+            return self.fields.get(goal)
+
+    def get_path(self, field: array, start: int) -> List[int]:
+        """Follow the cost-to-go field from the start state down to its goal
+
+        Args:
+            field (array): cost-to-go field of the goal
+            start (int): packed start state, which must reach the goal
+
+        Returns:
+            List[int]: packed states from start to the goal
+        """
+        path = [start]
+        cur = start
+        while field[cur]:
+            for nxt, move_cost in self.forward[cur]:
+                if field[nxt] != NO_PATH and field[nxt] + move_cost == field[cur]:
+                    cur = nxt
+                    break
+            path.append(cur)
+        return path
+
+    def resolve(self, maze_solver, states: List[CellState], missed: dict) -> set:
+        """Fill the tables of a solver with the missed pairs whose end state has a cost-to-go field
+
+        Args:
+            maze_solver (MazeSolver): solver of the retry request
+            states (List[CellState]): states of the request
+            missed (dict): i -> [j, ...], the states to search from states[i]
+
+        Returns:
+            set: (i, j) of the resolved pairs, including the ones without any path
+        """
+        size_x, size_y = maze_solver.grid.size_x, maze_solver.grid.size_y
+        resolved = set()
+        for i, ends in missed.items():
+            start = states[i]
+            # A robot stopped outside the arena has no state in the fields, its pairs are searched as usual
+            if not (0 <= start.x < size_x and 0 <= start.y < size_y):
+                continue
+            start_index = maze_solver.pack_state(start.x, start.y, start.direction)
+            for j in ends:
+                end = states[j]
+                if not (0 <= end.x < size_x and 0 <= end.y < size_y):
+                    continue
+                field = self.get_field(maze_solver.pack_state(end.x, end.y, end.direction))
+                if field is None:
+                    continue
+                resolved.add((i, j))
+                if field[start_index] == NO_PATH:
+                    continue
+                compact = maze_solver.compress_path(self.get_path(field, start_index))
+                maze_solver.cost_table[(start, end)] = field[start_index]
+                maze_solver.cost_table[(end, start)] = field[start_index]
+                maze_solver.path_table[(start, end)] = (compact, False)
+                maze_solver.path_table[(end, start)] = (compact, True)
+        return resolved
+
+
+class RetrySessions:
+    """Retry sessions of the last few clients
+
+    The fields of a new session are computed in the background by a single worker thread, one job at a time. A
+    job superseded by a newer plan of the same session is dropped, before it starts or between two fields.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size (int): Maximum number of sessions kept, and of jobs waiting for the worker
+        """
+        self.max_size = max_size
+        self.sessions = OrderedDict()
+        # session id -> copy of the solver of its latest plan, waiting for the worker
+        self.jobs = OrderedDict()
+        # session id -> the solver of its latest plan while its job is waiting or running, an older job is superseded
+        self.latest = dict()
+        self.worker = None
+        self.lock = threading.Lock()
+        self.has_jobs = threading.Condition(self.lock)
+
+    def start(self, session_id, maze_solver):
+        """Queue the computation of the retry fields for the layout a solver just planned, while the robot runs the plan
+
+        The fields are computed on a copy of the solver, the request keeps using its own.
+
+        Args:
+            session_id (str): id of the client session
+            maze_solver (MazeSolver): solver of the first run
+        """
+        solver = maze_solver.copy()
+        with self.lock:
+            self.jobs.pop(session_id, None)
+            self.jobs[session_id] = solver
+            self.latest[session_id] = solver
+            while len(self.jobs) > self.max_size:
+                dropped_id, _ = self.jobs.popitem(last=False)
+                del self.latest[dropped_id]
+                logger.info("Retry session %s dropped, too many waiting", dropped_id)
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.work, daemon=True)
+                self.worker.start()
+            self.has_jobs.notify()
+
+    def is_superseded(self, session_id, solver) -> bool:
+        """
+        Returns whether a newer plan of the session was queued since the job of the solver
+        """
+        with self.lock:
+            return self.latest.get(session_id) is not solver
+
+    def work(self):
+        """
+        Run the queued jobs one at a time, oldest first
+        """
+        while True:
+            with self.lock:
+                while not self.jobs:
+                    self.has_jobs.wait()
+                session_id, solver = self.jobs.popitem(last=False)
+            try:
+                self.run(session_id, solver)
+            except Exception as e:
+                logger.exception("Retry session %s failed: %s", session_id, e)
+            with self.lock:
+                if self.latest.get(session_id) is solver:
+                    del self.latest[session_id]
+
+    def run(self, session_id, solver):
+        """Compute the cost-to-go fields of a session, see RetrySession
+
+        Args:
+            session_id (str): id of the client session
+            solver (MazeSolver): copy of the solver of the first run
+        """
+        layout_key = solver.get_retry_layout_key()
+        goals = [solver.pack_state(view_state.x, view_state.y, view_state.direction)
+                 for view_positions in solver.get_view_obstacle_positions(retrying=True)
+                 for view_state in view_positions
+                 if 0 <= view_state.x < solver.grid.size_x and 0 <= view_state.y < solver.grid.size_y]
+        forward, backward = solver.get_unit_transitions()
+        session = RetrySession(layout_key, forward, backward)
+        with self.lock:
+            if self.latest.get(session_id) is not solver:
+                return
+            self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_size:
+                self.sessions.popitem(last=False)
+        session.label_components()
+        for goal in goals:
+            if self.is_superseded(session_id, solver):
+                logger.info("Retry session %s superseded", session_id)
+                return
+            session.compute_field(goal)
+        logger.info("Retry session %s: %s cost-to-go fields ready", session_id, len(goals))
+
+    def get(self, session_id, maze_solver):
+        """Get the retry session of a client if it was started for the same layout as the solver
+
+        Args:
+            session_id (str): id of the client session
+            maze_solver (MazeSolver): solver of the retry request
+
+        Returns:
+            RetrySession: the session, or None
+        """
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None or session.layout_key != maze_solver.get_retry_layout_key():
+            return None
+        return session
+
+
+RETRY_SESSIONS = RetrySessions(RETRY_SESSIONS_SIZE)
@@ -0,0 +1,126 @@
+from typing import List
+from consts import Direction
+
+# Transforms of the arena as (quarter turns clockwise, mirrored), the mirror (x -> size_x - 1 - x) comes first
+TRANSFORMS = [(rotation, mirror) for mirror in (False, True) for rotation in range(4)]
+IDENTITY = (0, False)
+
+# Transforms preserving the motion model of every turn primitive set, see MazeSolver.get_symmetries
+SYMMETRIES = dict()
+
+
+def transform_direction(transform: tuple, direction: int) -> int:
+    """Transform a direction, Direction.SKIP stays as is
+
+    Args:
+        transform (tuple): (quarter turns clockwise, mirrored)
+        direction (int): direction
+
+    Returns:
+        int: transformed direction
+    """
+    if direction == Direction.SKIP:
+        return int(direction)
+    rotation, mirror = transform
+    if mirror:
+        direction = (8 - direction) % 8
+    return (direction + 2 * rotation) % 8
+
+
+def transform_vector(transform: tuple, dx: int, dy: int):
+    """Transform a displacement, which does not depend on the arena size
+
+    Returns:
+        tuple: transformed (dx, dy)
+    """
+    rotation, mirror = transform
+    if mirror:
+        dx = -dx
+    for _ in range(rotation):
+        dx, dy = dy, -dx
+    return dx, dy
+
+
+def transform_size(transform: tuple, size_x: int, size_y: int):
+    """
+    Returns the (size_x, size_y) of the transformed arena, quarter turns swap them
+    """
+    return (size_y, size_x) if transform[0] % 2 else (size_x, size_y)
+
+
+def transform_state(transform: tuple, x: int, y: int, direction: int, size_x: int, size_y: int):
+    """Transform an (x, y, direction) state of a size_x by size_y arena
+
+    Args:
+        transform (tuple): (quarter turns clockwise, mirrored)
+        x (int): x coordinate
+        y (int): y coordinate
+        direction (int): direction
+        size_x (int): Size of the arena in the x direction
+        size_y (int): Size of the arena in the y direction
+
+    Returns:
+        tuple: (x, y, direction) in the transformed arena
+    """
+    rotation, mirror = transform
+    if mirror:
+        x = size_x - 1 - x
+    for _ in range(rotation):
+        x, y = y, size_x - 1 - x
+        size_x, size_y = size_y, size_x
+    return x, y, transform_direction(transform, direction)
+
+
+def invert(transform: tuple) -> tuple:
+    """
+    Returns the transform that undoes the given one
+    """
+    probes = [(1, 2, int(Direction.NORTH)), (3, 0, int(Direction.EAST))]
+    size = transform_size(transform, 5, 7)
+    for other in TRANSFORMS:
+        if all(transform_state(other, *transform_state(transform, *probe, 5, 7), *size) == probe for probe in probes):
+            return other
+    raise ValueError(f"No inverse for {transform}")
+
+
+def find_symmetries(patterns: dict) -> List[tuple]:
+    """Find the transforms that map a set of relative patterns onto itself
+
+    Args:
+        patterns (dict): (direction, tag) -> set of (dx, dy, direction, *rest) patterns relative to a state with
+            that direction, such as the moves of the robot or the view states of an obstacle
+
+    Returns:
+        List[tuple]: the transforms preserving every pattern, the identity first
+    """
+    symmetries = []
+    for transform in TRANSFORMS:
+        if all({transform_vector(transform, dx, dy) + (transform_direction(transform, d),) + tuple(rest)
+                for dx, dy, d, *rest in pattern} == patterns.get((transform_direction(transform, direction), tag))
+               for (direction, tag), pattern in patterns.items()):
+            symmetries.append(transform)
+    return symmetries
+
+
+def canonicalize(size_x: int, size_y: int, obstacles: List[tuple], start: tuple, transforms: List[tuple]):
+    """Find the canonical form of a layout and start state, the smallest of their images under the transforms
+
+    Args:
+        size_x (int): Size of the arena in the x direction
+        size_y (int): Size of the arena in the y direction
+        obstacles (List[tuple]): (x, y, direction) of every obstacle
+        start (tuple): (x, y, direction) of the robot start state
+        transforms (List[tuple]): the transforms to consider, including the identity
+
+    Returns:
+        Tuple[tuple, tuple]: ((size_x, size_y, sorted obstacles, start) in canonical form, transform to it)
+    """
+    best = None
+    for transform in transforms:
+        image = (transform_size(transform, size_x, size_y),
+                 tuple(sorted(transform_state(transform, *obstacle, size_x, size_y) for obstacle in obstacles)),
+                 transform_state(transform, *start, size_x, size_y))
+        if best is None or image < best[0]:
+            best = (image, transform)
+    (size, canonical_obstacles, canonical_start), transform = best
+    return (size[0], size[1], canonical_obstacles, canonical_start), transform
@@ -0,0 +1,541 @@
+import math
+import random
+import time
+from typing import List
+import numpy as np
+from consts import ALNS_SEGMENT, ALNS_REACTION, ALNS_SCORES, ALNS_MAX_REMOVED, ALNS_START_TEMPERATURE, \
+    ALNS_MIN_WEIGHT, HELD_KARP_ITERATIONS, HELD_KARP_PATIENCE
+
+# A tour is a list of item indices in visiting order, excluding the start state (item 0).
+# cost[u][v] is the path cost between items u and v (inf if unreachable), penalty[v] the view state penalty,
+# cluster[v] the obstacle index of item v and members[c] the items that can view obstacle c.
+# Every path is driven in both directions, so cost is symmetric and reversing a segment of the tour only changes
+# the legs at its ends.
+
+
+def tour_cost(tour: List[int], cost, penalty) -> float:
+    """Compute the cost of an open tour starting from the robot start state, including view state penalties
+
+    Args:
+        tour (List[int]): item indices in visiting order
+        cost (List[List[float]]): pairwise cost between items
+        penalty (List[float]): view state penalty of every item
+
+    Returns:
+        float: cost of the tour, inf if any leg is unreachable
+    """
+    total = 0
+    prev = 0
+    for v in tour:
+        total += cost[prev][v] + penalty[v]
+        prev = v
+    return total
+
+
+def is_better(tour: List[int], distance: float, best: List[int], best_distance: float) -> bool:
+    """Compare tours the same way as the exact solver: more obstacles visited first, then lower cost
+
+    Returns:
+        bool: True if tour is better than best
+    """
+    if len(tour) != len(best):
+        return len(tour) > len(best)
+    return distance < best_distance
+
+
+def greedy_tour(cost, penalty, cluster, members) -> List[int]:
+    """Build a nearest-neighbour tour, repeatedly moving to the cheapest view state of an unvisited obstacle
+
+    Obstacles whose view states cannot be reached from the current state are left out.
+
+    Returns:
+        List[int]: item indices in visiting order
+    """
+    tour = []
+    remaining = {c for c in range(len(members)) if len(members[c])}
+    cur = 0
+    while remaining:
+        best, best_cost = None, math.inf
+        for c in remaining:
+            for w in members[c]:
+                if cost[cur][w] + penalty[w] < best_cost:
+                    best, best_cost = w, cost[cur][w] + penalty[w]
+        if best is None:
+            break
+        tour.append(best)
+        remaining.discard(cluster[best])
+        cur = best
+    return tour
+
+
+def reselect_view_states(tour: List[int], cost, penalty, cluster, members) -> bool:
+    """Pick the cheapest view state of every obstacle given its neighbours in the tour, in place
+
+    Returns:
+        bool: True if the tour improved
+    """
+    improved = False
+    for k in range(len(tour)):
+        prev = tour[k - 1] if k else 0
+        nxt = tour[k + 1] if k + 1 < len(tour) else None
+
+        def leg_cost(w):
+            return cost[prev][w] + penalty[w] + (cost[w][nxt] if nxt is not None else 0)
+
+        best, best_cost = tour[k], leg_cost(tour[k])
+        for w in members[cluster[tour[k]]]:
+            if leg_cost(w) < best_cost:
+                best, best_cost = w, leg_cost(w)
+        if best != tour[k]:
+            tour[k] = best
+            improved = True
+    return improved
+
+
+def insertion_costs(tour: List[int], c: int, cost, penalty, members) -> List[tuple]:
+    """Find the cheapest view state of an obstacle at every position of the tour
+
+    Args:
+        tour (List[int]): item indices in visiting order
+        c (int): obstacle index
+
+    Returns:
+        List[tuple]: (added cost, position, item) for every position the obstacle can be inserted at
+    """
+    insertions = []
+    for pos in range(len(tour) + 1):
+        prev = tour[pos - 1] if pos else 0
+        nxt = tour[pos] if pos < len(tour) else None
+        best, best_cost = None, math.inf
+        for w in members[c]:
+            added = cost[prev][w] + penalty[w]
+            if nxt is not None:
+                added += cost[w][nxt] - cost[prev][nxt]
+            if added < best_cost:
+                best, best_cost = w, added
+        if best is not None:
+            insertions.append((best_cost, pos, best))
+    return insertions
+
+
+def repair_greedy(tour: List[int], removed: List[int], cost, penalty, cluster, members, rnd=None) -> List[int]:
+    """Insert obstacles into the tour one at a time, always the one with the cheapest insertion
+
+    Obstacles that cannot be inserted anywhere at a finite cost are left out.
+
+    Args:
+        tour (List[int]): item indices in visiting order
+        removed (List[int]): obstacle indices to insert
+
+    Returns:
+        List[int]: the tour with as many obstacles inserted as possible
+    """
+    tour = tour[:]
+    pending = list(removed)
+    while pending:
+        best = None
+        for c in pending:
+            insertions = insertion_costs(tour, c, cost, penalty, members)
+            if insertions:
+                candidate = min(insertions) + (c,)
+                if best is None or candidate < best:
+                    best = candidate
+        if best is None:
+            break
+        _, pos, w, c = best
+        tour.insert(pos, w)
+        pending.remove(c)
+    return tour
+
+
+def repair_regret(tour: List[int], removed: List[int], cost, penalty, cluster, members, rnd=None) -> List[int]:
+    """Insert obstacles into the tour one at a time, always the one that loses the most by waiting
+
+    The regret of an obstacle is how much more its second best position costs than its best one. An obstacle
+    with a single feasible position has an infinite regret and goes first.
+
+    Args:
+        tour (List[int]): item indices in visiting order
+        removed (List[int]): obstacle indices to insert
+
+    Returns:
+        List[int]: the tour with as many obstacles inserted as possible
+    """
+    tour = tour[:]
+    pending = list(removed)
+    while pending:
+        best, best_key = None, None
+        for c in pending:
+            insertions = sorted(insertion for insertion in insertion_costs(tour, c, cost, penalty, members)
+                                if math.isfinite(insertion[0]))
+            if not insertions:
+                continue
+            regret = insertions[1][0] - insertions[0][0] if len(insertions) > 1 else math.inf
+            key = (-regret, insertions[0][0], c)
+            if best_key is None or key < best_key:
+                best, best_key = insertions[0][1:] + (c,), key
+        if best is None:
+            break
+        pos, w, c = best
+        tour.insert(pos, w)
+        pending.remove(c)
+    return tour
+
+
+def insert_missing(tour: List[int], cost, penalty, cluster, members) -> List[int]:
+    """Insert obstacles left out of the tour at their cheapest feasible position and view state
+
+    Returns:
+        List[int]: the tour with as many obstacles inserted as possible
+    """
+    visited = {cluster[v] for v in tour}
+    missing = [c for c in range(len(members)) if c not in visited and len(members[c])]
+    return repair_greedy(tour, missing, cost, penalty, cluster, members)
+
+
+def two_opt(tour: List[int], cost, penalty, deadline: float) -> List[int]:
+    """Reverse segments of the tour while it lowers the cost
+
+    Returns:
+        List[int]: the improved tour
+    """
+    path = [0] + tour
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, len(path) - 1):
+            for j in range(i + 1, len(path)):
+                # Reversing path[i:j + 1] replaces the legs into path[i] and out of path[j]
+                delta = cost[path[i - 1]][path[j]] - cost[path[i - 1]][path[i]]
+                if j + 1 < len(path):
+                    delta += cost[path[i]][path[j + 1]] - cost[path[j]][path[j + 1]]
+                if delta < 0:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    improved = True
+    return path[1:]
+
+
+def or_opt(tour: List[int], cost, penalty, deadline: float, cluster=None, members=None) -> List[int]:
+    """Move segments of up to three obstacles, optionally reversed, to another position while it lowers the cost
+
+    With cluster and members given, an obstacle moved on its own takes the best of its view states at the new
+    position.
+
+    Returns:
+        List[int]: the improved tour
+    """
+    path = [0] + tour
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for length in range(1, 4):
+            i = 1
+            while i + length <= len(path):
+                moved = False
+                first, last = path[i], path[i + length - 1]
+                prev = path[i - 1]
+                nxt = path[i + length] if i + length < len(path) else None
+                # Cost saved by taking the segment out
+                gain = cost[prev][first] + (cost[last][nxt] - cost[prev][nxt] if nxt is not None else 0)
+                if length == 1 and members is not None:
+                    gain += penalty[first]
+                    ends = [(w, w) for w in members[cluster[first]]]
+                else:
+                    ends = [(first, last), (last, first)]
+                rest = path[:i] + path[i + length:]
+                for pos in range(1, len(rest) + 1):
+                    if pos == i and length > 1:
+                        continue
+                    before = rest[pos - 1]
+                    after = rest[pos] if pos < len(rest) else None
+                    for start, end in ends:
+                        added = cost[before][start] + (cost[end][after] - cost[before][after]
+                                                       if after is not None else 0)
+                        if length == 1 and members is not None:
+                            added += penalty[start]
+                        if added < gain:
+                            if length == 1:
+                                segment = [start]
+                            else:
+                                segment = path[i:i + length] if start == first else path[i:i + length][::-1]
+                            path = rest[:pos] + segment + rest[pos:]
+                            moved = True
+                            break
+                    if moved:
+                        break
+                # After a move, the segment now starting at i is tried next
+                if moved:
+                    improved = True
+                else:
+                    i += 1
+    return path[1:]
+
+
+def local_search(tour: List[int], cost, penalty, cluster, members, deadline: float) -> List[int]:
+    """Improve the tour with view state reselection, 2-opt and Or-opt until no move helps or the deadline passes
+
+    Returns:
+        List[int]: the improved tour
+    """
+    tour = insert_missing(tour[:], cost, penalty, cluster, members)
+    distance = tour_cost(tour, cost, penalty)
+    while time.perf_counter() < deadline:
+        reselect_view_states(tour, cost, penalty, cluster, members)
+        tour = two_opt(tour, cost, penalty, deadline)
+        tour = or_opt(tour, cost, penalty, deadline, cluster, members)
+        new_distance = tour_cost(tour, cost, penalty)
+        if new_distance >= distance:
+            break
+        distance = new_distance
+    return tour
+
+
+def removal_gains(tour: List[int], cost, penalty) -> List[float]:
+    """
+    Returns the cost saved by removing every obstacle of the tour, with its view state penalty
+    """
+    gains = []
+    for k, v in enumerate(tour):
+        prev = tour[k - 1] if k else 0
+        gain = cost[prev][v] + penalty[v]
+        if k + 1 < len(tour):
+            gain += cost[v][tour[k + 1]] - cost[prev][tour[k + 1]]
+        gains.append(gain)
+    return gains
+
+
+def destroy_random(tour: List[int], n_removed: int, cost, penalty, rnd: random.Random) -> List[int]:
+    """
+    Returns the positions of n_removed obstacles of the tour picked at random
+    """
+    return rnd.sample(range(len(tour)), n_removed)
+
+
+def destroy_worst(tour: List[int], n_removed: int, cost, penalty, rnd: random.Random) -> List[int]:
+    """Pick obstacles that add the most to the tour cost, with some randomness
+
+    Returns:
+        List[int]: positions of the picked obstacles in the tour
+    """
+    positions = list(range(len(tour)))
+    picked = []
+    for _ in range(n_removed):
+        remaining = [tour[k] for k in positions]
+        gains = removal_gains(remaining, cost, penalty)
+        order = sorted(range(len(positions)), key=lambda k: -gains[k])
+        # Biased towards the largest gains, the cube of a uniform draw is mostly small
+        k = order[int(len(order) * rnd.random() ** 3)]
+        picked.append(positions.pop(k))
+    return picked
+
+
+def destroy_related(tour: List[int], n_removed: int, cost, penalty, rnd: random.Random) -> List[int]:
+    """Pick an obstacle at random and the obstacles closest to it, which are best reordered together
+
+    Returns:
+        List[int]: positions of the picked obstacles in the tour
+    """
+    seed = tour[rnd.randrange(len(tour))]
+    order = sorted(range(len(tour)), key=lambda k: cost[seed][tour[k]])
+    return order[:n_removed]
+
+
+def destroy_segment(tour: List[int], n_removed: int, cost, penalty, rnd: random.Random) -> List[int]:
+    """
+    Returns the positions of n_removed consecutive obstacles of the tour
+    """
+    start = rnd.randrange(len(tour) - n_removed + 1)
+    return list(range(start, start + n_removed))
+
+
+DESTROY_OPERATORS = [destroy_random, destroy_worst, destroy_related, destroy_segment]
+REPAIR_OPERATORS = [repair_greedy, repair_regret]
+
+
+def pick_operator(weights: List[float], rnd: random.Random) -> int:
+    """
+    Returns the index of an operator picked with probability proportional to its weight
+    """
+    return rnd.choices(range(len(weights)), weights=weights)[0]
+
+
+def spanning_tree(dist: np.ndarray):
+    """Find a minimum spanning tree of a complete graph with Prim's algorithm
+
+    Args:
+        dist (np.ndarray): symmetric (n, n) edge costs, inf for the missing edges
+
+    Returns:
+        Tuple[float, np.ndarray]: cost of the tree and the degree of every node
+    """
+    n = len(dist)
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[0] = True
+    best = dist[0].copy()
+    parent = np.zeros(n, dtype=int)
+    degree = np.zeros(n, dtype=int)
+    total = 0.0
+    for _ in range(n - 1):
+        v = int(np.argmin(np.where(in_tree, np.inf, best)))
+        total += best[v]
+        in_tree[v] = True
+        degree[v] += 1
+        degree[parent[v]] += 1
+        closer = dist[v] < best
+        best[closer] = dist[v][closer]
+        parent[closer] = v
+    return total, degree
+
+
+def lower_bound(tour: List[int], cost, penalty, cluster, members, upper_bound: float = None) -> float:
+    """Lower bound on the cost of any tour visiting the same obstacles as the given tour
+
+    Every visited obstacle is entered exactly once, from the start or from a view state of another visited
+    obstacle, so the cheapest such entry (plus the view state penalty) of every obstacle sums to a lower bound.
+
+    The tour is also a path through the start and the visited obstacles, where two obstacles are as far apart as
+    their closest view states. Such a path costs at least a minimum spanning tree, and the bound is tightened as
+    in the Held-Karp bound of the TSP by adding node weights pushing the tree towards a path: every obstacle gets
+    degree 2 but the last one, and the start degree 1. The weights follow a subgradient ascent with steps sized by
+    upper_bound, the cost of a known tour. The larger of the two bounds is returned.
+
+    Returns:
+        float: lower bound of the tour cost
+    """
+    visited = [cluster[v] for v in tour]
+    if not visited:
+        return 0
+    # Legs between the start (group 0) and the view states of the visited obstacles, inf inside a group
+    groups = [[0]] + [list(members[c]) for c in visited]
+    items = [w for group in groups for w in group]
+    group = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+    legs = np.asarray(cost, dtype=float)[np.ix_(items, items)]
+    legs[group[:, None] == group[None, :]] = np.inf
+    starts = np.cumsum([0] + [len(g) for g in groups[:-1]])
+
+    entries = legs.min(axis=0)[1:] + np.asarray(penalty, dtype=float)[items[1:]]
+    entry_bound = float(np.minimum.reduceat(entries, starts[1:] - 1).sum())
+    if len(visited) < 2:
+        return entry_bound
+
+    # Distance between the closest view states of every two groups
+    dist = np.minimum.reduceat(np.minimum.reduceat(legs, starts, axis=1), starts, axis=0)
+    fixed = sum(min(penalty[w] for w in members[c]) for c in visited)
+    target = np.full(len(groups), 2)
+    target[0] = 1
+
+    weights = np.zeros(len(groups))
+    tree_bound = -np.inf
+    step_scale = 2.0
+    stalled = 0
+    for _ in range(HELD_KARP_ITERATIONS):
+        tree, degree = spanning_tree(dist + weights[:, None] + weights[None, :])
+        if not np.isfinite(tree):
+            break
+        # The last obstacle of the path has degree 1, the bound takes the one for which it is the lowest
+        last = 1 + int(np.argmin(weights[1:]))
+        bound = tree - (weights * target).sum() + weights[last] + fixed
+        if bound > tree_bound + 1e-9:
+            tree_bound, stalled = bound, 0
+        else:
+            stalled += 1
+            if stalled >= HELD_KARP_PATIENCE:
+                step_scale, stalled = step_scale / 2, 0
+        gradient = degree - target
+        gradient[last] += 1
+        norm = (gradient ** 2).sum()
+        if norm == 0 or upper_bound is None:
+            break
+        weights += step_scale * max(upper_bound - bound, 0) / norm * gradient
+    return max(entry_bound, float(tree_bound))
+
+
+def solve_anytime(cost, penalty, cluster, members, deadline: float, seed=0):
+    """Find a good tour before the deadline with an adaptive large neighbourhood search
+
+    The search starts from the better of a nearest-neighbour tour and a regret insertion tour, both improved by
+    local_search. Every iteration then removes a few obstacles from the current tour with a destroy operator,
+    puts them back, each at its best position and view state, with a repair operator, and improves the result
+    with local_search. The new tour replaces the current one by simulated annealing on its cost, a tour visiting
+    more obstacles is always taken and one visiting fewer never. Operators that lead to better tours are picked
+    more often, their weights are updated every ALNS_SEGMENT iterations from ALNS_SCORES.
+
+    Args:
+        cost (List[List[float]]): pairwise cost between items, item 0 is the robot start state
+        penalty (List[float]): view state penalty of every item
+        cluster (List[int]): obstacle index of every item, -1 for the start state
+        members (List[List[int]]): items that can view every obstacle
+        deadline (float): time.perf_counter() value to stop at
+        seed (int, optional): seed for the operators and the acceptance. Defaults to 0.
+
+    Returns:
+        Tuple[List[int], float, float]: best tour, its cost and the lower bound for its obstacles
+    """
+    rnd = random.Random(seed)
+    start_time = time.perf_counter()
+    reachable = [c for c in range(len(members)) if len(members[c])]
+    best = None
+    for tour in (greedy_tour(cost, penalty, cluster, members),
+                 repair_regret([], reachable, cost, penalty, cluster, members)):
+        tour = local_search(tour, cost, penalty, cluster, members, deadline)
+        if best is None or is_better(tour, tour_cost(tour, cost, penalty), best, best_distance):
+            best, best_distance = tour, tour_cost(tour, cost, penalty)
+    # The bound is computed again when the visited obstacles change and for the final tour, whose cost sizes the
+    # subgradient steps best. The search stops early enough to leave time for the last one.
+    bound_time = time.perf_counter()
+    bound = lower_bound(best, cost, penalty, cluster, members, best_distance)
+    bound_tour, bound_distance = best, best_distance
+    bound_time = time.perf_counter() - bound_time
+
+    current, current_distance = best, best_distance
+    start_temperature = ALNS_START_TEMPERATURE * best_distance / max(len(best), 1)
+    destroy_weights = [1.0] * len(DESTROY_OPERATORS)
+    repair_weights = [1.0] * len(REPAIR_OPERATORS)
+    destroy_scores = [[0, 0] for _ in DESTROY_OPERATORS]
+    repair_scores = [[0, 0] for _ in REPAIR_OPERATORS]
+    iteration = 0
+    while len(best) > 1 and time.perf_counter() + bound_time < deadline and best_distance > bound:
+        d = pick_operator(destroy_weights, rnd)
+        r = pick_operator(repair_weights, rnd)
+        n_removed = rnd.randint(1, max(1, math.ceil(ALNS_MAX_REMOVED * len(current))))
+        positions = set(DESTROY_OPERATORS[d](current, n_removed, cost, penalty, rnd))
+        partial = [v for k, v in enumerate(current) if k not in positions]
+        visited = {cluster[v] for v in partial}
+        removed = [c for c in reachable if c not in visited]
+        tour = REPAIR_OPERATORS[r](partial, removed, cost, penalty, cluster, members, rnd)
+        tour = local_search(tour, cost, penalty, cluster, members, deadline)
+        distance = tour_cost(tour, cost, penalty)
+
+        score = 0
+        if is_better(tour, distance, best, best_distance):
+            best, best_distance = tour, distance
+            if {cluster[v] for v in best} != {cluster[v] for v in bound_tour}:
+                bound = lower_bound(best, cost, penalty, cluster, members, best_distance)
+                bound_tour, bound_distance = best, best_distance
+            score = ALNS_SCORES[0]
+        if len(tour) >= len(current) and tour != current:
+            # The temperature cools down linearly to 0 at the deadline
+            temperature = start_temperature * (deadline - time.perf_counter()) / (deadline - start_time)
+            if is_better(tour, distance, current, current_distance):
+                score = score or ALNS_SCORES[1]
+                current, current_distance = tour, distance
+            elif temperature > 0 and rnd.random() < math.exp((current_distance - distance) / temperature):
+                score = score or ALNS_SCORES[2]
+                current, current_distance = tour, distance
+        for scores, k in ((destroy_scores, d), (repair_scores, r)):
+            scores[k][0] += score
+            scores[k][1] += 1
+
+        iteration += 1
+        if iteration % ALNS_SEGMENT == 0:
+            for weights, scores in ((destroy_weights, destroy_scores), (repair_weights, repair_scores)):
+                for k, (total, uses) in enumerate(scores):
+                    if uses:
+                        # The floor keeps every operator in use
+                        weights[k] = max(ALNS_MIN_WEIGHT,
+                                         (1 - ALNS_REACTION) * weights[k] + ALNS_REACTION * total / uses)
+                    scores[k] = [0, 0]
+
+    if best_distance < bound_distance:
+        bound = max(bound, lower_bound(best, cost, penalty, cluster, members, best_distance))
+    return best, best_distance, bound
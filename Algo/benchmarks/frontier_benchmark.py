@@ -0,0 +1,108 @@
+"""Microbenchmark of the search frontiers on dense obstacle layouts
+
+Records the push/pop sequence of real path_cost_generator runs, replays it against every frontier in
+algo.frontier.FRONTIERS and reports the cost per operation. Also times path_cost_generator end to end.
+
+Usage (from the Algo directory):
+    python -m benchmarks.frontier_benchmark
+"""
+import random
+import time
+
+from algo.algo import MazeSolver
+from algo.frontier import FRONTIERS, HeapFrontier
+from algo.path_cache import PATH_CACHE
+
+
+class RecordingFrontier(HeapFrontier):
+    """Heap frontier that records every operation into RecordingFrontier.trace"""
+
+    trace = []
+
+    def push(self, priority: int, item: int):
+        RecordingFrontier.trace.append((priority, item))
+        super().push(priority, item)
+
+    def pop(self):
+        RecordingFrontier.trace.append(None)
+        return super().pop()
+
+    def __bool__(self):
+        if not self.heap:
+            # End of a search
+            RecordingFrontier.trace.append(False)
+        return bool(self.heap)
+
+
+def dense_layout(seed: int, n_obstacles: int):
+    """Random layout of obstacles spread over the arena, away from the start zone"""
+    rnd = random.Random(seed)
+    obstacles = []
+    used = set()
+    while len(obstacles) < n_obstacles:
+        x, y = rnd.randint(2, 17), rnd.randint(2, 17)
+        if (x, y) in used or (x < 6 and y < 6):
+            continue
+        used.add((x, y))
+        obstacles.append((x, y, rnd.choice([0, 2, 4, 6]), len(obstacles) + 1))
+    return obstacles
+
+
+def make_solver(obstacles, search_mode, frontier):
+    maze_solver = MazeSolver(20, 20, 1, 1, 0, search_mode=search_mode, frontier=frontier)
+    for obstacle in obstacles:
+        maze_solver.add_obstacle(*obstacle)
+    return maze_solver
+
+
+def run_path_cost_generator(maze_solver):
+    PATH_CACHE.clear()
+    items = [maze_solver.robot.get_start_state()]
+    for view_positions in maze_solver.grid.get_view_obstacle_positions(False):
+        items = items + view_positions
+    start = time.perf_counter()
+    maze_solver.path_cost_generator(items)
+    return time.perf_counter() - start
+
+
+def replay(trace, frontier_type):
+    """Replay a recorded trace, returns the elapsed time"""
+    start = time.perf_counter()
+    frontier = frontier_type()
+    push = frontier.push
+    pop = frontier.pop
+    for op in trace:
+        if op is None:
+            pop()
+        elif op is False:
+            frontier = frontier_type()
+            push = frontier.push
+            pop = frontier.pop
+        else:
+            push(op[0], op[1])
+    return time.perf_counter() - start
+
+
+def main():
+    for search_mode in ("dijkstra", "astar"):
+        for n_obstacles in (8, 12):
+            obstacles = dense_layout(n_obstacles, n_obstacles)
+
+            # Record the frontier operations of a real run
+            RecordingFrontier.trace = []
+            FRONTIERS["recording"] = RecordingFrontier
+            run_path_cost_generator(make_solver(obstacles, search_mode, "recording"))
+            del FRONTIERS["recording"]
+            trace = RecordingFrontier.trace
+            n_ops = sum(1 for op in trace if op is not False)
+
+            print(f"{search_mode}, {n_obstacles} obstacles, {n_ops} frontier operations")
+            for name, frontier_type in FRONTIERS.items():
+                replay_time = min(replay(trace, frontier_type) for _ in range(3))
+                search_time = min(run_path_cost_generator(make_solver(obstacles, search_mode, name)) for _ in range(3))
+                print(f"  {name:>6}: {replay_time / n_ops * 1e9:7.1f} ns per push/pop, "
+                      f"path_cost_generator {search_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Latency of the planner against the arena size and the number of obstacles
+
+Plans a tour on random layouts for every (arena size, obstacle count) pair and reports the time spent on the
+pairwise path searches and on the tour, as the /path endpoint would run it, with the optimality gap of the tour
+against its lower bound (0 for the exact solver). With --plot, the total latency is
+also plotted against the arena size, one line per obstacle count (needs matplotlib).
+
+The order solver and the time budget default to the ones of the /path endpoint, see helper.get_default_order_solver
+and helper.get_default_time_budget_ms. With the hierarchical solver, the legs are searched while the tour is refined
+and the search time is part of the tour time.
+
+Usage (from the Algo directory):
+    python -m benchmarks.scaling_benchmark [--sizes 20 40 60 80 100] [--obstacles 5 10 20 30] [--plot scaling.png]
+        [--order-solver hierarchical] [--time-budget-ms 2000] [--primitives 3-1]
+"""
+import argparse
+import random
+import time
+
+from algo.algo import MazeSolver
+from algo.path_cache import PATH_CACHE
+from algo.plan_cache import PLAN_CACHE
+from algo.primitives import PRIMITIVE_SETS
+from helper import get_default_order_solver, get_default_search_mode, get_default_time_budget_ms
+
+
+def spread_layout(seed: int, size: int, n_obstacles: int):
+    """Random layout of obstacles a few cells apart, away from the start zone and the walls"""
+    rnd = random.Random(seed)
+    spacing = min(6, size // 4)
+    obstacles = []
+    used = []
+    for _ in range(10000):
+        if len(obstacles) == n_obstacles:
+            break
+        x, y = rnd.randint(3, size - 4), rnd.randint(3, size - 4)
+        if (x < 8 and y < 8) or any(abs(x - ux) < spacing and abs(y - uy) < spacing for ux, uy in used):
+            continue
+        used.append((x, y))
+        obstacles.append((x, y, rnd.choice([0, 2, 4, 6]), len(obstacles) + 1))
+    return obstacles
+
+
+def run(size: int, obstacles, order_solver: str = None, time_budget_ms: float = None, primitives: str = None):
+    """Plan a tour from the bottom left corner, returns (order solver, search time, tour time, distance, optimality
+    gap), times in seconds"""
+    PATH_CACHE.clear()
+    PLAN_CACHE.clear()
+    # Same defaults as the /path endpoint
+    search_mode = get_default_search_mode(size, size)
+    if order_solver is None:
+        order_solver = get_default_order_solver(size, size, len(obstacles))
+    if time_budget_ms is None:
+        time_budget_ms = get_default_time_budget_ms(size, size, order_solver)
+    maze_solver = MazeSolver(size, size, 1, 1, 0, search_mode=search_mode, order_solver=order_solver,
+                             primitives=primitives)
+    for obstacle in obstacles:
+        maze_solver.add_obstacle(*obstacle)
+
+    search_time = 0
+    if order_solver != "hierarchical":
+        start = time.perf_counter()
+        items = [maze_solver.robot.get_start_state()]
+        for view_positions in maze_solver.get_reachable_view_positions(False):
+            items = items + view_positions
+        maze_solver.path_cost_generator(items)
+        search_time = time.perf_counter() - start
+
+    # The tour reuses the searched paths from the tables
+    start = time.perf_counter()
+    _, distance = maze_solver.get_optimal_order_dp(retrying=False, time_budget_ms=time_budget_ms)
+    return order_solver, search_time, time.perf_counter() - start, distance, maze_solver.optimality_gap
+
+
+def plot(results, path: str):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    for n_obstacles in sorted({n for _, n in results}):
+        sizes = sorted(size for size, n in results if n == n_obstacles)
+        ax.plot(sizes, [sum(results[(size, n_obstacles)][1:3]) for size in sizes], marker="o",
+                label=f"{n_obstacles} obstacles")
+    ax.set_xlabel("arena size (cells per side)")
+    ax.set_ylabel("latency (s)")
+    ax.set_yscale("log")
+    ax.legend()
+    fig.savefig(path)
+    print(f"Saved {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 40, 60, 80, 100])
+    parser.add_argument("--obstacles", type=int, nargs="+", default=[5, 10, 20, 30])
+    parser.add_argument("--plot", help="save a latency plot to this file")
+    parser.add_argument("--order-solver", help="MazeSolver order_solver, the endpoint default if not given")
+    parser.add_argument("--time-budget-ms", type=float, help="time budget, the endpoint default if not given")
+    parser.add_argument("--primitives", choices=sorted(PRIMITIVE_SETS), help="turn primitive set, see algo.primitives")
+    args = parser.parse_args()
+
+    results = dict()
+    print(f"{'size':>5} {'obstacles':>9} {'solver':>12} {'search (s)':>10} {'tour (s)':>9} {'distance':>9} {'gap':>6}")
+    for size in args.sizes:
+        for n_obstacles in args.obstacles:
+            obstacles = spread_layout(n_obstacles, size, n_obstacles)
+            if len(obstacles) < n_obstacles:
+                # The arena is too small for that many obstacles
+                continue
+            results[(size, n_obstacles)] = run(size, obstacles, args.order_solver, args.time_budget_ms,
+                                               args.primitives)
+            order_solver, search_time, tour_time, distance, gap = results[(size, n_obstacles)]
+            gap = f"{gap:.1%}" if gap is not None else "-"
+            print(f"{size:>5} {n_obstacles:>9} {order_solver:>12} {search_time:>10.2f} {tour_time:>9.2f} {distance:>9.0f} {gap:>6}")
+
+    if args.plot:
+        plot(results, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -31,10 +31,32 @@ WIDTH = 20
 HEIGHT = 20
 
 ITERATIONS = 2000
+MAX_EXACT_OBSTACLES = 14 # above this many obstacles the tour is found by the anytime solver, the exact DP is exponential
+LARGE_INSTANCE_TIME_BUDGET_MS = 1000 # time budget of the anytime solver when it replaces the exact DP
+LARGE_ARENA_TIME_BUDGET_MS = 2000 # default time budget of the hierarchical order solver on an arena larger than WIDTH x HEIGHT
+LARGE_ARENA_SEARCH_CELLS = 40000 # obstacles times arena cells past which the default order solver is the hierarchical one, the view state pairs take longer to search than LARGE_ARENA_TIME_BUDGET_MS
+ALNS_SEGMENT = 50 # iterations of the anytime solver between two updates of its operator weights, see algo.tour
+ALNS_REACTION = 0.2 # share of the scores of the last segment in the updated operator weights
+ALNS_SCORES = (33, 9, 13) # operator scores for a new best tour, a tour better than the current one and an accepted one
+ALNS_MIN_WEIGHT = 0.1 # lowest operator weight of the anytime solver
+ALNS_MAX_REMOVED = 0.3 # largest share of the obstacles taken out of the tour by one destroy operator
+ALNS_START_TEMPERATURE = 0.05 # start temperature of the acceptance, relative to the mean leg cost of the first tour
+HELD_KARP_ITERATIONS = 200 # subgradient steps of the spanning tree lower bound of the anytime solver
+HELD_KARP_PATIENCE = 10 # steps without a better bound before the subgradient step size is halved
+COARSE_FACTOR = 4 # fine cells per coarse cell along each axis for the hierarchical order solver
+CORRIDOR_RADIUS = 1 # coarse cells around the coarse path that a refined leg of the hierarchical order solver may use
+HIERARCHICAL_ROUNDS = 3 # coarse orders refined by the hierarchical order solver, each with the refined costs of the last
+COMBINATION_BATCH = 64 # view position combinations solved together by MazeSolver.get_optimal_order_combination
+PATH_CACHE_SIZE = 50000 # maximum number of state pairs kept in the cross-request path cache
+PLAN_CACHE_SIZE = 256 # solved plans kept in the cross-request plan cache, keyed by canonical layout and start state
+PATH_CACHE_MAX_DELTA = 2 # obstacles added or removed for the cached paths of a previous layout to be carried over
+ARENA_MODELS_SIZE = 8 # arena models (size and turn primitives) kept for the solvers, see algo.arena
+RETRY_SESSIONS_SIZE = 8 # client sessions whose cost-to-go fields are kept for a retry request
 # TURN_RADIUS = 1
 TURN_RADIUS = 1
 
 SAFE_COST = 1000 # the cost for the turn in case there is a chance that the robot is touch some obstacle
+TURN_SWEEP_SAMPLES = 32 # robot poses along the arc of a turn whose footprints make up its swept cells, see algo.primitives
 SCREENSHOT_COST = 50 # the cost for the place where the picture is taken
 
 
@@ -53,6 +75,8 @@ BW_SMALL_OFFSET = 2
 FW_OFFSET = 5
 BW_OFFSET = 4
 
+CALIBRATED_PRIMITIVES = ["3-1"] # turn primitive sets the robot firmware drives the turn commands along, see algo.primitives
+
 # no offset
 '''
 FL_OFFSET = (0, 0)
@@ -1,18 +1,82 @@
+from array import array
 from typing import List
-from consts import Direction, EXPANDED_CELL, SCREENSHOT_COST
-from helper import is_valid
+from weakref import WeakValueDictionary
+import numpy as np
+from consts import Direction, EXPANDED_CELL, SCREENSHOT_COST, SAFE_COST, WIDTH, HEIGHT
+from helper import is_valid, in_start_zone_bypass
+
+# Direction of every int direction value, CellStates read from arrays get the Direction back
+DIRECTION_VALUES = {int(direction): direction for direction in Direction}
 
 
 class CellState:
-    """Base class for all objects on the arena, such as cells, obstacles, etc"""
+    """Base class for all objects on the arena, such as cells, obstacles, etc
+
+    The position and direction are immutable and make up the identity of the cell state: two cell states with the
+    same (x, y, direction) are equal and hash alike, whatever their screenshot id and penalty, so they can key the
+    tables of MazeSolver across requests. The screenshot id and penalty stay settable.
+    """
+
+    __slots__ = ('x', 'y', 'direction', 'screenshot_id', 'penalty', '_hash', '__weakref__')
+    # Attributes that make up the hashed identity
+    FROZEN = frozenset(('x', 'y', 'direction', '_hash'))
+    # Untagged cell states shared by intern, by (class, x, y, direction)
+    INTERNED = WeakValueDictionary()
 
     def __init__(self, x, y, direction: Direction = Direction.NORTH, screenshot_id=-1, penalty=0):
-        self.x = x
-        self.y = y
-        self.direction = direction
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
+        object.__setattr__(self, 'direction', direction)
+        object.__setattr__(self, '_hash', hash((x, y, int(direction))))
         # If screenshot_od != -1, the snapshot is taken at that position is for the obstacle with id = screenshot_id
-        self.screenshot_id = screenshot_id
-        self.penalty = penalty  # Penalty for the view point of taking picture
+        object.__setattr__(self, 'screenshot_id', screenshot_id)
+        object.__setattr__(self, 'penalty', penalty)  # Penalty for the view point of taking picture
+
+    @classmethod
+    def intern(cls, x, y, direction: Direction = Direction.NORTH):
+        """Get the shared untagged cell state at a position, creating it on first use
+
+        Interned cell states are shared by every caller, so they must not be tagged with set_screenshot.
+
+        Args:
+            x (int): x coordinate
+            y (int): y coordinate
+            direction (Direction): direction of cell
+
+        Returns:
+            CellState: the cell state, the same object for as long as it is referenced
+        """
+        key = (cls, x, y, int(direction))
+        state = CellState.INTERNED.get(key)
+        if state is None:
+            state = cls(x, y, direction)
+            CellState.INTERNED[key] = state
+        return state
+
+    def __setattr__(self, name, value):
+        if name in CellState.FROZEN:
+            raise AttributeError(f"{type(self).__name__}.{name} cannot be changed")
+        object.__setattr__(self, name, value)
+
+    def __eq__(self, other):
+        """Checks if this cell state is at the same x, y, and direction as the input
+
+        Args:
+            other (CellState): input cell state to compare to
+
+        Returns:
+            bool: True if same, False otherwise
+        """
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._hash == other._hash and self.x == other.x and self.y == other.y and \
+            self.direction == other.direction
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return CellState, (self.x, self.y, self.direction, self.screenshot_id, self.penalty)
 
     def cmp_position(self, x, y) -> bool:
         """Compare given (x,y) position with cell state's position
@@ -39,6 +103,14 @@ class CellState:
         """
         return self.x == x and self.y == y and self.direction == direction
 
+    def get_state_key(self):
+        """Returns the (x, y, direction) of the cell state as a hashable key, regardless of screenshot id and penalty
+
+        Returns:
+            tuple: (x, y, direction)
+        """
+        return self.x, self.y, int(self.direction)
+
     def __repr__(self):
         return "x: {}, y: {}, d: {}, screenshot: {}".format(self.x, self.y, self.direction, self.screenshot_id)
 
@@ -60,26 +132,25 @@ class CellState:
 
 
 class Obstacle(CellState):
-    """Obstacle class, inherited from CellState"""
+    """Obstacle class, inherited from CellState, equal to the obstacles with the same x, y, and direction"""
+
+    __slots__ = ('obstacle_id',)
 
     def __init__(self, x: int, y: int, direction: Direction, obstacle_id: int):
         super().__init__(x, y, direction)
         self.obstacle_id = obstacle_id
 
-    def __eq__(self, other):
-        """Checks if this obstacle is the same as input in terms of x, y, and direction
-
-        Args:
-            other (Obstacle): input obstacle to compare to
-
-        Returns:
-            bool: True if same, False otherwise
-        """
-        return self.x == other.x and self.y == other.y and self.direction == other.direction
+    def __reduce__(self):
+        return Obstacle, (self.x, self.y, self.direction, self.obstacle_id)
 
-    def get_view_state(self, retrying) -> List[CellState]:
+    def get_view_state(self, retrying, size_x: int = WIDTH, size_y: int = HEIGHT) -> List[CellState]:
         """Constructs the list of CellStates from which the robot can view the symbol on the obstacle
 
+        Args:
+            retrying (bool): whether the robot is retrying the obstacle, which allows other view positions
+            size_x (int, optional): Size of the arena in the x direction. Defaults to WIDTH.
+            size_y (int, optional): Size of the arena in the y direction. Defaults to HEIGHT.
+
         Returns:
             List[CellState]: Valid cell states where robot can be positioned to view the symbol on the obstacle
         """
@@ -89,16 +160,16 @@ class Obstacle(CellState):
         if self.direction == Direction.NORTH:
             if retrying == False:
                 # Or (x, y + 3)
-                if is_valid(self.x, self.y + 1 + EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y + 1 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y + 1 + EXPANDED_CELL * 2, Direction.SOUTH, self.obstacle_id, 10))
                 # Or (x, y + 4)
-                if is_valid(self.x, self.y + 2 + EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y + 2 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y + 2 + EXPANDED_CELL * 2, Direction.SOUTH, self.obstacle_id, 5))
 
                 # Or (x, y + 5)  
-                if is_valid(self.x, self.y + 3 + EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y + 3 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y + 3 + EXPANDED_CELL * 2, Direction.SOUTH, self.obstacle_id, 0))
 
@@ -110,29 +181,29 @@ class Obstacle(CellState):
                 #     cells.append(CellState(self.x - 1, self.y + 1 + EXPANDED_CELL * 2, Direction.SOUTH, self.obstacle_id, SCREENSHOT_COST*10))
 
                 # Or (x + 1, y + 4)
-                if is_valid(self.x + 1, self.y + 2 + EXPANDED_CELL * 2):
+                if is_valid(self.x + 1, self.y + 2 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(self.x + 1, self.y + 2 + EXPANDED_CELL *
                                  2, Direction.SOUTH, self.obstacle_id, SCREENSHOT_COST))
                 # Or (x - 1, y + 4)
-                if is_valid(self.x - 1, self.y + 2 + EXPANDED_CELL * 2):
+                if is_valid(self.x - 1, self.y + 2 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(self.x - 1, self.y + 2 + EXPANDED_CELL *
                                  2, Direction.SOUTH, self.obstacle_id, SCREENSHOT_COST))
 
             elif retrying == True:
                 # Or (x, y + 4)
-                if is_valid(self.x, self.y + 2 + EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y + 2 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y + 2 + EXPANDED_CELL * 2, Direction.SOUTH, self.obstacle_id, 0))
                 # Or (x, y + 5)
-                if is_valid(self.x, self.y + 3 + EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y + 3 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y + 3 + EXPANDED_CELL * 2, Direction.SOUTH, self.obstacle_id, 0))
                 # Or (x + 1, y + 4)
-                if is_valid(self.x + 1, self.y + 2 + EXPANDED_CELL * 2):
+                if is_valid(self.x + 1, self.y + 2 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(self.x + 1, self.y + 2 + EXPANDED_CELL *
                                  2, Direction.SOUTH, self.obstacle_id, SCREENSHOT_COST))
                 # Or (x - 1, y + 4)
-                if is_valid(self.x - 1, self.y + 2 + EXPANDED_CELL * 2):
+                if is_valid(self.x - 1, self.y + 2 + EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(self.x - 1, self.y + 2 + EXPANDED_CELL *
                                  2, Direction.SOUTH, self.obstacle_id, SCREENSHOT_COST))
 
@@ -141,15 +212,15 @@ class Obstacle(CellState):
 
             if retrying == False:
                 # Or (x, y - 3)
-                if is_valid(self.x, self.y - 1 - EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y - 1 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y - 1 - EXPANDED_CELL * 2, Direction.NORTH, self.obstacle_id, 10))
                 # Or (x, y - 4)
-                if is_valid(self.x, self.y - 2 - EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y - 2 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y - 2 - EXPANDED_CELL * 2, Direction.NORTH, self.obstacle_id, 5))
                 # Or (x, y - 5)
-                if is_valid(self.x, self.y - 3 - EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y - 3 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y - 3 - EXPANDED_CELL * 2, Direction.NORTH, self.obstacle_id, 0))
 
@@ -161,29 +232,29 @@ class Obstacle(CellState):
                 #     cells.append(CellState(self.x - 1, self.y - 1 - EXPANDED_CELL * 2, Direction.NORTH, self.obstacle_id, SCREENSHOT_COST*10))
 
                 # Or (x + 1, y - 4)
-                if is_valid(self.x + 1, self.y - 2 - EXPANDED_CELL * 2):
+                if is_valid(self.x + 1, self.y - 2 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(self.x + 1, self.y - 2 - EXPANDED_CELL *
                                  2, Direction.NORTH, self.obstacle_id, SCREENSHOT_COST))
                 # Or (x - 1, y - 4)
-                if is_valid(self.x - 1, self.y - 2 - EXPANDED_CELL * 2):
+                if is_valid(self.x - 1, self.y - 2 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(self.x - 1, self.y - 2 - EXPANDED_CELL *
                                  2, Direction.NORTH, self.obstacle_id, SCREENSHOT_COST))
 
             elif retrying == True:
                 # Or (x, y - 4)
-                if is_valid(self.x, self.y - 2 - EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y - 2 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y - 2 - EXPANDED_CELL * 2, Direction.NORTH, self.obstacle_id, 0))
                 # Or (x, y - 5)
-                if is_valid(self.x, self.y - 3 - EXPANDED_CELL * 2):
+                if is_valid(self.x, self.y - 3 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(
                         self.x, self.y - 3 - EXPANDED_CELL * 2, Direction.NORTH, self.obstacle_id, 0))
                 # Or (x + 1, y - 4)
-                if is_valid(self.x + 1, self.y - 2 - EXPANDED_CELL * 2):
+                if is_valid(self.x + 1, self.y - 2 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(self.x + 1, self.y - 2 - EXPANDED_CELL *
                                  2, Direction.NORTH, self.obstacle_id, SCREENSHOT_COST))
                 # Or (x - 1, y - 4)
-                if is_valid(self.x - 1, self.y - 2 - EXPANDED_CELL * 2):
+                if is_valid(self.x - 1, self.y - 2 - EXPANDED_CELL * 2, size_x, size_y):
                     cells.append(CellState(self.x - 1, self.y - 2 - EXPANDED_CELL *
                                  2, Direction.NORTH, self.obstacle_id, SCREENSHOT_COST))
 
@@ -192,16 +263,16 @@ class Obstacle(CellState):
 
             if retrying == False:
                 # Or (x + 3,y)
-                if is_valid(self.x + 1 + EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x + 1 + EXPANDED_CELL * 2, self.y, size_x, size_y):
                     cells.append(CellState(self.x + 1 + EXPANDED_CELL * 2,
                                  self.y, Direction.WEST, self.obstacle_id, 10))
                 # Or (x + 4,y)
-                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y, size_x, size_y):
                     # print(f"Obstacle facing east, Adding {self.x + 2 + EXPANDED_CELL * 2}, {self.y}")
                     cells.append(CellState(self.x + 2 + EXPANDED_CELL * 2,
                                  self.y, Direction.WEST, self.obstacle_id, 5))
                 # Or (x + 5,y)
-                if is_valid(self.x + 3 + EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x + 3 + EXPANDED_CELL * 2, self.y, size_x, size_y):
                     # print(f"Obstacle facing east, Adding {self.x + 2 + EXPANDED_CELL * 2}, {self.y}")
                     cells.append(CellState(self.x + 3 + EXPANDED_CELL * 2,
                                  self.y, Direction.WEST, self.obstacle_id, 0))
@@ -216,29 +287,29 @@ class Obstacle(CellState):
                 #     cells.append(CellState(self.x + 1 + EXPANDED_CELL * 2, self.y - 1, Direction.WEST, self.obstacle_id, SCREENSHOT_COST*10))
 
                 # Or (x + 4, y + 1)
-                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y + 1):
+                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y + 1, size_x, size_y):
                     cells.append(CellState(self.x + 2 + EXPANDED_CELL * 2, self.y +
                                  1, Direction.WEST, self.obstacle_id, SCREENSHOT_COST))
                 # Or (x + 4, y - 1)
-                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y - 1):
+                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y - 1, size_x, size_y):
                     cells.append(CellState(self.x + 2 + EXPANDED_CELL * 2, self.y -
                                  1, Direction.WEST, self.obstacle_id, SCREENSHOT_COST))
 
             elif retrying == True:
                 # Or (x + 4, y)
-                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y, size_x, size_y):
                     cells.append(CellState(self.x + 2 + EXPANDED_CELL * 2,
                                  self.y, Direction.WEST, self.obstacle_id, 0))
                 # Or (x + 5, y)
-                if is_valid(self.x + 3 + EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x + 3 + EXPANDED_CELL * 2, self.y, size_x, size_y):
                     cells.append(CellState(self.x + 3 + EXPANDED_CELL * 2,
                                  self.y, Direction.WEST, self.obstacle_id, 0))
                 # Or (x + 4,y + 1)
-                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y + 1):
+                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y + 1, size_x, size_y):
                     cells.append(CellState(self.x + 2 + EXPANDED_CELL * 2, self.y +
                                  1, Direction.WEST, self.obstacle_id, SCREENSHOT_COST))
                 # Or (x + 4,y - 1)
-                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y - 1):
+                if is_valid(self.x + 2 + EXPANDED_CELL * 2, self.y - 1, size_x, size_y):
                     cells.append(CellState(self.x + 2 + EXPANDED_CELL * 2, self.y -
                                  1, Direction.WEST, self.obstacle_id, SCREENSHOT_COST))
 
@@ -250,15 +321,15 @@ class Obstacle(CellState):
 
             if retrying == False:
                 # Or (x - 3, y)
-                if is_valid(self.x - 1 - EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x - 1 - EXPANDED_CELL * 2, self.y, size_x, size_y):
                     cells.append(CellState(self.x - 1 - EXPANDED_CELL * 2,
                                  self.y, Direction.EAST, self.obstacle_id, 10))
                 # Or (x - 4, y)
-                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y, size_x, size_y):
                     cells.append(CellState(self.x - 2 - EXPANDED_CELL * 2,
                                  self.y, Direction.EAST, self.obstacle_id, 5))
                 # Or (x - 5, y)
-                if is_valid(self.x - 3 - EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x - 3 - EXPANDED_CELL * 2, self.y, size_x, size_y):
                     cells.append(CellState(self.x - 3 - EXPANDED_CELL * 2,
                                  self.y, Direction.EAST, self.obstacle_id, 0))
 
@@ -270,35 +341,95 @@ class Obstacle(CellState):
                 #     cells.append(CellState(self.x - 1 - EXPANDED_CELL * 2, self.y - 1, Direction.EAST, self.obstacle_id, SCREENSHOT_COST*10))
 
                 # Or (x - 4, y + 1)
-                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y + 1):
+                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y + 1, size_x, size_y):
                     cells.append(CellState(self.x - 2 - EXPANDED_CELL * 2, self.y +
                                  1, Direction.EAST, self.obstacle_id, SCREENSHOT_COST))
                 # Or (x - 4, y - 1)
-                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y - 1):
+                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y - 1, size_x, size_y):
                     cells.append(CellState(self.x - 2 - EXPANDED_CELL * 2, self.y -
                                  1, Direction.EAST, self.obstacle_id, SCREENSHOT_COST))
 
             elif retrying == True:
                 # Or (x - 4, y)
-                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y, size_x, size_y):
                     cells.append(CellState(self.x - 2 - EXPANDED_CELL * 2,
                                  self.y, Direction.EAST, self.obstacle_id, 0))
                 # Or (x - 5, y)
-                if is_valid(self.x - 3 - EXPANDED_CELL * 2, self.y):
+                if is_valid(self.x - 3 - EXPANDED_CELL * 2, self.y, size_x, size_y):
                     cells.append(CellState(self.x - 3 - EXPANDED_CELL * 2,
                                  self.y, Direction.EAST, self.obstacle_id, 0))
                 # Or (x - 4, y + 1)
-                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y + 1):
+                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y + 1, size_x, size_y):
                     cells.append(CellState(self.x - 2 - EXPANDED_CELL * 2, self.y +
                                  1, Direction.EAST, self.obstacle_id, SCREENSHOT_COST))
                 # Or (x - 4, y - 1)
-                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y - 1):
+                if is_valid(self.x - 2 - EXPANDED_CELL * 2, self.y - 1, size_x, size_y):
                     cells.append(CellState(self.x - 2 - EXPANDED_CELL * 2, self.y -
                                  1, Direction.EAST, self.obstacle_id, SCREENSHOT_COST))
 
         return cells
 
 
+class TourPath:
+    """Cell states along a path, kept as a flat array of (x, y, direction, screenshot id) rows
+
+    A long tour is stored in four ints per cell rather than one CellState object per cell. Indexing and iterating
+    give CellStates built from the rows, so the path reads like a list of cell states. The screenshot ids live in
+    the rows, tagging a state of the path never touches a cell state shared with the solver tables.
+    """
+
+    __slots__ = ('rows',)
+
+    def __init__(self, states=()):
+        """
+        Args:
+            states (Iterable[CellState], optional): cell states along the path. Defaults to an empty path.
+        """
+        self.rows = array('i')
+        for state in states:
+            self.append(state.x, state.y, state.direction, state.screenshot_id)
+
+    def append(self, x: int, y: int, direction: Direction, screenshot_id: int = -1):
+        """Append a cell state at the end of the path
+
+        Args:
+            x (int): x coordinate
+            y (int): y coordinate
+            direction (Direction): direction of cell
+            screenshot_id (int, optional): screenshot id of cell. Defaults to -1, no screenshot.
+        """
+        self.rows.extend((x, y, direction, screenshot_id))
+
+    def set_screenshot(self, screenshot_id: int):
+        """Set the screenshot id of the last cell state of the path
+
+        Args:
+            screenshot_id (int): screenshot id of cell
+        """
+        self.rows[-1] = screenshot_id
+
+    def __len__(self):
+        return len(self.rows) // 4
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("TourPath index out of range")
+        x, y, direction, screenshot_id = self.rows[4 * i:4 * i + 4]
+        return CellState(x, y, DIRECTION_VALUES[direction], screenshot_id)
+
+    def __iter__(self):
+        rows = self.rows
+        for i in range(0, len(rows), 4):
+            yield CellState(rows[i], rows[i + 1], DIRECTION_VALUES[rows[i + 2]], rows[i + 3])
+
+    def __repr__(self):
+        return "TourPath({})".format(list(self))
+
+
 class Grid:
     """
     Grid object that contains the size of the grid and a list of obstacles
@@ -312,6 +443,15 @@ class Grid:
         self.size_x = size_x
         self.size_y = size_y
         self.obstacles: List[Obstacle] = []
+        # The same obstacles as a set, for the duplicate check of add_obstacle
+        self.obstacle_set = set()
+        # Clearance masks, safe cost fields and occupancy bitmap, rebuilt lazily whenever the obstacle layout changes
+        self.reachable_mask = None
+        self.safe_cost_field = None
+        self.occupancy = None
+        # Obstacle hits of the swept cells of the turns, see get_sweep_field
+        self.sweep_fields = dict()
+        self._masks_stale = True
 
     def add_obstacle(self, obstacle: Obstacle):
         """Add a new obstacle to the Grid object, ignores if duplicate obstacle
@@ -319,21 +459,24 @@ class Grid:
         Args:
             obstacle (Obstacle): Obstacle to be added
         """
-        # Loop through the existing obstacles to check for duplicates
-        to_add = True
-        for ob in self.obstacles:
-            if ob == obstacle:
-                to_add = False
-                break
-
-        if to_add:
+        if obstacle not in self.obstacle_set:
             self.obstacles.append(obstacle)
+            self.obstacle_set.add(obstacle)
+            self._masks_stale = True
 
     def reset_obstacles(self):
         """
         Resets the obstacles in the grid
         """
         self.obstacles = []
+        self.obstacle_set = set()
+        self._masks_stale = True
+
+    def get_layout_key(self):
+        """
+        Returns a canonical hashable key of the obstacle layout, only the obstacle positions affect reachability
+        """
+        return self.size_x, self.size_y, tuple(sorted({(ob.x, ob.y) for ob in self.obstacles}))
 
     def get_obstacles(self):
         """
@@ -341,53 +484,118 @@ class Grid:
         """
         return self.obstacles
 
-    def reachable(self, x: int, y: int, turn=False, preTurn=False) -> bool:
+    def build_clearance_masks(self):
+        """Precompute the clearance masks and safe cost fields for the current obstacle layout.
+
+        - reachable_mask: True where the robot can be placed, at least 2 units (max of x/y distance) away from every
+          nearby obstacle. Only obstacles less than 4 units away in total (x+y) are considered, as in the original
+          rules.
+        - safe_cost_field: SAFE_COST where the cell is close to an obstacle, 0 otherwise.
+        - occupancy: True on the obstacle cells, the turns are checked against it, see get_sweep_field
+        """
+        xs, ys = np.meshgrid(np.arange(self.size_x), np.arange(self.size_y), indexing='ij')
+
+        in_bounds = (xs >= 1) & (xs < self.size_x - 1) & (ys >= 1) & (ys < self.size_y - 1)
+        normal_blocked = np.zeros((self.size_x, self.size_y), dtype=bool)
+        near_safe = np.zeros((self.size_x, self.size_y), dtype=bool)
+        occupancy = np.zeros((self.size_x, self.size_y), dtype=bool)
+
+        for ob in self.obstacles:
+            dx = np.abs(xs - ob.x)
+            dy = np.abs(ys - ob.y)
+            near = dx + dy < 4
+            # Obstacles at x == 4 do not block the start zone
+            if in_start_zone_bypass(ob.x, ob.y):
+                near &= ~((xs < 4) & (ys < 4))
+            chebyshev = np.maximum(dx, dy)
+            normal_blocked |= near & (chebyshev < 2)
+
+            near_safe |= ((dx == 2) & (dy == 2)) | ((dx == 1) & (dy == 2)) | ((dx == 2) & (dy == 1))
+            if 0 <= ob.x < self.size_x and 0 <= ob.y < self.size_y:
+                occupancy[ob.x, ob.y] = True
+
+        self.reachable_mask = in_bounds & ~normal_blocked
+        self.safe_cost_field = np.where(near_safe, SAFE_COST, 0)
+        self.occupancy = occupancy
+        self.sweep_fields = dict()
+        self._masks_stale = False
+
+    def get_sweep_field(self, cells: tuple, walls: bool) -> np.ndarray:
+        """Get whether the swept cells of a turn cover an obstacle from every start cell, memoised per obstacle
+        layout
+
+        The field is the OR of the occupancy bitmap shifted by every swept cell, so a turn is checked with one
+        lookup, see MazeSolver.get_unit_moves.
+
+        Args:
+            cells (tuple): (dx, dy) of the swept cells from the start cell, see algo.primitives.get_swept_cells
+            walls (bool): whether the cells outside the arena count as obstacles
+
+        Returns:
+            np.ndarray: (size_x, size_y) boolean array, True where the turn starting there hits an obstacle
+        """
+        self._ensure_masks()
+        key = (cells, walls)
+        if key not in self.sweep_fields:
+            pad = max(max(abs(dx), abs(dy)) for dx, dy in cells)
+            padded = np.full((self.size_x + 2 * pad, self.size_y + 2 * pad), walls)
+            padded[pad:pad + self.size_x, pad:pad + self.size_y] = self.occupancy
+            field = np.zeros((self.size_x, self.size_y), dtype=bool)
+            for dx, dy in cells:
+                field |= padded[pad + dx:pad + dx + self.size_x, pad + dy:pad + dy + self.size_y]
+            self.sweep_fields[key] = field
+        return self.sweep_fields[key]
+
+    def _ensure_masks(self):
+        if self._masks_stale:
+            self.build_clearance_masks()
+
+    def get_clearance_masks(self):
+        """Get the clearance masks and safe cost fields of the current obstacle layout, see build_clearance_masks
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: reachable_mask, safe_cost_field
+        """
+        self._ensure_masks()
+        return self.reachable_mask, self.safe_cost_field
+
+    def reachable(self, x: int, y: int) -> bool:
         """Checks whether the given x,y coordinate is reachable/safe. Criterion is as such:
         - Must be at least 4 units away in total (x+y) from the obstacle
-        - Greater distance (x or y distance) must be at least 3 units away from obstacle
+        - Greater distance (x or y distance) must be at least 2 units away from obstacle
 
         Args:
-            x (int): _description_
-            y (int): _description_
+            x (int): x-coordinate
+            y (int): y-coordinate
 
         Returns:
-            bool: _description_
+            bool: True if reachable, False otherwise
         """
-        
         if not self.is_valid_coord(x, y):
             return False
 
-        for ob in self.obstacles:
-            # print(f"Looking at position x:{x} y:{y} against ob: {ob.x} {ob.y}")
-            if ob.x == 4 and ob.y <= 4 and x < 4 and y < 4:
-                # print(f"ob.x: {ob.x} ob.y: {ob.y} x: {x} y:{y} Triggered four bypass")
-                continue
+        self._ensure_masks()
+        return bool(self.reachable_mask[x, y])
 
-            # if x <= 3 and y <= 4:
-            #     continue
+    def safe_cost(self, x: int, y: int) -> int:
+        """Get the safe cost of a particular x,y coordinate wrt obstacles that are exactly 2 units away from it in both x and y directions
 
-            # Must be at least 4 units away in total (x+y)
-            if abs(ob.x - x) + abs(ob.y - y) >= 4:
-                # print(f"ob.x: {ob.x} ob.y: {ob.y} x: {x} y:{y} Triggered more than 3 units bypass")
-                continue
-            # If max(x,y) is less than 3 units away, consider not reachable
-            # if max(abs(ob.x - x), abs(ob.y - y)) < EXPANDED_CELL * 2 + 1:
-            if turn:
-                if max(abs(ob.x - x), abs(ob.y - y)) < EXPANDED_CELL * 2 + 1:
-                    # if ob.x == 0 and ob.y == 10 and x == 1 and y == 12:
-                    #     print(f"ob.x: {ob.x} ob.y: {ob.y} x: {x} y:{y} Triggered less than 3 max units trap")
-                    return False
-            if preTurn:
-                if max(abs(ob.x - x), abs(ob.y - y)) < EXPANDED_CELL * 2 + 1:
-                    # if ob.x == 0 and ob.y == 10 and x == 1 and y == 12:
-                    #     print(f"ob.x: {ob.x} ob.y: {ob.y} x: {x} y:{y} Triggered less than 3 max units trap")
-                    return False
-            else:
-                if max(abs(ob.x - x), abs(ob.y - y)) < 2:
-                    # print(f"ob.x: {ob.x} ob.y: {ob.y} x: {x} y:{y} Triggered less than 3 max units trap")
-                    return False
+        Args:
+            x (int): x-coordinate
+            y (int): y-coordinate
 
-        return True
+        Returns:
+            int: safe cost
+        """
+        if 0 <= x < self.size_x and 0 <= y < self.size_y:
+            self._ensure_masks()
+            return int(self.safe_cost_field[x, y])
+
+        for ob in self.obstacles:
+            dx, dy = abs(ob.x - x), abs(ob.y - y)
+            if (dx, dy) in ((2, 2), (1, 2), (2, 1)):
+                return SAFE_COST
+        return 0
 
     def is_valid_coord(self, x: int, y: int) -> bool:
         """Checks if given position is within bounds
@@ -428,7 +636,7 @@ class Grid:
                 continue
             else:
                 view_states = [view_state for view_state in obstacle.get_view_state(
-                    retrying) if self.reachable(view_state.x, view_state.y)]
+                    retrying, self.size_x, self.size_y) if self.reachable(view_state.x, view_state.y)]
             optimal_positions.append(view_states)
 
         return optimal_positions
\ No newline at end of file
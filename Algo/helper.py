@@ -1,23 +1,131 @@
 from consts import WIDTH, HEIGHT, Direction, FL_OFFSET, FR_OFFSET, FW_OFFSET, BW_OFFSET, FW_SMALL_OFFSET, BW_SMALL_OFFSET
+from consts import LARGE_ARENA_TIME_BUDGET_MS, LARGE_ARENA_SEARCH_CELLS
+from algo.primitives import PRIMITIVE_SETS, DEFAULT_PRIMITIVES
+from algo.symmetry import transform_vector
 
 
-def is_valid(center_x: int, center_y: int):
+def is_valid(center_x: int, center_y: int, size_x: int = WIDTH, size_y: int = HEIGHT):
     """Checks if given position is within bounds
 
     Inputs
     ------
     center_x (int): x-coordinate
     center_y (int): y-coordinate
+    size_x (int): size of the arena in the x direction, defaults to WIDTH
+    size_y (int): size of the arena in the y direction, defaults to HEIGHT
 
     Returns
     -------
     bool: True if valid, False otherwise
     """
-    return center_x > 0 and center_y > 0 and center_x < WIDTH - 1 and center_y < HEIGHT - 1
+    return center_x > 0 and center_y > 0 and center_x < size_x - 1 and center_y < size_y - 1
 
 
+def in_start_zone_bypass(x: int, y: int):
+    """Checks if an obstacle does not block the start zone, as in the original rules: the ones at x == 4 next to it
 
-def command_generator(states, obstacles):
+    Inputs
+    ------
+    x (int): x-coordinate of the obstacle
+    y (int): y-coordinate of the obstacle
+
+    Returns
+    -------
+    bool: True if the cells x < 4, y < 4 stay reachable next to the obstacle, False otherwise
+    """
+    return x == 4 and y <= 4
+
+
+def get_default_search_mode(size_x: int, size_y: int):
+    """Search mode of a request that does not set one: one A* search per state pair does not scale past the
+    standard arena, one search per source state does
+
+    Inputs
+    ------
+    size_x (int): size of the arena in the x direction
+    size_y (int): size of the arena in the y direction
+
+    Returns
+    -------
+    str: MazeSolver search_mode
+    """
+    return 'astar' if size_x * size_y <= WIDTH * HEIGHT else 'dijkstra'
+
+
+def get_default_order_solver(size_x: int, size_y: int, n_obstacles: int):
+    """Order solver of a request that does not set one: the hierarchical one past the standard arena when the
+    searches of every pair of view states would not fit LARGE_ARENA_TIME_BUDGET_MS, gtsp otherwise
+
+    One search per view state covers the whole arena, so the search time grows with the obstacles times the arena
+    cells, which is compared to LARGE_ARENA_SEARCH_CELLS. The hierarchical tour is longer, see
+    MazeSolver.solve_optimal_order for its fallback.
+
+    Inputs
+    ------
+    size_x (int): size of the arena in the x direction
+    size_y (int): size of the arena in the y direction
+    n_obstacles (int): number of obstacles of the request
+
+    Returns
+    -------
+    str: MazeSolver order_solver
+    """
+    if size_x * size_y <= WIDTH * HEIGHT or n_obstacles * size_x * size_y <= LARGE_ARENA_SEARCH_CELLS:
+        return 'gtsp'
+    return 'hierarchical'
+
+
+def get_default_time_budget_ms(size_x: int, size_y: int, order_solver: str):
+    """Time budget of a request that does not set one: LARGE_ARENA_TIME_BUDGET_MS for the hierarchical order solver
+    past the standard arena, none otherwise
+
+    The other order solvers search every pair of view states before ordering them, which a budget cannot cut short,
+    so they keep their defaults. Large arenas default to the hierarchical solver, see get_default_order_solver.
+
+    Inputs
+    ------
+    size_x (int): size of the arena in the x direction
+    size_y (int): size of the arena in the y direction
+    order_solver (str): MazeSolver order_solver
+
+    Returns
+    -------
+    float: time budget in milliseconds, None for no budget
+    """
+    if order_solver != 'hierarchical' or size_x * size_y <= WIDTH * HEIGHT:
+        return None
+    return LARGE_ARENA_TIME_BUDGET_MS
+
+
+def get_turn_command(prev_state, state, primitives):
+    """Get the command of a turn from the turn primitive that moves between the two states
+
+    A path read backward from the path table drives its turns the other way round, a forward right turn becomes a
+    reverse turn to the left and so on.
+
+    Inputs
+    ------
+    prev_state: State before the turn
+    state: State after the turn
+    primitives: turn primitives of the path, see algo.primitives
+
+    Returns
+    -------
+    str: the turn command, None if no primitive moves between the states
+    """
+    dx, dy = state.x - prev_state.x, state.y - prev_state.y
+    for primitive in primitives:
+        if (prev_state.direction + primitive.heading) % 8 == state.direction and \
+                transform_vector((prev_state.direction >> 1, False), *primitive.offset) == (dx, dy):
+            return primitive.command
+        if (state.direction + primitive.heading) % 8 == prev_state.direction and \
+                transform_vector((state.direction >> 1, False), *primitive.offset) == (-dx, -dy):
+            return primitive._replace(heading=8 - primitive.heading, reverse=not primitive.reverse).command
+    return None
+
+
+
+def command_generator(states, obstacles, primitives=None):
     """
     This function takes in a list of states and generates a list of commands for the robot to follow
     
@@ -25,6 +133,8 @@ def command_generator(states, obstacles):
     ------
     states: list of State objects
     obstacles: list of obstacles, each obstacle is a dictionary with keys "x", "y", "d", and "id"
+    primitives: turn primitives of the path, see algo.primitives. With the default set, or if not given, every turn
+        is a forward turn as the robot is calibrated for, see FL_OFFSET and FR_OFFSET
 
     Returns
     -------
@@ -36,6 +146,8 @@ def command_generator(states, obstacles):
     
     # Initialize commands list
     commands = []
+    if primitives is not None and tuple(primitives) == PRIMITIVE_SETS[DEFAULT_PRIMITIVES]:
+        primitives = None
 
     # Iterate through each state in the list of states
     for i in range(1, len(states)):
@@ -111,6 +223,13 @@ def command_generator(states, obstacles):
             
             continue
 
+        # The other primitive sets have reverse turns and turns of other sizes, the primitive gives the command
+        if primitives is not None:
+            command = get_turn_command(states[i - 1], states[i], primitives)
+            if command is None:
+                raise Exception("Invalid turning direction")
+            commands.append(command)
+
         # If previous state and current state are not the same direction, it means that there will be a turn command involved
         # Assume there are 4 turning command: FR, FL, BL, BR (the turn command will turn the robot 90 degrees)
         # FR00 | FR30: Forward Right;
@@ -119,7 +238,7 @@ def command_generator(states, obstacles):
         # BL00 | BL30: Backward Left;
 
         # Facing north previously
-        if states[i - 1].direction == Direction.NORTH:
+        elif states[i - 1].direction == Direction.NORTH:
             # Facing east afterwards
             if states[i].direction == Direction.EAST:
 
@@ -2,11 +2,16 @@ import time
 import os
 import logging
 from pathlib import Path
-from algo.algo import MazeSolver 
+from algo.algo import MazeSolver, ORDER_SOLVERS
+from algo.parallel import default_workers
+from algo.retry import RETRY_SESSIONS
+from algo.plan_store import PlanStore, DEFAULT_STORE, get_canonical_commands, restore_commands
+from algo.primitives import get_robot_primitives
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from model import *
-from helper import command_generator
+from helper import command_generator, get_default_order_solver, get_default_search_mode, get_default_time_budget_ms
+from consts import WIDTH, HEIGHT
 
 # Setup logging
 LOG_DIR = Path(__file__).resolve().parent / 'logs'
@@ -26,6 +31,10 @@ CORS(app)
 # Defer heavy model loading to avoid long startup times
 # model = load_model()
 model = None
+# Processes for the pairwise path searches: 1 searches in the request thread, 0 uses every core but one
+PATH_WORKERS = int(os.getenv('PATH_WORKERS', 1)) or default_workers()
+# Solved plans kept across server processes, pre-populated with python -m algo.precompute
+PLAN_STORE = PlanStore(os.getenv('PLAN_STORE', DEFAULT_STORE))
 
 @app.route('/status', methods=['GET'])
 def status():
@@ -40,7 +49,22 @@ def status():
 def path_finding():
     """
     This is the main endpoint for the path finding algorithm
+    The arena is "size_x" by "size_y" cells, WIDTH by HEIGHT if not given.
+    The tour is ordered by the "order_solver" of MazeSolver, "gtsp" if not given, or "hierarchical" on an arena
+    too large to search every pair of view states in time, see helper.get_default_order_solver. The hierarchical
+    one keeps to "time_budget_ms", LARGE_ARENA_TIME_BUDGET_MS by default past the standard arena, the others search
+    every pair of view states first and only bound the ordering.
+    The turns are the "primitives" set of algo.primitives, or the one of "big_turn" if not given. The turn commands
+    are the same for every set and the robot drives them as it is calibrated for, so "primitives" has to be in
+    CALIBRATED_PRIMITIVES, the other sets are for the simulator and the benchmarks. A "big_turn" without a
+    calibration is ignored with a warning, see algo.primitives.get_robot_primitives.
+    Plans in the plan store, or rotated copies of them, are returned without solving, see algo.plan_store.
+    A retry request reuses the searches of the previous plan with the same "session_id", see algo.retry. Clients
+    behind one NAT share an address, so requests without a "session_id" get no retry session.
     :return: a json object with a key "data" and value a dictionary with keys "distance", "path", and "commands"
+             (plus "lower_bound" and "optimality_gap" when the request sets "time_budget_ms" or has too many obstacles
+             for the exact solver, and
+             "unreachable_obstacles" with the ids of the obstacles without any reachable view position)
     """
     try:
         # Log incoming request
@@ -76,13 +100,35 @@ def path_finding():
 
         # Extract and validate types
         obstacles = payload['obstacles']
+        if not isinstance(obstacles, list):
+            msg = "obstacles must be a list"
+            logger.warning(msg)
+            return jsonify({
+                "data": {
+                    'distance': 0.0,
+                    'path': [],
+                    'commands': []
+                },
+                "error": msg
+            }), 400
         retrying = payload.get('retrying', False)
         try:
             robot_x = int(payload['robot_x'])
             robot_y = int(payload['robot_y'])
             robot_direction = int(payload['robot_dir'])
+            size_x = int(payload.get('size_x', WIDTH))
+            size_y = int(payload.get('size_y', HEIGHT))
+            if size_x < 3 or size_y < 3:
+                raise ValueError(f"arena size {size_x}x{size_y} is too small")
+            order_solver = payload.get('order_solver', get_default_order_solver(size_x, size_y, len(obstacles)))
+            if order_solver not in ORDER_SOLVERS:
+                raise ValueError(f"unknown order solver {order_solver}, expected one of {list(ORDER_SOLVERS)}")
+            time_budget_ms = payload.get('time_budget_ms', get_default_time_budget_ms(size_x, size_y, order_solver))
+            if time_budget_ms is not None:
+                time_budget_ms = float(time_budget_ms)
+            primitives = get_robot_primitives(payload.get('primitives'), payload.get('big_turn'))
         except Exception as e:
-            msg = f"Invalid robot coordinates or direction: {e}"
+            msg = f"Invalid robot coordinates, direction, arena size, order solver or turn primitives: {e}"
             logger.exception(msg)
             return jsonify({
                 "data": {
@@ -93,23 +139,15 @@ def path_finding():
                 "error": msg
             }), 400
 
+        search_mode = payload.get('search_mode', get_default_search_mode(size_x, size_y))
+
         # Initialize MazeSolver
-        logger.info("Initializing MazeSolver at x=%s y=%s dir=%s", robot_x, robot_y, robot_direction)
-        maze_solver = MazeSolver(20, 20, robot_x, robot_y, robot_direction, big_turn=None)
+        logger.info("Initializing %sx%s MazeSolver at x=%s y=%s dir=%s", size_x, size_y, robot_x, robot_y,
+                    robot_direction)
+        maze_solver = MazeSolver(size_x, size_y, robot_x, robot_y, robot_direction, primitives=primitives,
+                                 search_mode=search_mode, order_solver=order_solver, workers=PATH_WORKERS)
 
         # Add obstacles
-        if not isinstance(obstacles, list):
-            msg = "obstacles must be a list"
-            logger.warning(msg)
-            return jsonify({
-                "data": {
-                    'distance': 0.0,
-                    'path': [],
-                    'commands': []
-                },
-                "error": msg
-            }), 400
-
         for ob in obstacles:
             try:
                 maze_solver.add_obstacle(ob['x'], ob['y'], ob['d'], ob['id'])
@@ -117,10 +155,26 @@ def path_finding():
                 logger.exception("Failed to add obstacle %s: %s", ob, e)
                 # continue adding others
 
+        # Only a session named by the client, the address is shared by the clients behind a NAT
+        session_id = payload.get('session_id')
+        if retrying and session_id is not None:
+            # Plan the retry with the cost-to-go fields computed while the robot ran the first plan
+            maze_solver.retry_session = RETRY_SESSIONS.get(session_id, maze_solver)
+
         start = time.time()
-        # Compute path
+        # Look the plan up in the store, or compute it
+        commands = None
         try:
-            optimal_path, distance = maze_solver.get_optimal_order_dp(retrying=retrying)
+            plan_key, transform, obstacle_ids = maze_solver.get_plan_key(retrying, time_budget_ms)
+            stored = PLAN_STORE.get(plan_key)
+            if stored is not None:
+                plan, stored_commands = stored
+                optimal_path, distance = maze_solver.restore_plan(plan, transform, obstacle_ids)
+                commands = restore_commands(stored_commands, transform, obstacle_ids)
+                logger.info("Plan found in the plan store")
+            else:
+                optimal_path, distance = maze_solver.get_optimal_order_dp(retrying=retrying,
+                                                                          time_budget_ms=time_budget_ms)
         except Exception as e:
             logger.exception("Path computation failed: %s", e)
             return jsonify({
@@ -134,10 +188,15 @@ def path_finding():
 
         logger.info("Time taken to find shortest path: %s seconds", time.time() - start)
         logger.info("Distance to travel: %s units", distance)
+        # The retry fields are only computed for solved plans, a plan restored from the store or the plan cache is
+        # a lookup that the background searches would slow down
+        if not retrying and not maze_solver.plan_restored and session_id is not None:
+            RETRY_SESSIONS.start(session_id, maze_solver)
 
         # Generate commands
         try:
-            commands = command_generator(optimal_path, obstacles)
+            if commands is None:
+                commands = command_generator(optimal_path, obstacles, maze_solver.primitives)
             print("Generated commands:", commands)
         except Exception as e:
             logger.exception("Command generation failed: %s", e)
@@ -150,6 +209,13 @@ def path_finding():
                 "error": f"Command generation failed: {e}"
             }), 500
 
+        if stored is None:
+            try:
+                plan = maze_solver.get_canonical_plan(optimal_path, distance, transform, obstacle_ids)
+                PLAN_STORE.put(plan_key, plan, get_canonical_commands(commands, transform, obstacle_ids))
+            except Exception as e:
+                logger.exception("Failed to store the plan: %s", e)
+
         # Build path results
         try:
             path_results = [optimal_path[0].get_dict()]
@@ -181,12 +247,21 @@ def path_finding():
                 "error": f"Failed to build path results: {e}"
             }), 500
 
+        data = {
+            'distance': distance,
+            'path': path_results,
+            'commands': commands
+        }
+        # Obstacles that cannot be photographed from anywhere the robot can reach
+        if maze_solver.unreachable_obstacles:
+            data['unreachable_obstacles'] = maze_solver.unreachable_obstacles
+        # Anytime planning reports how close the returned tour is to optimal
+        if time_budget_ms is not None or maze_solver.is_large_instance():
+            data['lower_bound'] = maze_solver.lower_bound
+            data['optimality_gap'] = maze_solver.optimality_gap
+
         return jsonify({
-            "data": {
-                'distance': distance,
-                'path': path_results,
-                'commands': commands
-            },
+            "data": data,
             "error": None
         })
     except Exception as e:
@@ -0,0 +1,146 @@
+"""Regression tests of the plan keys up to the arena symmetries, see algo.symmetry, and of the plan store
+
+A rotated or mirrored copy of a layout, with the start pose transformed alike and the obstacle ids shuffled, has
+to be planned with the same distance, share the plan key of the original, and get the plan of the original back
+from the store with the SNAP commands naming its own obstacle ids.
+
+Run from the Algo directory:
+    python -m pytest tests
+"""
+import pytest
+
+from algo.algo import MazeSolver
+from algo.path_cache import PATH_CACHE
+from algo.plan_cache import PLAN_CACHE
+from algo.plan_store import PlanStore, get_canonical_commands, restore_commands
+from algo.symmetry import TRANSFORMS, IDENTITY, invert, transform_size, transform_state
+from consts import Direction
+from helper import command_generator
+
+SIZE = 20
+
+# (x, y, direction, id), away from the start zone rule at x == 4 in every image, see helper.in_start_zone_bypass
+LAYOUT = [(10, 6, 0, 1), (15, 14, 6, 2), (6, 13, 2, 3), (13, 10, 4, 4)]
+START = (1, 1, int(Direction.NORTH))
+
+
+def transform_request(transform: tuple):
+    """Image of LAYOUT and START under a transform, with the obstacle ids reversed
+
+    Returns:
+        Tuple[List[tuple], tuple]: the obstacles and the start pose
+    """
+    obstacles = [transform_state(transform, x, y, direction, SIZE, SIZE) + (len(LAYOUT) + 1 - obstacle_id,)
+                 for x, y, direction, obstacle_id in LAYOUT]
+    return obstacles, transform_state(transform, *START, SIZE, SIZE)
+
+
+def make_solver(obstacles, start, primitives):
+    maze_solver = MazeSolver(SIZE, SIZE, *start, primitives=primitives)
+    for obstacle in obstacles:
+        maze_solver.add_obstacle(*obstacle)
+    return maze_solver
+
+
+def solve(obstacles, start, primitives):
+    """Plan a request from scratch, without the path and plan caches
+
+    Returns:
+        Tuple[MazeSolver, TourPath, float, List[str]]: the solver, the path, its distance and its commands
+    """
+    PATH_CACHE.clear()
+    PLAN_CACHE.clear()
+    maze_solver = make_solver(obstacles, start, primitives)
+    optimal_path, distance = maze_solver.get_optimal_order_dp(retrying=False)
+    commands = command_generator(optimal_path, to_payload(obstacles), maze_solver.primitives)
+    return maze_solver, optimal_path, distance, commands
+
+
+def to_payload(obstacles):
+    return [{'x': x, 'y': y, 'd': direction, 'id': obstacle_id} for x, y, direction, obstacle_id in obstacles]
+
+
+def snap_ids(commands):
+    return [int(command[4:].rsplit("_", 1)[0]) for command in commands if command.startswith("SNAP")]
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS)
+def test_transform_round_trip(transform):
+    size_x, size_y = 20, 12
+    image_x, image_y = transform_size(transform, size_x, size_y)
+    for x, y, direction in [(0, 0, 0), (3, 7, 2), (19, 11, 4), (8, 1, 6)]:
+        image = transform_state(transform, x, y, direction, size_x, size_y)
+        assert 0 <= image[0] < image_x and 0 <= image[1] < image_y
+        assert transform_state(invert(transform), *image, image_x, image_y) == (x, y, direction)
+
+
+@pytest.mark.parametrize("primitives", ["3-1", "4-2"])
+def test_symmetric_layouts(primitives, tmp_path):
+    maze_solver, optimal_path, distance, commands = solve(LAYOUT, START, primitives)
+    assert distance > 0
+    plan_key, transform, obstacle_ids = maze_solver.get_plan_key(False)
+    store = PlanStore(tmp_path / "plans.db")
+    store.put(plan_key, maze_solver.get_canonical_plan(optimal_path, distance, transform, obstacle_ids),
+              get_canonical_commands(commands, transform, obstacle_ids))
+
+    symmetries = maze_solver.get_symmetries()
+    # The default turns only allow the rotations, the 4-2 ones the mirrors too
+    assert len(symmetries) == (4 if primitives == "3-1" else 8)
+    for image in symmetries:
+        obstacles, start = transform_request(image)
+        image_solver, image_path, image_distance, image_commands = solve(obstacles, start, primitives)
+        assert image_distance == distance
+        assert sorted(snap_ids(image_commands)) == sorted(snap_ids(commands))
+
+        image_key, image_transform, image_ids = image_solver.get_plan_key(False)
+        assert image_key == plan_key
+        stored = store.get(image_key)
+        assert stored is not None
+
+        restoring = make_solver(obstacles, start, primitives)
+        plan, stored_commands = stored
+        restored_path, restored_distance = restoring.restore_plan(plan, image_transform, image_ids)
+        assert restored_distance == distance
+        # Every screenshot of the restored path faces the obstacle of the request with the same id
+        by_id = {obstacle_id: (x, y) for x, y, _, obstacle_id in obstacles}
+        originals = {obstacle_id: (x, y) for x, y, _, obstacle_id in LAYOUT}
+        for state, original in zip(restored_path, optimal_path):
+            assert (state.screenshot_id == -1) == (original.screenshot_id == -1)
+            if state.screenshot_id != -1:
+                ox, oy = originals[original.screenshot_id]
+                assert by_id[state.screenshot_id] == transform_state(image, ox, oy, 0, SIZE, SIZE)[:2]
+
+        restored_commands = restore_commands(stored_commands, image_transform, image_ids)
+        if image_transform[1] != transform[1]:
+            # A mirror swaps left and right, the commands are generated again from the restored path
+            assert restored_commands is None
+            continue
+        assert restored_commands == command_generator(restored_path, to_payload(obstacles), restoring.primitives)
+        expected = [len(LAYOUT) + 1 - obstacle_id for obstacle_id in snap_ids(commands)]
+        assert snap_ids(restored_commands) == expected
+    store.close()
+
+
+def test_start_zone_layout_is_not_canonicalized():
+    maze_solver = make_solver([(4, 3, 0, 1), (12, 12, 2, 2)], START, "3-1")
+    _, transform, _ = maze_solver.get_plan_key(False)
+    assert transform == IDENTITY
+
+
+def test_mirrored_commands_are_not_stored(tmp_path):
+    store = PlanStore(tmp_path / "plans.db")
+    # The mirror image stores the plan first, without its commands
+    obstacles, start = transform_request((0, True))
+    maze_solver, optimal_path, distance, commands = solve(obstacles, start, "4-2")
+    plan_key, transform, obstacle_ids = maze_solver.get_plan_key(False)
+    assert transform[1]
+    store.put(plan_key, maze_solver.get_canonical_plan(optimal_path, distance, transform, obstacle_ids),
+              get_canonical_commands(commands, transform, obstacle_ids))
+
+    # The original gets the plan back, and its commands are generated again
+    maze_solver = make_solver(LAYOUT, START, "4-2")
+    plan_key, transform, obstacle_ids = maze_solver.get_plan_key(False)
+    assert not transform[1]
+    plan, stored_commands = store.get(plan_key)
+    assert restore_commands(stored_commands, transform, obstacle_ids) is None
+    store.close()